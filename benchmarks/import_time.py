@@ -0,0 +1,112 @@
+"""Import-time benchmark and budget.
+
+Imports each module in a fresh interpreter several times, reports the median
+wall time and fails when it is over budget, when importing built one of the
+singletons that must be created lazily (graphs, Supabase and embedding
+clients, the OpenRouter model list), or when it loaded a package it must leave
+to the commands that use it.
+
+    python benchmarks/import_time.py [--runs 5] [--scale 1.0]
+
+tests/unit_tests/test_import_time.py runs the same checks with the unit tests.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Median import time budgets in seconds
+BUDGETS = {
+    "docs_doctor.cli": 0.5,
+    "docs_doctor.agent.graph": 3.0,
+    "docs_doctor.resources": 3.0,
+}
+
+# Packages a module must not load at import, the CLI imports them in its commands
+FORBIDDEN_IMPORTS = {
+    "docs_doctor.cli": (
+        "langgraph", "langchain_core", "langchain_openai", "openai", "supabase",
+        "streamlit", "fastapi", "numpy", "httpx", "pydantic",
+    ),
+}
+
+# Must still be unset after importing any of the modules above
+LAZY_SINGLETONS = {
+    "docs_doctor.utils": "_supabase",
+    "docs_doctor.agent.utils": "_embedding_model",
+    "docs_doctor.agent.graph": "_docs_doctor",
+    "docs_doctor.agent.tools": "_pydantic_ai_expert",
+}
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+__import__({module!r})
+elapsed = time.perf_counter() - started
+built = [
+    f"{{name}}.{{attr}}" for name, attr in {lazy!r}.items()
+    if name in sys.modules and getattr(sys.modules[name], attr, None) is not None
+]
+settings = sys.modules.get("docs_doctor.core.settings")
+if settings is not None and settings.settings._available_models is not None:
+    built.append("settings.AVAILABLE_MODELS")
+loaded = [name for name in {forbidden!r} if name in sys.modules]
+print(json.dumps({{"elapsed": elapsed, "built": built, "loaded": loaded}}))
+"""
+
+
+def measure(module: str, runs: int) -> tuple[float, list[str], list[str]]:
+    """Median import time of a module in fresh interpreters, the singletons it built and the forbidden packages it loaded."""
+    env = dict(os.environ)
+    # Settings need a key to validate, no request is made while importing
+    env.setdefault("OPEN_ROUTER_API_KEY", "benchmark")
+    samples, built, loaded = [], set(), set()
+    forbidden = FORBIDDEN_IMPORTS.get(module, ())
+    for _ in range(runs):
+        process = subprocess.run(
+            [sys.executable, "-c", PROBE.format(module=module, lazy=LAZY_SINGLETONS, forbidden=forbidden)],
+            cwd=ROOT, env=env, capture_output=True, text=True,
+        )
+        if process.returncode:
+            raise RuntimeError(process.stderr.strip().splitlines()[-1])
+        result = json.loads(process.stdout.strip().splitlines()[-1])
+        samples.append(result["elapsed"])
+        built.update(result["built"])
+        loaded.update(result["loaded"])
+    return statistics.median(samples), sorted(built), sorted(loaded)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per module")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiply every budget, e.g. on slow CI machines")
+    args = parser.parse_args()
+
+    failed = False
+    for module, budget in BUDGETS.items():
+        try:
+            median, built, loaded = measure(module, args.runs)
+        except RuntimeError as e:
+            failed = True
+            print(f"FAIL {module:28} import error: {e}")
+            continue
+        budget *= args.scale
+        ok = median <= budget and not built and not loaded
+        failed |= not ok
+        status = "ok" if ok else "FAIL"
+        print(f"{status:4} {module:28} {median * 1000:8.1f} ms (budget {budget * 1000:.0f} ms)")
+        for name in built:
+            print(f"     built at import: {name}")
+        for name in loaded:
+            print(f"     loaded at import: {name}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
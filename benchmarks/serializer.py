@@ -0,0 +1,111 @@
+"""Checkpoint serializer benchmark.
+
+Serializes the checkpoints of a synthetic thread, one per turn, with
+LangGraph's default JsonPlusSerializer and with the CompactSerializer (with
+and without zstd), and reports throughput and bytes per turn.
+
+    python benchmarks/serializer.py [--turns 20] [--repeat 5]
+"""
+
+import argparse
+import os
+import sys
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+# Settings need a key to validate, no request is made
+os.environ.setdefault("OPEN_ROUTER_API_KEY", "benchmark")
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage  # noqa: E402
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer  # noqa: E402
+
+from docs_doctor.core.serde import CompactSerializer, zstandard  # noqa: E402
+
+RESPONSE_METADATA = {
+    "token_usage": {"completion_tokens": 212, "prompt_tokens": 3120, "total_tokens": 3332},
+    "model_name": "openai/gpt-4o-mini",
+    "system_fingerprint": "fp_0ba0d124f1",
+    "finish_reason": "stop",
+    "logprobs": None,
+    "headers": {"x-request-id": str(uuid.uuid4()), "openai-processing-ms": "812"},
+}
+
+DOCS = (
+    "## Agents\n\nAgents are PydanticAI's primary interface for interacting with LLMs. "
+    "`Agent.run_sync` runs the agent synchronously and returns the result.\n\n"
+    "```python\nagent = Agent('openai:gpt-4o')\nresult = agent.run_sync('What is the capital of France?')\n```\n\n"
+)
+
+
+def turn(number: int) -> list:
+    """Messages of one question answered through one package expert."""
+    call_id = f"call_{uuid.uuid4().hex[:24]}"
+    return [
+        HumanMessage(id=str(uuid.uuid4()), content=f"Question {number}: how do I run an agent synchronously?"),
+        AIMessage(
+            id=str(uuid.uuid4()),
+            content="",
+            tool_calls=[{"id": call_id, "name": "pydantic_ai_expert_tool", "args": {"query": "Agent.run_sync usage"}}],
+            response_metadata={**RESPONSE_METADATA, "finish_reason": "tool_calls"},
+        ),
+        ToolMessage(id=str(uuid.uuid4()), tool_call_id=call_id, content=DOCS * 6),
+        AIMessage(id=str(uuid.uuid4()), content=DOCS * 2, response_metadata=RESPONSE_METADATA),
+    ]
+
+
+def checkpoints(turns: int) -> list[dict]:
+    """One checkpoint per turn, each holding the whole thread so far."""
+    messages, result = [], []
+    for number in range(turns):
+        messages = messages + turn(number)
+        result.append({
+            "v": 1,
+            "id": str(uuid.uuid4()),
+            "ts": "2025-01-01T00:00:00+00:00",
+            "channel_values": {"messages": messages, "prefetched_context": ""},
+            "channel_versions": {"messages": number + 1},
+            "versions_seen": {"package_supervisor": {"messages": number}},
+            "pending_sends": [],
+        })
+    return result
+
+
+def bench(name: str, serde, data: list[dict], repeat: int) -> None:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        dumped = [serde.dumps_typed(checkpoint) for checkpoint in data]
+    dump_seconds = (time.perf_counter() - started) / repeat
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for payload in dumped:
+            serde.loads_typed(payload)
+    load_seconds = (time.perf_counter() - started) / repeat
+
+    total = sum(len(payload) for _, payload in dumped)
+    last = len(dumped[-1][1])
+    print(
+        f"{name:22} {total / len(data) / 1024:9.1f} KiB/turn  last {last / 1024:8.1f} KiB  "
+        f"dump {len(data) / dump_seconds:8.0f}/s  load {len(data) / load_seconds:8.0f}/s"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=20, help="Turns of the synthetic thread")
+    parser.add_argument("--repeat", type=int, default=5, help="Passes over all checkpoints")
+    args = parser.parse_args()
+
+    data = checkpoints(args.turns)
+    bench("default", JsonPlusSerializer(), data, args.repeat)
+    bench("compact", CompactSerializer(compression_threshold=sys.maxsize), data, args.repeat)
+    if zstandard is not None:
+        bench("compact + zstd", CompactSerializer(), data, args.repeat)
+    else:
+        print("compact + zstd         skipped, install the `compression` extra")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,15 @@ This module defines a custom reasoning and action agent graph.
 It invokes tools in a simple loop.
 """
 
-from docs_doctor.agent.graph import docs_doctor
 from dotenv import load_dotenv
 load_dotenv('./.env')
 __all__ = ["docs_doctor"]
+
+
+def __getattr__(name: str):
+    # The graph is compiled on first access, so importing the package stays cheap
+    if name == "docs_doctor":
+        from docs_doctor.agent.graph import get_docs_doctor
+
+        return get_docs_doctor()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
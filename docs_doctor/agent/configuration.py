@@ -30,6 +30,37 @@ class Configuration:
         },
     )
 
+    packages: Optional[list[str]] = field(
+        default=None,
+        metadata={
+            "description": "Names of the package experts enabled for this request. "
+            "Uses the graph's default packages when unset."
+        },
+    )
+
+    fallback_models: list[str] = field(
+        default_factory=list,
+        metadata={
+            "description": "Models tried in order when the main model fails, and used for hedged requests. "
+            "Should be in the form: provider/model-name."
+        },
+    )
+
+    hedge_delay: Optional[float] = field(
+        default=None,
+        metadata={
+            "description": "Seconds to wait for the main model before sending the same request to the first fallback model. "
+            "The first answer is used and the other request is cancelled. Disabled when unset."
+        },
+    )
+
+    hedge_on_p95: bool = field(
+        default=False,
+        metadata={
+            "description": "Use the main model's measured p95 latency as the hedge delay once enough requests were seen."
+        },
+    )
+
     max_search_results: int = field(
         default=10,
         metadata={
@@ -37,6 +68,50 @@ class Configuration:
         },
     )
 
+    timeout: Optional[float] = field(
+        default=None,
+        metadata={
+            "description": "Seconds the whole request, package experts included, may take. "
+            "When it runs out the agent answers with what it found so far."
+        },
+    )
+
+    max_model_calls: Optional[int] = field(
+        default=None,
+        metadata={
+            "description": "Model calls the whole request, package experts included, may make."
+        },
+    )
+
+    max_tokens: Optional[int] = field(
+        default=None,
+        metadata={
+            "description": "Tokens the whole request, package experts included, may use."
+        },
+    )
+
+    prefetch: bool = field(
+        default=False,
+        metadata={
+            "description": "Search the enabled packages' documentation for the question before the supervisor's first call, "
+            "and give it the confident results so it can answer without calling the package experts."
+        },
+    )
+
+    prefetch_min_similarity: float = field(
+        default=0.6,
+        metadata={
+            "description": "Prefetched documentation less similar to the question than this is not given to the supervisor."
+        },
+    )
+
+    prefetch_token_budget: int = field(
+        default=3000,
+        metadata={
+            "description": "The maximum number of tokens of prefetched documentation, shared between the enabled packages."
+        },
+    )
+
     @classmethod
     def from_runnable_config(
         cls, config: Optional[RunnableConfig] = None
@@ -2,22 +2,83 @@
 
 Works with a chat model with tool calling support.
 """
-from typing import Dict, List, Literal, cast
+import threading
+import time
+from typing import Dict, List, Literal
 
-from langchain_core.messages import AIMessage
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
 from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph
-from langgraph.prebuilt import ToolNode
+from langgraph.checkpoint.base import BaseCheckpointSaver
 from langgraph.checkpoint.memory import MemorySaver
 
 from docs_doctor.agent.configuration import Configuration
+from docs_doctor.agent.package_expert.retrieval import format_passages, prefetch_passages
+from docs_doctor.agent.package_expert.tools import get_embedding
+from docs_doctor.agent.prompts import PREFETCHED_CONTEXT_PROMPT
 from docs_doctor.agent.state import InputState, State
-from docs_doctor.agent.tools import select_tools
-from docs_doctor.agent.utils import call_model
-
-def equip_docs_doctor(package_names: List[str] | None = None):
-    """Pass packages names to equip DocsDoctor with package experts."""
-    print("EQUIP PACKAGES: ", package_names)
+from docs_doctor.agent.tools import select_tool_node, select_tools
+from docs_doctor.agent.utils import (
+    ainvoke_within_budget,
+    call_model,
+    get_message_text,
+    unavailable_answer,
+    unavailable_dependencies,
+)
+from docs_doctor.core.blobs import offload_message
+from docs_doctor.core.metrics import metrics
+from docs_doctor.core.ratelimit import fair_share
+from docs_doctor.core.resilience import DependencyError
+
+def equip_docs_doctor(
+    package_names: List[str] | None = None,
+    checkpointer: BaseCheckpointSaver | None = None,
+):
+    """Compile DocsDoctor, whose package experts are chosen per request.
+
+    The `packages` configurable selects the enabled package experts at call time,
+    `package_names` is only the default when a request does not set it. Threads
+    are kept in memory unless a (shared) `checkpointer` is given.
+    """
+    print("DEFAULT PACKAGES: ", package_names)
+
+    def enabled_packages(config: RunnableConfig) -> List[str] | None:
+        packages = Configuration.from_runnable_config(config).packages
+        return package_names if packages is None else packages
+
+    async def prefetch(state: State, config: RunnableConfig) -> Dict[str, str]:
+        """Speculatively search the enabled packages' docs for the latest question.
+
+        The question is embedded once and every package is searched concurrently,
+        so confident answers skip the supervisor -> expert -> retrieval round trips.
+        """
+        configuration = Configuration.from_runnable_config(config)
+        packages = enabled_packages(config)
+        question = next((m for m in reversed(state.messages) if isinstance(m, HumanMessage)), None)
+        # Always reset, the context of the previous question is checkpointed with the thread
+        if not configuration.prefetch or not packages or question is None:
+            return {"prefetched_context": ""}
+
+        started = time.perf_counter()
+        query = get_message_text(question)
+        try:
+            with fair_share((config.get("configurable") or {}).get("thread_id")):
+                prefetched = await prefetch_passages(
+                    query,
+                    await get_embedding(query),
+                    packages,
+                    min_similarity=configuration.prefetch_min_similarity,
+                    token_budget=configuration.prefetch_token_budget,
+                )
+        except DependencyError as e:
+            # Prefetching is only a shortcut, the supervisor still runs
+            print(f"Error prefetching documentation: {e}")
+            return {"prefetched_context": ""}
+        metrics.observe("agent.prefetch_seconds", time.perf_counter() - started)
+        context = "\n\n".join(
+            f"## {name} documentation\n{format_passages(passages)}" for name, passages in prefetched.items()
+        )
+        return {"prefetched_context": context}
 
     # Define the function that calls the model
     async def package_supervisor(
@@ -36,30 +97,18 @@ def equip_docs_doctor(package_names: List[str] | None = None):
         """
         configuration = Configuration.from_runnable_config(config)
 
-        # Initialize the model with tool binding. Change the model or add more tools here.
-        model = call_model(config).bind_tools(select_tools(package_names))
+        # Initialize the model with tool binding. Tool sets and bound models are cached per package set.
+        model = call_model(config, tools=select_tools(enabled_packages(config)))
 
         # Format the system prompt. Customize this to change the agent's behavior.
         system_message = configuration.system_prompt
+        if state.prefetched_context:
+            system_message += PREFETCHED_CONTEXT_PROMPT.format(context=state.prefetched_context)
 
-        # Get the model's response
-        response = cast(
-            AIMessage,
-            await model.ainvoke(
-                [{"role": "system", "content": system_message}, *state.messages], config
-            ),
+        # Get the model's response, answering with what was found once the request budget is spent
+        response = await ainvoke_within_budget(
+            model, system_message, state.messages, config, final=state.is_last_step
         )
-
-        # Handle the case when it's the last step and the model still wants to use a tool
-        if state.is_last_step and response.tool_calls:
-            return {
-                "messages": [
-                    AIMessage(
-                        id=response.id,
-                        content="Sorry, I could not find an answer to your question in the specified number of steps.",
-                    )
-                ]
-            }
         
         if response.tool_calls:
             print("TOOL CALLS: ", response.tool_calls)
@@ -70,14 +119,31 @@ def equip_docs_doctor(package_names: List[str] | None = None):
 
     builder = StateGraph(State, input=InputState, config_schema=Configuration)
 
+    async def tools(state: State, config: RunnableConfig) -> Dict[str, List[ToolMessage]]:
+        """Run the requested tools with the tool node of the enabled packages.
+
+        Large results are moved to the blob store so checkpoints stay small.
+        The package experts' upstream calls are queued under this thread.
+        """
+        with fair_share((config.get("configurable") or {}).get("thread_id")):
+            result = await select_tool_node(enabled_packages(config)).ainvoke(state, config)
+        return {**result, "messages": [offload_message(m) for m in result["messages"]]}
+
+    async def unavailable(state: State) -> Dict[str, List[AIMessage]]:
+        """Answer that the documentation cannot be searched, without calling the model."""
+        return {"messages": [unavailable_answer(unavailable_dependencies(state.messages))]}
+
     # Define the two nodes we will cycle between
+    builder.add_node(prefetch)
     builder.add_node(package_supervisor)
-    builder.add_node("tools", ToolNode(select_tools(package_names)))
+    builder.add_node(tools)
+    builder.add_node(unavailable)
     # builder.add_node(package_aggregator)
 
-    # Set the entrypoint as `package_supervisor`
+    # Set the entrypoint as `prefetch`, which is a no-op unless enabled
     # This means that this node is the first one called
-    builder.add_edge("__start__", "package_supervisor")
+    builder.add_edge("__start__", "prefetch")
+    builder.add_edge("prefetch", "package_supervisor")
 
 
     def route_model_output(state: State) -> Literal["__end__", "tools"]:
@@ -111,26 +177,53 @@ def equip_docs_doctor(package_names: List[str] | None = None):
         route_model_output,
     )
 
-    # Add a normal edge from `tools` to `package_supervisor`
-    # This creates a cycle: after using tools, we always return to the model
-    builder.add_edge("tools", "package_supervisor")
+    def route_tool_output(state: State) -> Literal["package_supervisor", "unavailable"]:
+        """Return to the model, unless every tool call failed on a dependency that is down."""
+        return "unavailable" if unavailable_dependencies(state.messages) else "package_supervisor"
+
+    # After using tools, return to the model
+    # This creates a cycle, broken when the tools' dependencies are down
+    builder.add_conditional_edges("tools", route_tool_output)
+    builder.add_edge("unavailable", "__end__")
 
     # Compile the builder into an executable graph
     # You can customize this by adding interrupt points for state updates
     docs_doctor = builder.compile(
         interrupt_before=[],  # Add node names here to update state before they're called
         interrupt_after=[],  # Add node names here to update state after they're called
-        checkpointer=MemorySaver(),
+        checkpointer=checkpointer or MemorySaver(),
     )
     docs_doctor.name = "DocsDoctor"  # This customizes the name in LangSmith
 
     return docs_doctor
 
-docs_doctor = equip_docs_doctor()
+_docs_doctor = None
+_docs_doctor_lock = threading.Lock()
+
+
+def get_docs_doctor():
+    """Get the default DocsDoctor graph, compiled on first use.
+
+    It is the graph factory of langgraph.json, so the LangGraph server
+    compiles the graph on demand rather than at import.
+    """
+    global _docs_doctor
+    with _docs_doctor_lock:
+        if _docs_doctor is None:
+            _docs_doctor = equip_docs_doctor()
+        return _docs_doctor
+
+
+def __getattr__(name: str):
+    # Backwards compatible `docs_doctor` attribute, compiled on first access
+    if name == "docs_doctor":
+        return get_docs_doctor()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 def invoke_docs_doctor(st_messages, callables):
     # Ensure the callables parameter is a list as you can have multiple callbacks
     if not isinstance(callables, list):
         raise TypeError("callables must be a list")
     # Invoke the graph with the current messages and callback configuration
-    return docs_doctor.invoke({"messages": st_messages}, config={"callbacks": callables})
+    return get_docs_doctor().invoke({"messages": st_messages}, config={"callbacks": callables})
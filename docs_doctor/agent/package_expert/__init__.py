@@ -4,6 +4,6 @@ This module defines a custom reasoning and action agent graph.
 It invokes tools in a simple loop.
 """
 
-from docs_doctor.agent.package_expert.graph import create_package_expert
+from docs_doctor.agent.package_expert.graph import create_package_expert, fast_path_stats
 
-__all__ = ["create_package_expert"]
\ No newline at end of file
+__all__ = ["create_package_expert", "fast_path_stats"]
\ No newline at end of file
@@ -30,6 +30,29 @@ class Configuration:
         },
     )
 
+    fallback_models: list[str] = field(
+        default_factory=list,
+        metadata={
+            "description": "Models tried in order when the main model fails, and used for hedged requests. "
+            "Should be in the form: provider/model-name."
+        },
+    )
+
+    hedge_delay: Optional[float] = field(
+        default=None,
+        metadata={
+            "description": "Seconds to wait for the main model before sending the same request to the first fallback model. "
+            "The first answer is used and the other request is cancelled. Disabled when unset."
+        },
+    )
+
+    hedge_on_p95: bool = field(
+        default=False,
+        metadata={
+            "description": "Use the main model's measured p95 latency as the hedge delay once enough requests were seen."
+        },
+    )
+
     max_search_results: int = field(
         default=10,
         metadata={
@@ -37,6 +60,57 @@ class Configuration:
         },
     )
 
+    fast_path: bool = field(
+        default=False,
+        metadata={
+            "description": "Search the documentation before the first call and, when the results are confident, "
+            "answer in a single call without tools. Otherwise the agent uses its tools as usual."
+        },
+    )
+
+    fast_path_min_similarity: float = field(
+        default=0.6,
+        metadata={
+            "description": "Similarity to the question the best search result needs for the fast path to answer."
+        },
+    )
+
+    retrieval_token_budget: int = field(
+        default=4000,
+        metadata={
+            "description": "The maximum number of tokens of documentation returned by one search."
+        },
+    )
+
+    min_similarity: float = field(
+        default=0.3,
+        metadata={
+            "description": "Search results less similar to the query than this do not count towards the number of results returned."
+        },
+    )
+
+    similarity_gap: float = field(
+        default=0.08,
+        metadata={
+            "description": "Drop in similarity between two consecutive search results at which the number of results returned stops growing."
+        },
+    )
+
+    low_confidence_similarity: float = field(
+        default=0.45,
+        metadata={
+            "description": "When the best search result is less similar than this, max_search_results results are returned."
+        },
+    )
+
+    mmr_lambda: float = field(
+        default=0.5,
+        metadata={
+            "description": "Weight of relevance against novelty when selecting search results by maximal marginal "
+            "relevance, between 0 (most diverse) and 1 (ranking order)."
+        },
+    )
+
     @classmethod
     def from_runnable_config(
         cls, config: Optional[RunnableConfig] = None
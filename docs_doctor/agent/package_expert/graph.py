@@ -3,7 +3,7 @@
 Works with a chat model with tool calling support.
 """
 
-from typing import Dict, List, Literal, cast
+from typing import Any, Dict, List, Literal
 
 from langchain_core.messages import AIMessage
 from langchain_core.runnables import RunnableConfig
@@ -11,13 +11,77 @@ from langgraph.graph import StateGraph
 from langgraph.prebuilt import ToolNode
 
 from docs_doctor.agent.package_expert.configuration import Configuration
+from docs_doctor.agent.package_expert.prompts import FAST_PATH_PROMPT
+from docs_doctor.agent.package_expert.retrieval import format_passages, retrieve_passages
 from docs_doctor.agent.package_expert.state import InputState, State
-from docs_doctor.agent.package_expert.tools import TOOLS
-from docs_doctor.agent.utils import call_model
+from docs_doctor.agent.package_expert.tools import TOOLS, get_embedding
+from docs_doctor.agent.utils import (
+    ainvoke_within_budget,
+    call_model,
+    get_message_text,
+    unavailable_answer,
+    unavailable_dependencies,
+)
+from docs_doctor.core.metrics import metrics
+from docs_doctor.core.resilience import DependencyError
 
 # Define the function that calls the model
 
+def fast_path_stats() -> dict[str, float]:
+    """Summarize the package experts' fast path: hit rate and latency of both paths."""
+    hits = metrics.counter("expert.fast_path.hits")
+    misses = metrics.counter("expert.fast_path.misses")
+    fast_p50 = metrics.percentile("expert.latency.fast", 50)
+    loop_p50 = metrics.percentile("expert.latency.loop", 50)
+    saved = hits * max(loop_p50 - fast_p50, 0.0) if fast_p50 is not None and loop_p50 is not None else 0.0
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+        "fast_p50": fast_p50 or 0.0,
+        "loop_p50": loop_p50 or 0.0,
+        # Estimated from the median latency of experts that ran the tool loop
+        "saved_seconds": saved,
+    }
+
+
 def create_package_expert(package_name):
+    async def retrieve(state: State, config: RunnableConfig) -> Dict[str, Any]:
+        """Search the documentation for the question before the first model call.
+
+        Does nothing unless the fast path is enabled.
+        """
+        configuration = Configuration.from_runnable_config(config)
+        if not configuration.fast_path or not state.messages:
+            return {"fast_path": False}
+
+        query = get_message_text(state.messages[-1])
+        try:
+            passages = await retrieve_passages(
+                query,
+                await get_embedding(query),
+                package_name,
+                max_results=configuration.max_search_results,
+                token_budget=configuration.retrieval_token_budget,
+                min_similarity=configuration.min_similarity,
+                similarity_gap=configuration.similarity_gap,
+                low_confidence=configuration.low_confidence_similarity,
+                mmr_lambda=configuration.mmr_lambda,
+            )
+        except DependencyError as e:
+            # The tools need the same dependencies, skip the model calls that would hit them
+            print(f"Error retrieving documentation: {e}")
+            return {"fast_path": False, "unavailable": [e.dependency]}
+        except Exception as e:
+            print(f"Error retrieving documentation: {e}")
+            passages = []
+
+        if passages and max(p.score for p in passages) >= configuration.fast_path_min_similarity:
+            metrics.incr("expert.fast_path.hits")
+            return {"fast_path": True, "retrieved_context": format_passages(passages)}
+        metrics.incr("expert.fast_path.misses")
+        return {"fast_path": False}
+
     async def package_expert(
         state: State, config: RunnableConfig
     ) -> Dict[str, List[AIMessage]]:
@@ -34,32 +98,23 @@ def create_package_expert(package_name):
         """
         configuration = Configuration.from_runnable_config(config)
 
-        # Initialize the model with tool binding. Change the model or add more tools here.
-        model = call_model(config).bind_tools(TOOLS)
-
         # Format the system prompt. Customize this to change the agent's behavior.
         system_message = configuration.system_prompt.format(
             package_name=package_name
         )
 
-        # Get the model's response
-        response = cast(
-            AIMessage,
-            await model.ainvoke(
-                [{"role": "system", "content": system_message}, *state.messages], config
-            ),
+        # Initialize the model with tool binding. Change the model or add more tools here.
+        if state.fast_path:
+            # Confident retrieval: answer in one call, without tools
+            model = call_model(config)
+            system_message += FAST_PATH_PROMPT.format(context=state.retrieved_context)
+        else:
+            model = call_model(config, tools=TOOLS)
+
+        # Get the model's response, answering with what was found once the request budget is spent
+        response = await ainvoke_within_budget(
+            model, system_message, state.messages, config, final=state.is_last_step
         )
-
-        # Handle the case when it's the last step and the model still wants to use a tool
-        if state.is_last_step and response.tool_calls:
-            return {
-                "messages": [
-                    AIMessage(
-                        id=response.id,
-                        content="Sorry, I could not find an answer to your question in the specified number of steps.",
-                    )
-                ]
-            }
         
         # Inject package name
         if response.tool_calls:
@@ -68,16 +123,28 @@ def create_package_expert(package_name):
         
         return {"messages": [response]}
 
+    async def unavailable(state: State) -> Dict[str, List[AIMessage]]:
+        """Answer that the documentation cannot be searched, without calling the model."""
+        return {"messages": [unavailable_answer(state.unavailable or unavailable_dependencies(state.messages))]}
+
     # Define a new graph
     builder = StateGraph(State, input=InputState, config_schema=Configuration)
 
     # Define the two nodes we will cycle between
+    builder.add_node(retrieve)
     builder.add_node(package_expert)
     builder.add_node("tools", ToolNode(TOOLS))
+    builder.add_node(unavailable)
 
-    # Set the entrypoint as `package_expert`
+    # Set the entrypoint as `retrieve`, which is a no-op unless the fast path is enabled
     # This means that this node is the first one called
-    builder.add_edge("__start__", "package_expert")
+    builder.add_edge("__start__", "retrieve")
+
+    def route_retrieval(state: State) -> Literal["package_expert", "unavailable"]:
+        """Stop early when the up-front retrieval found a dependency down."""
+        return "unavailable" if state.unavailable else "package_expert"
+
+    builder.add_conditional_edges("retrieve", route_retrieval)
 
 
     def route_model_output(state: State) -> Literal["__end__", "tools"]:
@@ -111,9 +178,14 @@ def create_package_expert(package_name):
         route_model_output,
     )
 
-    # Add a normal edge from `tools` to `package_expert`
-    # This creates a cycle: after using tools, we always return to the model
-    builder.add_edge("tools", "package_expert")
+    def route_tool_output(state: State) -> Literal["package_expert", "unavailable"]:
+        """Return to the model, unless every tool call failed on a dependency that is down."""
+        return "unavailable" if unavailable_dependencies(state.messages) else "package_expert"
+
+    # After using tools, return to the model
+    # This creates a cycle, broken when the tools' dependencies are down
+    builder.add_conditional_edges("tools", route_tool_output)
+    builder.add_edge("unavailable", "__end__")
 
     # Compile the builder into an executable graph
     # You can customize this by adding interrupt points for state updates
@@ -4,3 +4,10 @@ SYSTEM_PROMPT = """You are an expert in the python package: {package_name}.
 You have tools at your disposal to help search the documentation adn answer the user's question.
 If the tools don't depend on each other call them in parallel.
 """
+
+FAST_PATH_PROMPT = """
+The following documentation was retrieved for the question.
+Answer the question from it, citing the relevant source URLs.
+
+{context}
+"""
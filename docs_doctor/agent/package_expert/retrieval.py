@@ -0,0 +1,402 @@
+"""Hybrid retrieval of documentation chunks.
+
+Vector search (`match_site_pages`) finds chunks that are semantically close to
+the question but misses exact API names, full-text search (`search_site_pages`)
+finds those but not paraphrases. Both run concurrently and their rankings are
+merged with reciprocal rank fusion.
+
+The chunks are then selected by maximal marginal relevance, so near-duplicates
+(the same text in several pages or versions) give way to the next relevant
+chunks, adjacent chunks of a page are merged back into passages, and the
+passages are packed into a token budget so a retrieval never floods the
+expert's prompt.
+
+How many chunks are kept adapts to the query: confident matches stop at the
+first large drop in similarity, uncertain ones are widened to the configured
+maximum. The similarities only choose that number, the chunks themselves are
+selected from the fused candidates.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from dataclasses import dataclass, replace
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from docs_doctor.core.metrics import metrics
+from docs_doctor.utils import aexecute, get_supabase
+
+logger = logging.getLogger(__name__)
+
+# Constant of reciprocal rank fusion, dampens the weight of the top ranks
+RRF_K = 60
+# Rough number of characters per token when packing context
+CHARS_PER_TOKEN = 4
+# Minimum number of candidates fused from both searches before diversification
+CANDIDATES = 20
+# Weight of relevance against novelty when diversifying chunks, 1 keeps the fused order
+MMR_LAMBDA = 0.5
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[dict]], k: int = RRF_K, limit: Optional[int] = None
+) -> List[dict]:
+    """Merge ranked result lists, scoring each row by the sum of 1 / (k + rank).
+
+    Rows are identified by their `id`; the first occurrence is kept and gets
+    an `rrf_score` field.
+    """
+    scores: Dict[int, float] = {}
+    rows: Dict[int, dict] = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking, start=1):
+            scores[row["id"]] = scores.get(row["id"], 0.0) + 1.0 / (k + rank)
+            rows.setdefault(row["id"], row)
+    fused = sorted(rows, key=lambda row_id: scores[row_id], reverse=True)
+    return [{**rows[row_id], "rrf_score": scores[row_id]} for row_id in fused[:limit]]
+
+
+async def vector_search(query_embedding: List[float], package_name: str, match_count: int) -> List[dict]:
+    """Chunks of a package closest to the query embedding."""
+    result = await aexecute(
+        get_supabase().rpc(
+            "match_site_pages",
+            {
+                "query_embedding": query_embedding,
+                "match_count": match_count,
+                "filter": {"source": package_name},
+            },
+        )
+    )
+    return result.data or []
+
+
+async def keyword_search(query: str, package_name: str, match_count: int) -> List[dict]:
+    """Chunks of a package matching the query terms, best full-text rank first."""
+    result = await aexecute(
+        get_supabase().rpc(
+            "search_site_pages",
+            {
+                "query_text": query,
+                "match_count": match_count,
+                "filter": {"source": package_name},
+            },
+        )
+    )
+    return result.data or []
+
+
+async def hybrid_search(
+    query: str,
+    query_embedding: List[float],
+    package_name: str,
+    match_count: int = 5,
+    candidates: Optional[int] = None,
+) -> List[dict]:
+    """Run vector and keyword search concurrently and fuse their rankings.
+
+    Args:
+        query: The user's question.
+        query_embedding: Embedding of the question.
+        package_name: Package whose chunks are searched.
+        match_count: Number of fused chunks returned.
+        candidates: Chunks fetched from each search, defaults to twice `match_count`.
+    """
+    candidates = candidates or 2 * match_count
+    started = time.perf_counter()
+    vector_rows, keyword_rows = await asyncio.gather(
+        vector_search(query_embedding, package_name, candidates),
+        keyword_search(query, package_name, candidates),
+        return_exceptions=True,
+    )
+    # One failing search degrades to the other instead of failing the tool call
+    rankings = []
+    for name, rows in (("vector", vector_rows), ("keyword", keyword_rows)):
+        if isinstance(rows, BaseException):
+            metrics.incr(f"retrieval.{name}_errors")
+            print(f"Error in {name} search: {rows}")
+            continue
+        metrics.incr(f"retrieval.{name}_hits", len(rows))
+        rankings.append(rows)
+    if not rankings:
+        raise vector_rows
+
+    fused = reciprocal_rank_fusion(rankings, limit=match_count)
+    if len(rankings) == 2:
+        # Chunks only the keyword search found, i.e. what vector search alone would miss
+        keyword_only = {row["id"] for row in keyword_rows} - {row["id"] for row in vector_rows}
+        metrics.incr("retrieval.keyword_only", sum(row["id"] in keyword_only for row in fused))
+    metrics.incr("retrieval.calls")
+    metrics.observe("retrieval.seconds", time.perf_counter() - started)
+    return fused
+
+
+def _embedding(row: dict) -> Optional[List[float]]:
+    # pgvector columns come back from PostgREST as a "[0.1,...]" string
+    value = row.get("embedding")
+    return json.loads(value) if isinstance(value, str) else value
+
+
+def _unit_vectors(rows: List[dict]) -> np.ndarray:
+    # Normalized embeddings, zero for rows without one so they look novel
+    embeddings = [_embedding(row) for row in rows]
+    dimensions = next((len(embedding) for embedding in embeddings if embedding), 1)
+    vectors = np.zeros((len(rows), dimensions))
+    for index, embedding in enumerate(embeddings):
+        if embedding:
+            vector = np.array(embedding, dtype=float)
+            norm = np.linalg.norm(vector)
+            if norm:
+                vectors[index] = vector / norm
+    return vectors
+
+
+def diversify(rows: List[dict], k: int, lambda_mult: float = MMR_LAMBDA) -> List[dict]:
+    """Select `k` rows by maximal marginal relevance.
+
+    Each step selects the row maximizing
+    `lambda_mult * relevance - (1 - lambda_mult) * max similarity to the selected rows`,
+    where the similarity between rows is the cosine similarity of their
+    embeddings. Relevance is the row's fused score scaled to [0, 1] (its rank
+    when the rows were not fused), so keyword-only matches keep the rank the
+    fusion gave them; `lambda_mult=1` keeps the fused order.
+    """
+    if not rows or k <= 0:
+        return []
+    scores = np.array([row.get("rrf_score", 1.0 / (RRF_K + rank)) for rank, row in enumerate(rows, start=1)])
+    relevance = scores / (scores.max() or 1.0)
+    vectors = _unit_vectors(rows)
+    # Highest similarity of each row to a selected one
+    redundancy = np.zeros(len(rows))
+    remaining = np.ones(len(rows), dtype=bool)
+    selected: List[int] = []
+    for _ in range(min(k, len(rows))):
+        marginal = np.where(remaining, lambda_mult * relevance - (1 - lambda_mult) * redundancy, -np.inf)
+        best = int(np.argmax(marginal))
+        if relevance[best] < relevance[remaining].max():
+            metrics.incr("retrieval.mmr_reordered")
+        selected.append(best)
+        remaining[best] = False
+        redundancy = np.maximum(redundancy, vectors @ vectors[best])
+    return [rows[index] for index in selected]
+
+
+@dataclass
+class Passage:
+    """Consecutive chunks of one page."""
+
+    url: str
+    title: str
+    first_chunk: int
+    last_chunk: int
+    content: str
+    score: float
+    """Best similarity of the passage's chunks to the query."""
+
+    @property
+    def tokens(self) -> int:
+        return len(self.content) // CHARS_PER_TOKEN + 1
+
+
+def merge_adjacent(rows: List[dict]) -> List[Passage]:
+    """Merge chunks of the same URL with consecutive chunk numbers.
+
+    Passages keep the order of their best-ranked chunk and read in page order.
+    """
+    by_url: Dict[str, List[tuple[int, dict]]] = {}
+    for rank, row in enumerate(rows):
+        by_url.setdefault(row["url"], []).append((rank, row))
+
+    passages: List[tuple[int, Passage]] = []
+    for url, ranked in by_url.items():
+        ranked.sort(key=lambda item: item[1]["chunk_number"])
+        group: List[tuple[int, dict]] = []
+        for item in ranked + [None]:
+            if group and (item is None or item[1]["chunk_number"] != group[-1][1]["chunk_number"] + 1):
+                best_rank = min(rank for rank, _ in group)
+                passages.append((best_rank, Passage(
+                    url=url,
+                    title=group[0][1]["title"],
+                    first_chunk=group[0][1]["chunk_number"],
+                    last_chunk=group[-1][1]["chunk_number"],
+                    content="\n\n".join(row["content"] for _, row in group),
+                    score=max(row.get("similarity", 0.0) for _, row in group),
+                )))
+                group = []
+            if item is not None:
+                group.append(item)
+    return [passage for _, passage in sorted(passages, key=lambda item: item[0])]
+
+
+def pack_context(passages: List[Passage], token_budget: int) -> List[Passage]:
+    """Keep the best passages fitting in `token_budget` tokens.
+
+    Passages that do not fit are skipped so smaller, lower-ranked ones can
+    still be used; the best passage is truncated if it alone is over budget.
+    """
+    packed: List[Passage] = []
+    used = 0
+    for passage in passages:
+        if used + passage.tokens <= token_budget:
+            packed.append(passage)
+            used += passage.tokens
+        elif not packed:
+            packed.append(replace(passage, content=passage.content[: token_budget * CHARS_PER_TOKEN]))
+            used += packed[-1].tokens
+    metrics.observe("retrieval.context_tokens", used)
+    return packed
+
+
+def add_similarity(rows: List[dict], query_embedding: List[float]) -> List[dict]:
+    """Set the cosine `similarity` of rows that only the keyword search returned."""
+    query = np.array(query_embedding, dtype=float)
+    query_norm = np.linalg.norm(query)
+    for row in rows:
+        if row.get("similarity") is not None:
+            continue
+        embedding = _embedding(row)
+        if not embedding or not query_norm:
+            row["similarity"] = 0.0
+            continue
+        vector = np.array(embedding, dtype=float)
+        row["similarity"] = float(vector @ query / (np.linalg.norm(vector) * query_norm or 1.0))
+    return rows
+
+
+def choose_k(
+    similarities: List[float],
+    max_k: int,
+    min_k: int = 2,
+    threshold: float = 0.3,
+    gap: float = 0.08,
+    low_confidence: float = 0.45,
+) -> tuple[int, str]:
+    """Choose how many chunks to keep from their similarities to the query.
+
+    Returns the number of chunks and the reason it was chosen:
+
+    - "widened": the best chunk is below `low_confidence`, keep `max_k` to give
+      the expert more material,
+    - "threshold": the next chunk is below `threshold`,
+    - "gap": the next chunk is more than `gap` less similar than the previous one,
+    - "max": `max_k` chunks were kept.
+    """
+    ordered = sorted(similarities, reverse=True)
+    limit = min(max_k, len(ordered))
+    if not ordered:
+        return 0, "empty"
+    if ordered[0] < low_confidence:
+        return limit, "widened"
+    k, reason = 1, "max"
+    while k < limit:
+        if ordered[k] < threshold:
+            reason = "threshold"
+            break
+        if ordered[k - 1] - ordered[k] > gap:
+            reason = "gap"
+            break
+        k += 1
+    return max(k, min(min_k, limit)), reason
+
+
+async def retrieve_passages(
+    query: str,
+    query_embedding: List[float],
+    package_name: str,
+    max_results: int = 10,
+    token_budget: int = 4000,
+    min_similarity: float = 0.3,
+    similarity_gap: float = 0.08,
+    low_confidence: float = 0.45,
+    mmr_lambda: float = MMR_LAMBDA,
+) -> List[Passage]:
+    """Retrieve, diversify and pack the documentation passages answering a query.
+
+    Args:
+        query: The user's question.
+        query_embedding: Embedding of the question.
+        package_name: Package whose chunks are searched.
+        max_results: Maximum number of chunks kept.
+        token_budget: Maximum estimated tokens of the returned passages.
+        min_similarity: Similarity below which no further chunk counts towards k.
+        similarity_gap: Drop in similarity between two chunks at which k stops growing.
+        low_confidence: Below this best similarity, `max_results` chunks are kept.
+        mmr_lambda: Weight of relevance against novelty when selecting chunks, see `diversify`.
+    """
+    candidates = max(CANDIDATES, 2 * max_results)
+    rows = await hybrid_search(query, query_embedding, package_name, match_count=candidates, candidates=candidates)
+    if not rows:
+        return []
+    add_similarity(rows, query_embedding)
+    similarities = [row["similarity"] for row in rows]
+    k, reason = choose_k(
+        similarities, max_results, threshold=min_similarity, gap=similarity_gap, low_confidence=low_confidence
+    )
+    # Similarities only size the result, the chunks are selected from all fused
+    # candidates so keyword-only matches keep their rank and near-duplicates give
+    # way to the next candidates.
+    passages = pack_context(merge_adjacent(diversify(rows, k=k, lambda_mult=mmr_lambda)), token_budget)
+
+    ordered = sorted(similarities, reverse=True)
+    metrics.observe("retrieval.k", k)
+    metrics.observe("retrieval.top_similarity", ordered[0])
+    metrics.incr(f"retrieval.k_reason.{reason}")
+    logger.info(
+        "retrieval package=%s k=%d reason=%s candidates=%d passages=%d similarity top=%.3f kth=%.3f median=%.3f",
+        package_name, k, reason, len(rows), len(passages),
+        ordered[0], ordered[k - 1], ordered[len(ordered) // 2],
+    )
+    return passages
+
+
+def format_passages(passages: List[Passage]) -> str:
+    """Format passages for the model, best first."""
+    return "\n\n---\n\n".join(
+        f"""
+# {passage.title}
+Source: {passage.url}
+Relevance: {passage.score:.2f}
+
+{passage.content}
+"""
+        for passage in passages
+    )
+
+
+async def prefetch_passages(
+    query: str,
+    query_embedding: List[float],
+    package_names: Sequence[str],
+    min_similarity: float,
+    token_budget: int,
+    max_results: int = 3,
+) -> Dict[str, List[Passage]]:
+    """Search the docs of several packages concurrently, keeping only confident passages.
+
+    The token budget is shared between the packages. Packages without a
+    passage at least `min_similarity` similar to the query are left out.
+    """
+    if not package_names:
+        return {}
+    per_package = max(token_budget // len(package_names), 1)
+    results = await asyncio.gather(
+        *(
+            retrieve_passages(query, query_embedding, name, max_results=max_results, token_budget=per_package)
+            for name in package_names
+        ),
+        return_exceptions=True,
+    )
+    prefetched = {}
+    for name, passages in zip(package_names, results):
+        if isinstance(passages, BaseException):
+            print(f"Error prefetching {name} documentation: {passages}")
+            continue
+        confident = [passage for passage in passages if passage.score >= min_similarity]
+        if confident:
+            prefetched[name] = confident
+    metrics.incr("retrieval.prefetch.calls")
+    metrics.incr("retrieval.prefetch.packages_hit", len(prefetched))
+    return prefetched
@@ -3,7 +3,7 @@
 from __future__ import annotations
 
 from dataclasses import dataclass, field
-from typing import Sequence
+from typing import List, Sequence
 
 from langchain_core.messages import AnyMessage
 from langgraph.graph import add_messages
@@ -48,6 +48,20 @@ class State(InputState):
     This is a 'managed' variable, controlled by the state machine rather than user code.
     It is set to 'True' when the step count reaches recursion_limit - 1.
     """
+
+    retrieved_context: str = field(default="")
+    """
+    Documentation retrieved up front for the question when the fast path is enabled.
+    """
+
+    fast_path: bool = field(default=False)
+    """
+    Whether the up-front retrieval was confident enough to answer in a single call, without tools.
+    """
+    unavailable: List[str] = field(default_factory=list)
+    """
+    Dependencies found down by the up-front retrieval, the expert then answers without a model call.
+    """
     
     # Additional attributes can be added here as needed.
     # Common examples include:
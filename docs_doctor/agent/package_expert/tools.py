@@ -8,62 +8,72 @@ consider implementing more robust and specialized tools tailored to your needs.
 
 from typing import Any, Callable, List
 
-from langchain_core.tools import InjectedToolArg
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import InjectedToolArg, InjectedToolCallId
 from typing_extensions import Annotated
 from langgraph.types import Command
 
-from docs_doctor.agent.utils import embedding_model
-from docs_doctor.utils import supabase
+from docs_doctor.agent.package_expert.configuration import Configuration
+from docs_doctor.agent.package_expert.retrieval import format_passages, retrieve_passages
+from docs_doctor.agent.utils import dependency_error_message, get_embedding_model, get_embeddings_limiter
+from docs_doctor.core.ratelimit import estimate_tokens
+from docs_doctor.core.resilience import DependencyError, call_with_retry
+from docs_doctor.utils import aexecute, get_supabase
 
 async def get_embedding(
     text: str,
 ) -> List[float]:
-    """Get embedding vector from OpenAI."""
-    try:
-        response = await embedding_model.embed_query(text)
-        return response
-    except Exception as e:
-        print(f"Error getting embedding: {e}")
-        return [0] * 1536  # Return zero vector on error
+    """Get embedding vector from OpenAI, with retries.
+
+    Raises:
+        DependencyError: The embedding API is down or every retry failed.
+    """
+    return await call_with_retry(
+        "embeddings",
+        lambda: get_embedding_model().aembed_query(text),
+        limiter=get_embeddings_limiter(),
+        tokens=estimate_tokens(text),
+    )
 
 async def retrieve_relevant_documentation(
     user_query: str,
     *,
     package_name: Annotated[str, InjectedToolArg],
+    tool_call_id: Annotated[str, InjectedToolCallId],
+    config: RunnableConfig,
 ) -> Command:
     """
     Retrieve relevant documentation chunks based on the query with RAG.
+    Searches by meaning and by keywords, so exact API names in the query are matched too.
     """
     try:
+        configuration = Configuration.from_runnable_config(config)
+
         # Get the embedding for the query
         query_embedding = await get_embedding(user_query)
         
-        # Query Supabase for relevant documents
-        result = supabase.rpc(
-            'match_site_pages',
-            {
-                'query_embedding': query_embedding,
-                'match_count': 5,
-                'filter': {'source': f"{package_name}"}
-            }
-        ).execute()
+        # Hybrid search, keeping as many chunks as the similarity scores justify
+        passages = await retrieve_passages(
+            user_query,
+            query_embedding,
+            package_name,
+            max_results=configuration.max_search_results,
+            token_budget=configuration.retrieval_token_budget,
+            min_similarity=configuration.min_similarity,
+            similarity_gap=configuration.similarity_gap,
+            low_confidence=configuration.low_confidence_similarity,
+            mmr_lambda=configuration.mmr_lambda,
+        )
         
-        if not result.data:
+        if not passages:
             return "No relevant documentation found."
             
         # Format the results
-        formatted_chunks = []
-        for doc in result.data:
-            chunk_text = f"""
-# {doc['title']}
-
-{doc['content']}
-"""
-            formatted_chunks.append(chunk_text)
-            
-        # Join all chunks with a separator
-        return "\n\n---\n\n".join(formatted_chunks)
+        return format_passages(passages)
         
+    except DependencyError as e:
+        # Fail fast with an error the graph routes on, instead of a string to reason about
+        return dependency_error_message(e, tool_call_id)
     except Exception as e:
         print(f"Error retrieving documentation: {e}")
         return f"Error retrieving documentation: {str(e)}"
@@ -71,16 +81,18 @@ async def retrieve_relevant_documentation(
 async def list_documentation_pages(
     *,
     package_name: Annotated[str, InjectedToolArg],
+    tool_call_id: Annotated[str, InjectedToolCallId],
 ) -> Command:
     """
     Retrieve a list of all available Package documentation pages.
     """
     try:
         # Query Supabase for unique URLs where source is pydantic_ai_docs
-        result = supabase.from_('site_pages') \
-            .select('url') \
-            .eq('metadata->>source', f"{package_name}") \
-            .execute()
+        result = await aexecute(
+            get_supabase().from_('site_pages')
+            .select('url')
+            .eq('metadata->>source', f"{package_name}")
+        )
         
         print('PACKAGE NAME: ', package_name)
         print('RESULT: ', result)
@@ -93,6 +105,8 @@ async def list_documentation_pages(
         urls = sorted(set(doc['url'] for doc in result.data))
         return urls
         
+    except DependencyError as e:
+        return dependency_error_message(e, tool_call_id)
     except Exception as e:
         print(f"Error retrieving documentation pages: {e}")
         return []
@@ -101,18 +115,20 @@ async def get_page_content(
 	url: str,
 	*,
     package_name: Annotated[str, InjectedToolArg],
+    tool_call_id: Annotated[str, InjectedToolCallId],
 ) -> Command:
     """
     Retrieve the full content of a specific documentation page using it's url by combining all its chunks.
     """
     try:
         # Query Supabase for all chunks of this URL, ordered by chunk_number
-        result = supabase.from_('site_pages') \
-            .select('title, content, chunk_number') \
-            .eq('url', url) \
-            .eq('metadata->>source', f"{package_name}") \
-            .order('chunk_number') \
-            .execute()
+        result = await aexecute(
+            get_supabase().from_('site_pages')
+            .select('title, content, chunk_number')
+            .eq('url', url)
+            .eq('metadata->>source', f"{package_name}")
+            .order('chunk_number')
+        )
         
         if not result.data:
             return f"No content found for URL: {url}"
@@ -128,6 +144,8 @@ async def get_page_content(
         # Join everything together
         return "\n\n".join(formatted_content)
         
+    except DependencyError as e:
+        return dependency_error_message(e, tool_call_id)
     except Exception as e:
         print(f"Error retrieving page content: {e}")
         return f"Error retrieving page content: {str(e)}"
@@ -19,3 +19,25 @@ LOCAL FILE SYSTEM ACCESS:
 You will then aggregate these tool calls into a response to the user.
 IMPORTANT: If the tools don't depend on each other call them in parallel.
 """
+
+PREFETCHED_CONTEXT_PROMPT = """
+PREFETCHED DOCUMENTATION:
+The following documentation was already retrieved for the user's latest question.
+If it answers the question, answer directly from it without calling the package expert tools.
+Only call an expert tool for what it does not cover.
+
+{context}
+"""
+
+FINAL_ANSWER_PROMPT = """
+You are running out of time or steps for this request. Do not call any tools:
+answer now with the information gathered so far, and say what is missing.
+"""
+
+PARTIAL_ANSWER = """I ran out of {reason} before I could finish. Here is what I found so far:
+
+{findings}"""
+
+NO_ANSWER = "I ran out of {reason} before I could look this up. Please try again with a narrower question."
+
+UNAVAILABLE_ANSWER = "I can't look this up right now: {dependencies} unavailable. Please try again in a minute."
@@ -48,6 +48,13 @@ class State(InputState):
     This is a 'managed' variable, controlled by the state machine rather than user code.
     It is set to 'True' when the step count reaches recursion_limit - 1.
     """
+
+    prefetched_context: str = field(default="")
+    """
+    Documentation of the enabled packages retrieved for the latest question before
+    the supervisor's first call. Empty when prefetching is disabled or found nothing
+    confident enough.
+    """
     
     # Additional attributes can be added here as needed.
     # Common examples include:
@@ -7,6 +7,9 @@ consider implementing more robust and specialized tools tailored to your needs.
 """
 
 import os
+import threading
+import time
+from functools import lru_cache
 from pathlib import Path
 from typing import Any, Callable, List
 
@@ -15,16 +18,50 @@ from langgraph.types import Command
 from langchain_core.tools import InjectedToolCallId, BaseTool, tool
 from langchain_core.messages import ToolMessage, ChatMessage, HumanMessage
 from langchain_core.runnables import RunnableConfig
+from langgraph.prebuilt import ToolNode
 
 from docs_doctor.agent.package_expert.graph import create_package_expert
-from docs_doctor.utils.packages import get_available_packages
+from docs_doctor.agent.utils import DEPENDENCY_ERROR_KEY, clear_bound_models
+from docs_doctor.core.budget import BUDGET_KEY
+from docs_doctor.core.metrics import metrics
 from docs_doctor.utils.tree import get_directory_structure
 
-# For testing the package experts
-pydantic_ai_expert = create_package_expert('pydantic_ai')
+_pydantic_ai_expert = None
+_pydantic_ai_expert_lock = threading.Lock()
+
+
+def __getattr__(name: str):
+    # For testing the package experts, compiled on first access
+    global _pydantic_ai_expert
+    if name == "pydantic_ai_expert":
+        with _pydantic_ai_expert_lock:
+            if _pydantic_ai_expert is None:
+                _pydantic_ai_expert = create_package_expert('pydantic_ai')
+            return _pydantic_ai_expert
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Set by LangGraph for the supervisor's own run, or meant for the supervisor only
+_SUPERVISOR_ONLY_KEYS = {"thread_id", "checkpoint_ns", "checkpoint_id", "checkpoint_map", "system_prompt"}
+
+
+def expert_config(config: RunnableConfig) -> RunnableConfig:
+    """Config of a nested package expert run, inheriting the request's settings.
+
+    The expert runs as a separate graph, so the supervisor's thread, checkpoint
+    and callbacks are not passed on. The request budget is shared by reference.
+    """
+    configurable = {
+        key: value for key, value in (config.get("configurable") or {}).items()
+        if (key == BUDGET_KEY or not key.startswith("__")) and key not in _SUPERVISOR_ONLY_KEYS
+    }
+    return RunnableConfig(configurable=configurable)
+
 
 def create_package_expert_tool(package):
     """Create a package expert tool for a package."""
+    # Compiled once per tool rather than on every call
+    package_expert = create_package_expert(package["package_name"])
+
     async def package_expert_tool_func(
         query: str,
         *,
@@ -32,22 +69,34 @@ def create_package_expert_tool(package):
         config: RunnableConfig
     ):
         """Get information from the documentation of a given package."""
-        
-        package_expert = create_package_expert(package["package_name"])
-
+        started = time.perf_counter()
         result = await package_expert.ainvoke({
             "messages": [
                 ChatMessage(
                     content=query,
                     role='custom',
                     custom_data={
-                        package_expert: package['package']
+                        "package": package['package']
                     }
                 )
             ]
-        })
+        }, expert_config(config))
+        metrics.observe(
+            f"expert.latency.{'fast' if result.get('fast_path') else 'loop'}", time.perf_counter() - started
+        )
         
-        output = result['messages'][-1].content
+        answer = result['messages'][-1]
+        error = answer.additional_kwargs.get(DEPENDENCY_ERROR_KEY)
+        if error:
+            # Passed on so the supervisor stops too, instead of asking another expert in vain
+            return ToolMessage(
+                content=answer.content,
+                tool_call_id=tool_call_id,
+                status="error",
+                additional_kwargs={DEPENDENCY_ERROR_KEY: error},
+            )
+
+        output = answer.content
 
         return output
     
@@ -146,11 +195,56 @@ def find_file_locations(
     return found_locations
 
 
+def _default_package_catalog() -> List[dict]:
+    # Imported here, resources imports this module
+    from docs_doctor.resources import get_resources
+
+    return get_resources().package_catalog
+
+
+# Rows of the `packages` table that tool sets are built from, fetched once per
+# process rather than queried from Supabase by the graph's async nodes
+_package_catalog: Callable[[], List[dict]] = _default_package_catalog
+
+
+def use_package_catalog(catalog: Callable[[], List[dict]]) -> None:
+    """Build tool sets from the rows returned by `catalog`, e.g. `AgentResources.package_catalog`."""
+    global _package_catalog
+    _package_catalog = catalog
+    clear_tool_cache()
+
+
 def select_tools(package_names: List[str] | None = None) -> List[Callable[..., Any]]:
+    """Get the supervisor's tools for a set of enabled packages.
+
+    Tool sets are cached per package set, so the returned list must not be modified.
+    """
+    return _select_tools(frozenset(package_names or ()))
+
+
+def select_tool_node(package_names: List[str] | None = None) -> ToolNode:
+    """Get the cached tool node running the tools of a set of enabled packages."""
+    return _select_tool_node(frozenset(package_names or ()))
+
+
+def clear_tool_cache() -> None:
+    """Drop cached tool sets and their model bindings, e.g. after the package catalog changed."""
+    _select_tools.cache_clear()
+    _select_tool_node.cache_clear()
+    clear_bound_models()
+
+
+@lru_cache(maxsize=64)
+def _select_tool_node(package_names: frozenset[str]) -> ToolNode:
+    return ToolNode(_select_tools(package_names))
+
+
+@lru_cache(maxsize=64)
+def _select_tools(package_names: frozenset[str]) -> List[Callable[..., Any]]:
     if package_names:
         TOOLS: List[Callable[..., Any]] = [
             create_package_expert_tool(package)
-            for package in get_available_packages()
+            for package in _package_catalog()
             if package['package_name'] in package_names
         ] + [
             get_project_structure,
@@ -1,12 +1,24 @@
 """Utility & helper functions."""
 
-from supabase import Client
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Sequence
+
 from langchain_core.language_models import BaseChatModel
-from langchain_core.messages import BaseMessage
+from langchain_core.messages import AIMessage, AnyMessage, BaseMessage, HumanMessage, ToolMessage
 from langchain_openai import OpenAIEmbeddings
-from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables import Runnable, RunnableConfig
 
-from docs_doctor.core.llm import get_model, settings
+from docs_doctor.agent.prompts import FINAL_ANSWER_PROMPT, NO_ANSWER, PARTIAL_ANSWER, UNAVAILABLE_ANSWER
+from docs_doctor.core.blobs import hydrate_messages
+from docs_doctor.core.budget import get_budget, record_exhausted
+from docs_doctor.core.hedging import HedgedChatModel
+from docs_doctor.core.http import get_async_http_client, get_http_client
+from docs_doctor.core.llm import get_model, model_id
+from docs_doctor.core.metrics import metrics
+from docs_doctor.core.ratelimit import RateLimiter, fair_share, get_rate_limiter
+from docs_doctor.core.resilience import DependencyError
 
 def get_message_text(msg: BaseMessage) -> str:
     """Get the text content of a message."""
@@ -20,14 +32,214 @@ def get_message_text(msg: BaseMessage) -> str:
         return "".join(txts).strip()
 
 
-def call_model(config: RunnableConfig) -> BaseChatModel:
-    """Load a chat model from a fully specified name.
+# Tool bindings per (model id, tool names), least recently used first
+_bound_models: "OrderedDict[tuple[str, frozenset[str]], Runnable]" = OrderedDict()
+_bound_models_lock = threading.Lock()
+# Same bound as the tool set caches of agent.tools
+BOUND_MODELS_SIZE = 64
+
+
+def _tool_name(tool: Any) -> str:
+    return getattr(tool, "name", None) or getattr(tool, "__name__", None) or repr(tool)
+
+
+def _bind_tools(name: str, tools: Sequence[Callable[..., Any]] | None) -> BaseChatModel | Runnable:
+    """Bind tools to a cached model, reusing the binding for the same tools."""
+    model = get_model(name)
+    if tools is None:
+        return model
+    key = (name, frozenset(_tool_name(tool) for tool in tools))
+    with _bound_models_lock:
+        bound = _bound_models.get(key)
+        if bound is not None:
+            _bound_models.move_to_end(key)
+            return bound
+        bound = _bound_models[key] = model.bind_tools(tools)
+        if len(_bound_models) > BOUND_MODELS_SIZE:
+            _bound_models.popitem(last=False)
+        return bound
+
+
+def clear_bound_models() -> None:
+    """Drop cached tool bindings, e.g. with the tool sets they were built from."""
+    with _bound_models_lock:
+        _bound_models.clear()
+
+
+def call_model(
+    config: RunnableConfig,
+    tools: Sequence[Callable[..., Any]] | None = None,
+) -> BaseChatModel | Runnable:
+    """Load the configured chat model, optionally bound to tools.
+
+    When `fallback_models` are configured, the model is wrapped in a
+    `HedgedChatModel` that fails over to them on errors and, if `hedge_delay`
+    or `hedge_on_p95` is set, hedges slow requests.
 
     Args:
-        fully_specified_name (str): String in the format 'provider/model'.
+        config (RunnableConfig): Run config, whose `configurable` holds the model
+            id and the hedging options.
+        tools (Sequence[Callable], optional): Tools to bind to every model in the chain.
     """
-    model = get_model(config["configurable"].get("model", settings.DEFAULT_MODEL))
-    return model
+    configurable = config["configurable"]
+    # get_model normalizes ids and model dicts so the instance cache is always hit.
+    # model_id resolves a missing model to the default, which lists the OpenRouter
+    # models on first use, so it must not be evaluated when the request sets one.
+    model_ids = [model_id(configurable.get("model"))]
+    model_ids += [m for m in configurable.get("fallback_models") or [] if m not in model_ids]
+
+    models = [(name, _bind_tools(name, tools)) for name in model_ids]
+
+    if len(models) == 1:
+        return models[0][1]
+    return HedgedChatModel(
+        models,
+        hedge_delay=configurable.get("hedge_delay"),
+        hedge_on_p95=configurable.get("hedge_on_p95", False),
+    )
+
+
+def partial_answer(messages: Sequence[AnyMessage], reason: str, draft: str = "", id: str | None = None) -> AIMessage:
+    """Best answer without another model call: the draft and tool results of the current question."""
+    record_exhausted(reason)
+    tool_results = []
+    for message in reversed(messages):
+        if isinstance(message, HumanMessage):
+            break
+        if isinstance(message, ToolMessage):
+            tool_results.append(get_message_text(message))
+    findings = ([draft] if draft else []) + tool_results[::-1]
+    if not findings:
+        return AIMessage(id=id, content=NO_ANSWER.format(reason=reason))
+    return AIMessage(id=id, content=PARTIAL_ANSWER.format(reason=reason, findings="\n\n---\n\n".join(findings)))
+
+
+# additional_kwargs key of messages reporting a dependency outage
+DEPENDENCY_ERROR_KEY = "dependency_error"
+_DEPENDENCY_NAMES = {"supabase": "the documentation database", "embeddings": "the embedding API"}
+
+
+def dependency_error_message(error: DependencyError, tool_call_id: str) -> ToolMessage:
+    """Tool result reporting that a dependency is down, which the graphs route on."""
+    return ToolMessage(
+        content=f"Error: {error}. Do not call this tool again for now.",
+        tool_call_id=tool_call_id,
+        status="error",
+        additional_kwargs={DEPENDENCY_ERROR_KEY: {"dependencies": [error.dependency], **error.to_dict()}},
+    )
+
+
+def unavailable_dependencies(messages: Sequence[AnyMessage]) -> list[str]:
+    """Dependencies reported down by the tool results of the latest step.
+
+    Empty unless every tool call of the step failed on a dependency, as a
+    partial result is still worth another model call.
+    """
+    errors = []
+    for message in reversed(messages):
+        if not isinstance(message, ToolMessage):
+            break
+        errors.append(message.additional_kwargs.get(DEPENDENCY_ERROR_KEY))
+    if not errors or not all(errors):
+        return []
+    return sorted({dependency for error in errors for dependency in error["dependencies"]})
+
+
+def unavailable_answer(dependencies: Sequence[str]) -> AIMessage:
+    """Answer without a model call when the dependencies needed to look anything up are down."""
+    metrics.incr("agent.unavailable")
+    names = [_DEPENDENCY_NAMES.get(dependency, dependency) for dependency in dependencies]
+    return AIMessage(
+        content=UNAVAILABLE_ANSWER.format(
+            dependencies=f"{' and '.join(names)} {'is' if len(names) == 1 else 'are'}"
+        ),
+        additional_kwargs={DEPENDENCY_ERROR_KEY: {"dependencies": list(dependencies)}},
+    )
+
+
+async def ainvoke_within_budget(
+    model: BaseChatModel | Runnable,
+    system_message: str,
+    messages: Sequence[AnyMessage],
+    config: RunnableConfig,
+    final: bool = False,
+) -> AIMessage:
+    """Call the model within the request's budget, if one is attached to the config.
+
+    Once the budget is spent, the partial answer is returned without a call.
+    The last call allowed by the budget, or a `final` one, is asked to answer
+    instead of calling tools, and calls are cut off at the deadline.
+    Tool outputs stored out of band are hydrated for the model. Calls wait
+    for the shared OpenRouter rate limit, queued under the conversation's thread.
+    """
+    messages = hydrate_messages(messages)
+    budget = get_budget(config)
+    reason = budget.exhausted() if budget else None
+    if reason:
+        return partial_answer(messages, reason)
+
+    final = final or (budget is not None and budget.is_final_call())
+    if final:
+        system_message += FINAL_ANSWER_PROMPT
+    try:
+        with fair_share((config.get("configurable") or {}).get("thread_id")):
+            response = await asyncio.wait_for(
+                model.ainvoke([{"role": "system", "content": system_message}, *messages], config),
+                timeout=budget.remaining_time() if budget else None,
+            )
+    except asyncio.TimeoutError:
+        return partial_answer(messages, "time")
+    if budget:
+        budget.charge(response)
+    # The prompt was charged up front, completion tokens are only known now
+    usage = getattr(response, "usage_metadata", None) or {}
+    get_rate_limiter("openrouter").charge(usage.get("output_tokens", 0))
+
+    if final and response.tool_calls:
+        # Tools stay bound so the history's tool calls remain valid, but none are run
+        return partial_answer(messages, "steps", draft=get_message_text(response), id=response.id)
+    return response
+
+
+_embedding_model: OpenAIEmbeddings | None = None
+_embedding_model_lock = threading.Lock()
+
+
+def get_embedding_model() -> OpenAIEmbeddings:
+    """Get the shared embedding model, built on first use.
+
+    Requests go through the `embeddings` upstream's pool and rate limit.
+    """
+    global _embedding_model
+    with _embedding_model_lock:
+        if _embedding_model is None:
+            _embedding_model = OpenAIEmbeddings(
+                model="text-embedding-3-small",
+                # Retried by call_with_retry, with the embedding API's circuit breaker
+                max_retries=0,
+                http_async_client=get_async_http_client("embeddings"),
+                http_client=get_http_client("embeddings"),
+            )
+        return _embedding_model
+
+
+def get_embeddings_limiter() -> RateLimiter | None:
+    """Limiter of the embedding API, passed to `call_with_retry` by embedding calls.
+
+    They wait for it before each attempt, outside of `EMBEDDINGS_TIMEOUT`, so
+    throttling is neither a timeout nor a breaker failure. None while a
+    cassette replays, replayed requests are neither limited nor sent.
+    """
+    from docs_doctor.core.cassette import get_cassette
+
+    cassette = get_cassette()
+    if cassette is not None and cassette.replaying:
+        return None
+    return get_rate_limiter("embeddings")
 
 
-embedding_model = OpenAIEmbeddings(model="text-embedding-3-small")
\ No newline at end of file
+def __getattr__(name: str):
+    # Backwards compatible `embedding_model` attribute, built on first access
+    if name == "embedding_model":
+        return get_embedding_model()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
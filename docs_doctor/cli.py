@@ -1,4 +1,6 @@
+import asyncio
 import click
+import contextlib
 import os
 import subprocess
 import sys
@@ -6,6 +8,36 @@ from pathlib import Path
 from dotenv import load_dotenv
 load_dotenv()
 
+
+def _load_agent():
+    """Get the shared DocsDoctor graph for a headless run."""
+    from docs_doctor.resources import get_resources
+
+    return get_resources().get_agent()
+
+
+def _default_model(model: str | None) -> str:
+    from docs_doctor.core.llm import model_id
+
+    return model_id(model)
+
+def _cassette(model: str | None, record: str | None, replay: str | None, replay_latency: str):
+    """Context recording or replaying the upstream calls of a run, if asked to."""
+    if record and replay:
+        raise click.UsageError("--record and --replay cannot be used together")
+    if replay and model is None:
+        # The default model comes from the live OpenRouter model list
+        raise click.UsageError("--model is required with --replay")
+    if not (record or replay):
+        return contextlib.nullcontext()
+    from docs_doctor.core.cassette import use_cassette
+
+    return use_cassette(
+        record or replay,
+        mode="record" if record else "replay",
+        latency_scale=0.0 if replay_latency == "zero" else 1.0,
+    )
+
 @click.group()
 def cli():
     """Command line interface for docs-doctor"""
@@ -24,7 +56,13 @@ def cli():
     help="Port to run the Streamlit app on",
     show_default=True,
 )
-def serve(host: str, port: int):
+@click.option(
+    "--profile",
+    default=None,
+    type=click.Choice(["sample", "cprofile"]),
+    help="Let the app profile chosen messages, one profile file per message in PROFILE_DIR",
+)
+def serve(host: str, port: int, profile: str | None):
     """Run the app locally using Streamlit"""
     # Original local server logic
     current_dir = Path(__file__).parent
@@ -39,6 +77,8 @@ def serve(host: str, port: int):
     env["STREAMLIT_SERVER_ADDRESS"] = host
     env["STREAMLIT_BROWSER_GATHER_USAGE_STATS"] = "false"
     env["STREAMLIT_CLIENT_TOOLBAR_MODE"] = "minimal"
+    if profile:
+        env["PROFILE_MODE"] = profile
     
     click.echo(f"Starting Streamlit app on http://{host}:{port}")
     
@@ -66,5 +106,375 @@ def serve(host: str, port: int):
         sys.exit(0)
 
 
+@cli.command()
+@click.option(
+    "--host",
+    default="localhost",
+    help="Host to run the API service on",
+    show_default=True,
+)
+@click.option(
+    "--port",
+    default=8000,
+    help="Port to run the API service on",
+    show_default=True,
+)
+@click.option(
+    "--workers",
+    default=1,
+    type=click.IntRange(min=1),
+    help="Number of worker processes, all sharing the durable checkpointer",
+    show_default=True,
+)
+def api(host: str, port: int, workers: int):
+    """Run the async HTTP API service"""
+    import uvicorn
+
+    click.echo(f"Starting API service on http://{host}:{port} with {workers} worker(s)")
+    uvicorn.run(
+        "docs_doctor.service:app",
+        host=host,
+        port=port,
+        workers=workers,
+        log_level="info",
+    )
+
+
+@cli.command()
+@click.argument("question")
+@click.option(
+    "--model",
+    default=None,
+    help="OpenRouter model id, defaults to the first model with tool support",
+)
+@click.option(
+    "--package",
+    "packages",
+    multiple=True,
+    help="Package expert to enable, can be repeated",
+)
+@click.option(
+    "--thread-id",
+    default=None,
+    help="Thread ID of the conversation",
+)
+@click.option(
+    "--prefetch",
+    is_flag=True,
+    help="Search the enabled packages' docs before the supervisor's first call",
+)
+@click.option(
+    "--fast-path",
+    is_flag=True,
+    help="Let package experts answer in one call when their first search is confident",
+)
+@click.option(
+    "--timeout",
+    default=None,
+    type=click.FloatRange(min=0, min_open=True),
+    help="Seconds a question may take before the best partial answer is returned",
+)
+@click.option(
+    "--max-model-calls",
+    default=None,
+    type=click.IntRange(min=1),
+    help="Model calls a question may make, package experts included",
+)
+@click.option(
+    "--record",
+    default=None,
+    type=click.Path(dir_okay=False),
+    help="Append every model, embedding and Supabase call to this cassette file",
+)
+@click.option(
+    "--replay",
+    default=None,
+    type=click.Path(exists=True, dir_okay=False),
+    help="Answer model, embedding and Supabase calls from this cassette file, offline",
+)
+@click.option(
+    "--replay-latency",
+    default="original",
+    type=click.Choice(["original", "zero"]),
+    help="Reproduce the recorded latencies when replaying, or none",
+    show_default=True,
+)
+@click.option(
+    "--profile",
+    default=None,
+    type=click.Choice(["sample", "cprofile"]),
+    help="Profile the question: a speedscope flame graph of every thread, or cProfile stats",
+)
+@click.option(
+    "--profile-dir",
+    default=None,
+    type=click.Path(file_okay=False),
+    help="Directory of the profile files [default: PROFILE_DIR]",
+)
+def ask(question: str, model: str | None, packages: tuple[str, ...], thread_id: str | None, prefetch: bool,
+        fast_path: bool, timeout: float | None, max_model_calls: int | None, record: str | None,
+        replay: str | None, replay_latency: str, profile: str | None, profile_dir: str | None):
+    """Ask a single question and stream the answer to stdout"""
+    from docs_doctor.runner import astream_answer, make_config
+
+    with _cassette(model, record, replay, replay_latency):
+        agent = _load_agent()
+        config = make_config(
+            _default_model(model), thread_id, list(packages),
+            prefetch=prefetch, fast_path=fast_path, timeout=timeout, max_model_calls=max_model_calls,
+        )
+
+        async def _ask():
+            async for token in astream_answer(agent, question, config):
+                click.echo(token, nl=False)
+            click.echo()
+
+        profiling = contextlib.nullcontext()
+        if profile:
+            from docs_doctor.core.profiling import profile_request, request_tags
+
+            configurable = config["configurable"]
+            profiling = profile_request(
+                request_tags(configurable["thread_id"], configurable["packages"], configurable["model"]),
+                profile,
+                profile_dir,
+            )
+        try:
+            with profiling as profiled:
+                asyncio.run(_ask())
+        except KeyboardInterrupt:
+            sys.exit(130)
+        if profile:
+            click.echo(f"Profile written to {profiled.path} ({profiled.duration:.2f}s)", err=True)
+
+
+@cli.command()
+@click.argument("input_file", type=click.File("r"))
+@click.option(
+    "--output",
+    "output_file",
+    type=click.File("w"),
+    default="-",
+    help="JSONL file receiving the results as they finish",
+    show_default=True,
+)
+@click.option(
+    "--model",
+    default=None,
+    help="Default OpenRouter model id, a question's `model` field overrides it",
+)
+@click.option(
+    "--package",
+    "packages",
+    multiple=True,
+    help="Package expert to enable, can be repeated",
+)
+@click.option(
+    "--concurrency",
+    default=8,
+    type=click.IntRange(min=1),
+    help="Maximum number of questions running at the same time",
+    show_default=True,
+)
+@click.option(
+    "--prefetch",
+    is_flag=True,
+    help="Search the enabled packages' docs before the supervisor's first call",
+)
+@click.option(
+    "--fast-path",
+    is_flag=True,
+    help="Let package experts answer in one call when their first search is confident",
+)
+@click.option(
+    "--timeout",
+    default=None,
+    type=click.FloatRange(min=0, min_open=True),
+    help="Seconds a question may take before the best partial answer is returned",
+)
+@click.option(
+    "--max-model-calls",
+    default=None,
+    type=click.IntRange(min=1),
+    help="Model calls a question may make, package experts included",
+)
+@click.option(
+    "--record",
+    default=None,
+    type=click.Path(dir_okay=False),
+    help="Append every model, embedding and Supabase call to this cassette file",
+)
+@click.option(
+    "--replay",
+    default=None,
+    type=click.Path(exists=True, dir_okay=False),
+    help="Answer model, embedding and Supabase calls from this cassette file, offline",
+)
+@click.option(
+    "--replay-latency",
+    default="original",
+    type=click.Choice(["original", "zero"]),
+    help="Reproduce the recorded latencies when replaying, or none",
+    show_default=True,
+)
+def batch(input_file, output_file, model: str | None, packages: tuple[str, ...], concurrency: int,
+          prefetch: bool, fast_path: bool, timeout: float | None, max_model_calls: int | None,
+          record: str | None, replay: str | None, replay_latency: str):
+    """Answer questions from a JSONL file ({"question": ...} per line)"""
+    from docs_doctor.runner import read_questions, run_batch
+
+    questions = read_questions(input_file)
+    with _cassette(model, record, replay, replay_latency):
+        agent = _load_agent()
+
+        stats = asyncio.run(
+            run_batch(agent, questions, output_file, _default_model(model), concurrency, list(packages),
+                      configurable={"prefetch": prefetch, "fast_path": fast_path,
+                                    "timeout": timeout, "max_model_calls": max_model_calls})
+        )
+    click.echo(stats.summary(), err=True)
+    if fast_path:
+        from docs_doctor.agent.package_expert import fast_path_stats
+
+        fast = fast_path_stats()
+        click.echo(
+            f"expert fast path: {fast['hits']:.0f}/{fast['hits'] + fast['misses']:.0f} "
+            f"({fast['hit_rate']:.0%}), p50 {fast['fast_p50']:.2f}s vs {fast['loop_p50']:.2f}s in the tool loop, "
+            f"~{fast['saved_seconds']:.1f}s saved",
+            err=True,
+        )
+    if stats.failed:
+        sys.exit(1)
+
+
+@cli.command()
+@click.argument("path", type=click.Path(exists=True))
+@click.option("--package-name", required=True, help="Identifier of the package expert, e.g. pydantic_ai")
+@click.option("--package", "package_title", required=True, help="Display name of the package, e.g. 'Pydantic AI'")
+@click.option("--description", required=True, help="Short description of the package for the supervisor")
+@click.option("--base-url", default=None, help="Public URL of the docs, used to build page URLs of local files [default: local://<package-name>/]")
+@click.option("--sitemap", is_flag=True, help="PATH is a saved sitemap XML file whose pages are fetched")
+@click.option("--workers", default=None, type=click.IntRange(min=1), help="Processes converting and chunking pages [default: CPU count]")
+@click.option("--chunk-size", default=5000, type=click.IntRange(min=100), help="Maximum characters per chunk", show_default=True)
+@click.option("--embed-batch-size", default=64, type=click.IntRange(min=1), help="Chunks per embedding request", show_default=True)
+@click.option("--embed-concurrency", default=4, type=click.IntRange(min=1), help="Embedding requests in flight", show_default=True)
+@click.option("--requests-per-minute", default=3000, type=click.IntRange(min=1), help="Embedding request budget", show_default=True)
+@click.option("--tokens-per-minute", default=1_000_000, type=click.IntRange(min=1), help="Embedding token budget", show_default=True)
+@click.option("--write-batch-size", default=100, type=click.IntRange(min=1), help="Rows per Supabase upsert", show_default=True)
+@click.option("--full", is_flag=True, help="Re-embed every chunk instead of only new and changed ones")
+def ingest(path: str, package_name: str, package_title: str, description: str, base_url: str | None,
+           sitemap: bool, workers: int | None, chunk_size: int, embed_batch_size: int,
+           embed_concurrency: int, requests_per_minute: int, tokens_per_minute: int,
+           write_batch_size: int, full: bool):
+    """Ingest a package's documentation into the knowledge base"""
+    from docs_doctor.ingest import IngestOptions, ingest_package
+
+    options = IngestOptions(
+        workers=workers,
+        chunk_size=chunk_size,
+        embed_batch_size=embed_batch_size,
+        embed_concurrency=embed_concurrency,
+        requests_per_minute=requests_per_minute,
+        tokens_per_minute=tokens_per_minute,
+        write_batch_size=write_batch_size,
+    )
+    stats = asyncio.run(ingest_package(
+        path,
+        package_name=package_name,
+        package=package_title,
+        description=description,
+        base_url=base_url,
+        sitemap=sitemap,
+        options=options,
+        progress=lambda stats: click.echo(stats.summary(), err=True),
+        full=full,
+    ))
+    click.echo(stats.summary())
+    if stats.failed_pages:
+        sys.exit(1)
+
+
+@cli.command()
+@click.option(
+    "--backend",
+    default="fake",
+    type=click.Choice(["fake", "replay"]),
+    help="Synthetic upstreams, or a recorded cassette replayed in a loop",
+    show_default=True,
+)
+@click.option(
+    "--cassette",
+    default=None,
+    type=click.Path(exists=True, dir_okay=False),
+    help="Cassette replayed by the replay backend, see `ask --record`",
+)
+@click.option(
+    "--replay-latency",
+    default="original",
+    type=click.Choice(["original", "zero"]),
+    help="Reproduce the recorded latencies when replaying, or none",
+    show_default=True,
+)
+@click.option(
+    "--users",
+    "levels",
+    multiple=True,
+    type=click.IntRange(min=1),
+    help="Concurrent users of a stage, repeat to step up the load [default: 1, 5, 10]",
+)
+@click.option("--stage-seconds", default=30.0, type=click.FloatRange(min=0, min_open=True), help="Duration of each stage", show_default=True)
+@click.option("--ramp-seconds", default=5.0, type=click.FloatRange(min=0), help="Time over which a stage's users start", show_default=True)
+@click.option("--script", default=None, type=click.File("r"), help="JSONL conversations, one list of user messages per line")
+@click.option("--model", default=None, help="Model id of every turn [default: fake/model with the fake backend]")
+@click.option("--package", "packages", multiple=True, help="Package expert to enable, can be repeated [default: all]")
+@click.option(
+    "--mode",
+    default="stream",
+    type=click.Choice(["stream", "invoke"]),
+    help="Stream answers and measure time to first token, or invoke",
+    show_default=True,
+)
+@click.option("--ttft", default=0.3, type=click.FloatRange(min=0), help="Fake model's seconds to first token", show_default=True)
+@click.option("--tokens-per-second", default=60.0, type=click.FloatRange(min=0, min_open=True), help="Fake model's token rate", show_default=True)
+@click.option("--answer-tokens", default=60, type=click.IntRange(min=1), help="Tokens of every fake answer", show_default=True)
+@click.option("--output", default=None, type=click.File("w"), help="File receiving the JSON report")
+def loadtest(backend: str, cassette: str | None, replay_latency: str, levels: tuple[int, ...], stage_seconds: float,
+             ramp_seconds: float, script, model: str | None, packages: tuple[str, ...], mode: str, ttft: float,
+             tokens_per_second: float, answer_tokens: int, output):
+    """Simulate concurrent users holding scripted conversations, offline"""
+    import json
+
+    from docs_doctor.client import DirectAgentClient
+    from docs_doctor.core.cassette import use_backend, use_cassette
+    from docs_doctor.core.fake import FAKE_MODEL, FakeBackend
+    from docs_doctor.loadtest import DEFAULT_SCRIPTS, read_scripts, report, run_load
+    from docs_doctor.resources import AgentResources
+
+    if backend == "replay":
+        if cassette is None or model is None:
+            raise click.UsageError("--cassette and --model are required with --backend replay")
+        context = use_cassette(cassette, "replay", 0.0 if replay_latency == "zero" else 1.0, loop=True)
+        models = [{"id": model, "name": model}]
+    else:
+        context = use_backend(FakeBackend(ttft=ttft, tokens_per_second=tokens_per_second, answer_tokens=answer_tokens))
+        model = model or FAKE_MODEL["id"]
+        models = [{**FAKE_MODEL, "id": model}]
+    scripts = read_scripts(script) if script else DEFAULT_SCRIPTS
+
+    with context:
+        # Own resources, so the model list and package catalog come from the backend
+        client = DirectAgentClient(AgentResources(models=models))
+        client.info.packages = list(packages) or list(client.info.available_packages)
+        click.echo(f"{backend} backend, packages: {', '.join(client.info.packages) or 'none'}", err=True)
+        results = asyncio.run(run_load(
+            client, scripts, list(levels) or [1, 5, 10], model, stage_seconds, ramp_seconds,
+            stream=mode == "stream", on_stage=lambda stats: click.echo(stats.summary()),
+        ))
+    if output:
+        json.dump(report(results), output, indent=2)
+    if any(stats.errors for stats in results):
+        sys.exit(1)
+
+
 if __name__ == "__main__":
     cli()
\ No newline at end of file
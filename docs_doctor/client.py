@@ -0,0 +1,116 @@
+import logging
+from types import SimpleNamespace
+from typing import Any, AsyncGenerator
+
+from langchain_core.messages import HumanMessage
+from langchain_core.runnables import RunnableConfig
+
+from docs_doctor.core.hedging import STREAM_RESET_EVENT
+from docs_doctor.core.loop import iterate_in_loop, run_in_loop
+from docs_doctor.resources import AgentResources, get_resources
+from docs_doctor.runner import ANSWER_NODE
+from docs_doctor.schema import ChatHistory, ChatMessage
+from docs_doctor.utils.streamlit_utils import (
+    convert_message_content_to_string,
+    hydrate_chat_message,
+    langchain_to_chat_message,
+    remove_tool_calls,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class DirectAgentClient:
+    """In-process client for one session.
+
+    Graphs, catalogs and connection pools come from the process-wide
+    `AgentResources`; the client itself only holds the session's package
+    selection, so creating one is cheap.
+    """
+
+    def __init__(self, resources: AgentResources | None = None):
+        self.resources = resources or get_resources()
+        self.info = self._get_service_info()
+
+    def _get_service_info(self):
+        default_packages = self.resources.default_packages
+        return SimpleNamespace(
+            models=self.resources.models,
+            model_catalog=self.resources.model_catalog,
+            default_model=self.resources.default_model,
+            default_packages=default_packages,
+            available_packages=self.resources.available_packages,
+            packages=list(default_packages),
+        )
+
+    @property
+    def agent(self):
+        return self.resources.get_agent()
+
+    def _create_config(self, message: str, model: str, thread_id: str) -> dict[str, Any]:
+        # The shared checkpointer holds the thread history, only the new message is sent
+        return {
+            "input": {"messages": [HumanMessage(content=message)]},
+            "config": RunnableConfig(
+                configurable={
+                    "thread_id": thread_id,
+                    "model": model,
+                    "packages": list(self.info.packages),
+                },
+            ),
+        }
+
+    async def ainvoke(self, message: str, model: str, thread_id: str) -> ChatMessage:
+        config = self._create_config(message, model, thread_id)
+        # Run on the shared loop so pooled connections outlive this script run
+        response = await run_in_loop(self.agent.ainvoke(**config))
+        return langchain_to_chat_message(response["messages"][-1])
+
+    async def astream(self, message: str, model: str, thread_id: str) -> AsyncGenerator[ChatMessage | str, None]:
+        config = self._create_config(message, model, thread_id)
+
+        # Run on the shared loop so pooled connections outlive this script run
+        events = iterate_in_loop(self.agent.astream_events(**config, version="v2"))
+        async for event in events:
+            if not event:
+                continue
+
+            new_messages = []
+            if (event["event"] == "on_chain_end" and
+                any(t.startswith("graph:step:") for t in event.get("tags", [])) and
+                isinstance(event["data"].get("output"), dict) and
+                "messages" in event["data"]["output"]):
+                new_messages = event["data"]["output"]["messages"]
+            elif event["event"] == "on_custom_event" and "custom_data_dispatch" in event.get("tags", []):
+                new_messages = [event["data"]]
+
+            for new_message in new_messages:
+                try:
+                    chat_message = langchain_to_chat_message(new_message)
+                    if not (chat_message.type == "human" and chat_message.content == message):
+                        yield chat_message
+                except Exception as e:
+                    logger.error(f"Error parsing message: {e}")
+
+            # Only stream the supervisor's answer, not the package experts' tokens
+            if (event["event"] == "on_chat_model_stream" and
+                event.get("metadata", {}).get("langgraph_node") == ANSWER_NODE):
+                content = remove_tool_calls(event["data"]["chunk"].content)
+                if content:
+                    yield convert_message_content_to_string(content)
+
+            # A fallback model answered, the tokens streamed so far are not part of its answer
+            if (event["event"] == "on_custom_event" and event["name"] == STREAM_RESET_EVENT and
+                event.get("metadata", {}).get("langgraph_node") == ANSWER_NODE):
+                yield ChatMessage(type="custom", content="", custom_data={"event": STREAM_RESET_EVENT, **event["data"]})
+
+    def get_history(self, thread_id: str) -> ChatHistory:
+        state = self.agent.get_state(
+            config=RunnableConfig(
+                configurable={"thread_id": thread_id},
+                callbacks=None,
+            )
+        )
+        messages = state.values.get('messages', []) if state else []
+        # Tool outputs stored out of band are returned in full
+        return ChatHistory(messages=[hydrate_chat_message(langchain_to_chat_message(m)) for m in messages])
@@ -1,4 +1,8 @@
+from docs_doctor.core.hedging import hedge_stats
+from docs_doctor.core.http import pool_stats
 from docs_doctor.core.llm import get_model
+from docs_doctor.core.metrics import metrics
+from docs_doctor.core.ratelimit import rate_limit_stats
 from docs_doctor.core.settings import settings
 
-__all__ = ["settings", "get_model"]
+__all__ = ["settings", "get_model", "metrics", "pool_stats", "hedge_stats", "rate_limit_stats"]
@@ -0,0 +1,130 @@
+"""Content-addressed storage of large tool outputs.
+
+Documentation pages, file contents and directory trees returned by tools would
+otherwise be serialized into every checkpoint of a thread and copied into each
+history rebuild. Tool messages larger than `BLOB_THRESHOLD` characters are
+stored under the sha256 of their text in `BLOB_STORE_PATH`, and the message
+keeps a summary and a reference in `additional_kwargs`. The full text is only
+hydrated when the messages are sent to a model or displayed.
+
+Blobs are plain files, so every worker process on the host shares them, but
+workers on other hosts do not. A Postgres checkpointer lets any host continue a
+thread, so with `POSTGRES_CONN_STRING` set tool outputs are only offloaded when
+`BLOB_STORE_SHARED` declares `BLOB_STORE_PATH` to be storage every host mounts;
+otherwise they stay in the checkpoints.
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional, Sequence
+
+from langchain_core.messages import AnyMessage, ToolMessage
+
+from docs_doctor.core.metrics import metrics
+from docs_doctor.core.settings import settings
+
+BLOB_KEY = "blob"
+
+
+class BlobStore:
+    """File-system store of texts addressed by their sha256."""
+
+    def __init__(self, root: str | Path):
+        self.root = Path(root)
+
+    def _path(self, blob_id: str) -> Path:
+        return self.root / blob_id[:2] / blob_id[2:]
+
+    def put(self, text: str) -> str:
+        """Store a text and return its id. Storing the same text again is free."""
+        data = text.encode("utf-8")
+        blob_id = hashlib.sha256(data).hexdigest()
+        path = self._path(blob_id)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Write then rename, so concurrent readers never see a partial blob
+            fd, tmp = tempfile.mkstemp(dir=path.parent)
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        return blob_id
+
+    def get(self, blob_id: str) -> Optional[str]:
+        """Get a stored text, or None if it is missing."""
+        try:
+            return _read(self._path(blob_id))
+        except FileNotFoundError:
+            return None
+
+
+@lru_cache(maxsize=128)
+def _read(path: Path) -> str:
+    # Blobs never change, so recently hydrated ones are kept in memory. A missing
+    # blob raises, which is not cached: another worker may still write it.
+    return path.read_text(encoding="utf-8")
+
+
+_store: Optional[BlobStore] = None
+_store_lock = threading.Lock()
+
+
+def get_blob_store() -> BlobStore:
+    """Get the blob store at `BLOB_STORE_PATH`."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = BlobStore(settings.BLOB_STORE_PATH)
+        return _store
+
+
+def offloading_enabled() -> bool:
+    """Whether every worker that may continue a thread can read the blob store."""
+    return not settings.POSTGRES_CONN_STRING or settings.BLOB_STORE_SHARED
+
+
+def offload_message(message: AnyMessage) -> AnyMessage:
+    """Move the content of a large tool message to the blob store.
+
+    The returned copy keeps the message id, a summary of the content and the
+    blob reference; other messages, and every message while offloading is not
+    enabled, are returned unchanged.
+    """
+    if not isinstance(message, ToolMessage) or not isinstance(message.content, str):
+        return message
+    if not offloading_enabled():
+        return message
+    text = message.content
+    if len(text) <= settings.BLOB_THRESHOLD or BLOB_KEY in message.additional_kwargs:
+        return message
+    blob_id = get_blob_store().put(text)
+    summary = text[: settings.BLOB_SUMMARY_CHARS].rstrip()
+    metrics.incr("blobs.offloaded")
+    metrics.incr("blobs.chars_offloaded", len(text) - len(summary))
+    return message.model_copy(update={
+        "content": f"{summary}\n\n[... {len(text)} characters stored out of band]",
+        "additional_kwargs": {**message.additional_kwargs, BLOB_KEY: {"id": blob_id, "size": len(text)}},
+    })
+
+
+def hydrate_message(message: AnyMessage) -> AnyMessage:
+    """Restore the full content of an offloaded message.
+
+    A message whose blob is missing keeps its summary.
+    """
+    reference = message.additional_kwargs.get(BLOB_KEY) if isinstance(message, ToolMessage) else None
+    if not reference:
+        return message
+    text = get_blob_store().get(reference["id"])
+    if text is None:
+        metrics.incr("blobs.missing")
+        return message
+    return message.model_copy(update={"content": text})
+
+
+def hydrate_messages(messages: Sequence[AnyMessage]) -> list[AnyMessage]:
+    """Hydrate every offloaded message of a list."""
+    return [hydrate_message(message) for message in messages]
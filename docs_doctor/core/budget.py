@@ -0,0 +1,106 @@
+"""Request-wide deadline and model call / token budget.
+
+A `RequestBudget` is attached to a run's config by the caller and shared by
+reference with the nested package expert runs, so the supervisor and every
+expert draw from the same wall time, model calls and tokens. Nodes check it
+before each model call and answer with what they have when it runs out.
+"""
+
+import time
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from langchain_core.runnables import RunnableConfig
+
+from docs_doctor.core.metrics import metrics
+
+# Private configurable keys are not copied into run metadata or checkpoints
+BUDGET_KEY = "__docs_doctor_budget"
+
+
+@dataclass
+class RequestBudget:
+    """Limits of one request, all optional, and what was used so far."""
+
+    deadline: Optional[float] = None
+    """`time.monotonic()` value after which no model call is started."""
+    max_model_calls: Optional[int] = None
+    max_tokens: Optional[int] = None
+    final_answer_reserve: float = 10.0
+    """Seconds kept for the final answer, model calls after that are asked to answer."""
+    model_calls: int = 0
+    tokens: int = 0
+
+    @classmethod
+    def start(
+        cls,
+        timeout: Optional[float] = None,
+        max_model_calls: Optional[int] = None,
+        max_tokens: Optional[int] = None,
+        final_answer_reserve: float = 10.0,
+    ) -> "RequestBudget":
+        """Budget of a request starting now."""
+        if timeout is None:
+            return cls(None, max_model_calls, max_tokens, final_answer_reserve)
+        # Short timeouts keep half of their time for the final answer
+        reserve = min(final_answer_reserve, timeout / 2)
+        return cls(time.monotonic() + timeout, max_model_calls, max_tokens, reserve)
+
+    def remaining_time(self) -> Optional[float]:
+        """Seconds until the deadline, None without a deadline."""
+        if self.deadline is None:
+            return None
+        return max(self.deadline - time.monotonic(), 0.0)
+
+    def exhausted(self) -> Optional[str]:
+        """Why no further model call may be made, or None."""
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            return "time"
+        if self.max_model_calls is not None and self.model_calls >= self.max_model_calls:
+            return "model calls"
+        if self.max_tokens is not None and self.tokens >= self.max_tokens:
+            return "tokens"
+        return None
+
+    def is_final_call(self) -> bool:
+        """Whether the next model call should answer instead of calling tools."""
+        remaining = self.remaining_time()
+        if remaining is not None and remaining <= self.final_answer_reserve:
+            return True
+        return self.max_model_calls is not None and self.model_calls + 1 >= self.max_model_calls
+
+    def charge(self, message: Any) -> None:
+        """Count a model call and the tokens reported in its usage metadata."""
+        self.model_calls += 1
+        usage = getattr(message, "usage_metadata", None) or {}
+        self.tokens += usage.get("total_tokens", 0)
+
+
+def attach_budget(
+    config: RunnableConfig,
+    timeout: Optional[float] = None,
+    max_model_calls: Optional[int] = None,
+    max_tokens: Optional[int] = None,
+) -> RunnableConfig:
+    """Attach a new `RequestBudget` to a run config when any limit is set.
+
+    Limits default to the `timeout`, `max_model_calls` and `max_tokens`
+    configurable fields.
+    """
+    configurable = config.setdefault("configurable", {})
+    timeout = timeout if timeout is not None else configurable.get("timeout")
+    max_model_calls = max_model_calls if max_model_calls is not None else configurable.get("max_model_calls")
+    max_tokens = max_tokens if max_tokens is not None else configurable.get("max_tokens")
+    if timeout is not None or max_model_calls is not None or max_tokens is not None:
+        configurable[BUDGET_KEY] = RequestBudget.start(timeout, max_model_calls, max_tokens)
+    return config
+
+
+def get_budget(config: Optional[RunnableConfig]) -> Optional[RequestBudget]:
+    """Get the budget attached to a run config, if any."""
+    return ((config or {}).get("configurable") or {}).get(BUDGET_KEY)
+
+
+def record_exhausted(reason: str) -> None:
+    """Count a request cut short, by the limit it hit."""
+    metrics.incr(f"budget.exhausted.{reason.replace(' ', '_')}")
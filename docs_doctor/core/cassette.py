@@ -0,0 +1,383 @@
+"""Record and replay of upstream interactions.
+
+A cassette is a JSONL file with one upstream interaction per line: chat model
+and embedding HTTP requests (recorded by `CassetteTransport`, with the timing
+of every streamed chunk) and Supabase queries (recorded by the `execute`
+helpers of `docs_doctor.utils`).
+
+- record: calls go to the upstreams as usual and are appended to the cassette.
+- replay: calls never leave the process. Each one is answered with the
+  recorded interaction of the same request, or, if the request changed (e.g.
+  an edited prompt), the next unplayed interaction of the same endpoint.
+  Recorded latencies are reproduced, scaled by `latency_scale` (0 replays
+  instantly), so graph overhead can be profiled and benchmarks run offline.
+
+Activate a cassette with `use_cassette`, or process-wide with the
+`CASSETTE_MODE` and `CASSETTE_PATH` settings. `use_backend` activates any
+object with the same replay interface, e.g. the synthetic upstreams of
+`core.fake`.
+"""
+
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Awaitable, Callable, ContextManager, Deque, Dict, Iterator, List, Optional
+
+import httpx
+
+from docs_doctor.core.metrics import metrics
+
+MODES = ("record", "replay")
+# Response headers kept in a cassette, the others may carry account details
+KEPT_HEADERS = ("content-type", "content-encoding")
+
+
+class CassetteMiss(LookupError):
+    """A replayed call has no recorded interaction left."""
+
+
+def _text(data: bytes) -> str:
+    # Lossless for chunks splitting a multi-byte character, and still readable
+    return data.decode("utf-8", "surrogateescape")
+
+
+def _bytes(text: str) -> bytes:
+    return text.encode("utf-8", "surrogateescape")
+
+
+def _digest(*parts: str | bytes) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class Cassette:
+    """Interactions of one recording, matched by request when replayed."""
+
+    def __init__(self, path: str | Path, mode: str = "replay", latency_scale: float = 1.0, loop: bool = False):
+        """Open a cassette.
+
+        Args:
+            path: JSONL file, appended to when recording.
+            mode: "record" or "replay".
+            latency_scale: Multiplies recorded latencies when replaying, 0 for none.
+            loop: Start over once every interaction was replayed, e.g. to replay
+                a recording many times under load.
+        """
+        if mode not in MODES:
+            raise ValueError(f"Cassette mode must be one of {MODES}, got {mode!r}")
+        self.path = Path(path)
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self.loop = loop
+        self._lock = threading.Lock()
+        self.interactions: List[dict] = []
+        self._by_key: Dict[str, Deque[int]] = defaultdict(deque)
+        self._by_route: Dict[str, Deque[int]] = defaultdict(deque)
+        self._played: set[int] = set()
+        if mode == "replay":
+            with self.path.open(encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        self._index(json.loads(line))
+        else:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def _index(self, interaction: dict) -> None:
+        position = len(self.interactions)
+        self.interactions.append(interaction)
+        self._by_key[interaction["key"]].append(position)
+        self._by_route[interaction["route"]].append(position)
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    def record(self, interaction: dict) -> None:
+        """Append an interaction with a `kind`, `route`, `key` and `latency`."""
+        line = json.dumps(interaction)
+        with self._lock:
+            self.interactions.append(interaction)
+            # One line per interaction, so a crashed process keeps what it recorded
+            with self.path.open("a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        metrics.incr("cassette.recorded")
+
+    def play(self, route: str, key: str) -> dict:
+        """Take the interaction recorded for a request.
+
+        Raises:
+            CassetteMiss: Every interaction of the endpoint was already played.
+        """
+        with self._lock:
+            for rewound in (False, True):
+                if rewound:
+                    if not self.loop or route not in self._by_route:
+                        break
+                    self._rewind()
+                for queue, exact in ((self._by_key.get(key), True), (self._by_route.get(route), False)):
+                    while queue:
+                        position = queue.popleft()
+                        if position not in self._played:
+                            self._played.add(position)
+                            metrics.incr("cassette.replayed" if exact else "cassette.fuzzy")
+                            return self.interactions[position]
+        metrics.incr("cassette.misses")
+        raise CassetteMiss(f"No recorded interaction left for {route} in {self.path}")
+
+    def _rewind(self) -> None:
+        interactions, self.interactions = self.interactions, []
+        self._by_key.clear()
+        self._by_route.clear()
+        self._played.clear()
+        for interaction in interactions:
+            self._index(interaction)
+        metrics.incr("cassette.rewinds")
+
+    def respond(self, request: httpx.Request) -> dict:
+        """Take the interaction recorded for an HTTP request."""
+        route, key = _http_request(request)
+        return self.play(route, key)
+
+    def delay(self, seconds: float) -> float:
+        return max(seconds, 0.0) * self.latency_scale
+
+    async def aquery(self, query: Any, execute: Callable[[], Awaitable[Any]]) -> Any:
+        """Replay or record a Supabase query run by `execute`."""
+        route, key = _query_request(query)
+        if self.replaying:
+            interaction = self.play(route, key)
+            await asyncio.sleep(self.delay(interaction["latency"]))
+            return _api_response(interaction)
+        started = time.perf_counter()
+        result = await execute()
+        self._record_query(route, key, result, time.perf_counter() - started)
+        return result
+
+    def query(self, query: Any, execute: Callable[[], Any]) -> Any:
+        """Blocking `aquery`."""
+        route, key = _query_request(query)
+        if self.replaying:
+            interaction = self.play(route, key)
+            time.sleep(self.delay(interaction["latency"]))
+            return _api_response(interaction)
+        started = time.perf_counter()
+        result = execute()
+        self._record_query(route, key, result, time.perf_counter() - started)
+        return result
+
+    def _record_query(self, route: str, key: str, result: Any, latency: float) -> None:
+        self.record({
+            "kind": "supabase",
+            "route": route,
+            "key": key,
+            "latency": latency,
+            "data": getattr(result, "data", None),
+            "count": getattr(result, "count", None),
+        })
+
+
+def _query_request(query: Any) -> tuple[str, str]:
+    # Postgrest request builders keep the request they will send in `request`
+    request = query.request
+    route = f"{request.http_method} {request.path}"
+    body = json.dumps(request.json, sort_keys=True, default=str)
+    return route, _digest(route, str(request.params), body)
+
+
+def _api_response(interaction: dict) -> Any:
+    from postgrest import APIResponse
+
+    return APIResponse(data=interaction["data"] or [], count=interaction["count"])
+
+
+def _http_request(request: httpx.Request) -> tuple[str, str]:
+    route = f"{request.method} {request.url.host}{request.url.path}"
+    try:
+        body = request.content
+    except httpx.RequestNotRead:
+        body = b""
+    return route, _digest(route, str(request.url.query), body)
+
+
+class _RecordingStream(httpx.AsyncByteStream, httpx.SyncByteStream):
+    """Response body passed through to the caller while its chunks are timed."""
+
+    def __init__(self, stream: Any, started: float, on_close: Callable[[list], None]):
+        self._stream = stream
+        self._started = started
+        self._on_close = on_close
+        self.chunks: list = []
+
+    def _add(self, chunk: bytes) -> None:
+        self.chunks.append([time.perf_counter() - self._started, _text(chunk)])
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            self._add(chunk)
+            yield chunk
+
+    def __iter__(self):
+        for chunk in self._stream:
+            self._add(chunk)
+            yield chunk
+
+    async def aclose(self) -> None:
+        await self._stream.aclose()
+        self._on_close(self.chunks)
+
+    def close(self) -> None:
+        self._stream.close()
+        self._on_close(self.chunks)
+
+
+class _ReplayStream(httpx.AsyncByteStream, httpx.SyncByteStream):
+    """Recorded response body, each chunk released at its recorded offset."""
+
+    def __init__(self, chunks: list, started: float, scale: float):
+        self._chunks = chunks
+        self._started = started
+        self._scale = scale
+
+    def _wait(self, offset: float) -> float:
+        return self._started + offset * self._scale - time.perf_counter()
+
+    async def __aiter__(self):
+        for offset, chunk in self._chunks:
+            wait = self._wait(offset)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            yield _bytes(chunk)
+
+    def __iter__(self):
+        for offset, chunk in self._chunks:
+            wait = self._wait(offset)
+            if wait > 0:
+                time.sleep(wait)
+            yield _bytes(chunk)
+
+
+class CassetteTransport(httpx.AsyncBaseTransport, httpx.BaseTransport):
+    """Transport recording to, or replaying from, the active cassette.
+
+    Requests pass straight through when no cassette is active.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport | httpx.BaseTransport):
+        self.transport = transport
+
+    def _replay(self, cassette: Cassette, request: httpx.Request) -> tuple[dict, float]:
+        return cassette.respond(request), time.perf_counter()
+
+    def _response(self, cassette: Cassette, interaction: dict, started: float, request: httpx.Request) -> httpx.Response:
+        return httpx.Response(
+            interaction["status"],
+            headers=interaction["headers"],
+            stream=_ReplayStream(interaction["chunks"], started, cassette.latency_scale),
+            request=request,
+        )
+
+    def _recording(self, cassette: Cassette, request: httpx.Request, response: httpx.Response, started: float) -> httpx.Response:
+        route, key = _http_request(request)
+        latency = time.perf_counter() - started
+
+        def on_close(chunks: list) -> None:
+            cassette.record({
+                "kind": "http",
+                "route": route,
+                "key": key,
+                "latency": latency,
+                "status": response.status_code,
+                "headers": {name: value for name, value in response.headers.items() if name.lower() in KEPT_HEADERS},
+                "chunks": chunks,
+            })
+
+        return httpx.Response(
+            response.status_code,
+            headers=response.headers,
+            stream=_RecordingStream(response.stream, started, on_close),
+            request=request,
+            extensions=response.extensions,
+        )
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        cassette = get_cassette()
+        if cassette is None:
+            return await self.transport.handle_async_request(request)
+        if cassette.replaying:
+            interaction, started = self._replay(cassette, request)
+            # Time to the response headers, the body follows at its recorded pace
+            await asyncio.sleep(cassette.delay(interaction["latency"]))
+            return self._response(cassette, interaction, started, request)
+        started = time.perf_counter()
+        response = await self.transport.handle_async_request(request)
+        return self._recording(cassette, request, response, started)
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        cassette = get_cassette()
+        if cassette is None:
+            return self.transport.handle_request(request)
+        if cassette.replaying:
+            interaction, started = self._replay(cassette, request)
+            time.sleep(cassette.delay(interaction["latency"]))
+            return self._response(cassette, interaction, started, request)
+        started = time.perf_counter()
+        response = self.transport.handle_request(request)
+        return self._recording(cassette, request, response, started)
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+    def close(self) -> None:
+        self.transport.close()
+
+
+_active: Optional[Cassette] = None
+_configured = False
+_active_lock = threading.Lock()
+
+
+def get_cassette() -> Optional[Cassette]:
+    """Get the active cassette, opening the one of the settings on first use."""
+    global _active, _configured
+    if _configured:
+        return _active
+    with _active_lock:
+        if not _configured:
+            from docs_doctor.core.settings import settings
+
+            if settings.CASSETTE_MODE and _active is None:
+                _active = Cassette(settings.CASSETTE_PATH, settings.CASSETTE_MODE, settings.CASSETTE_LATENCY_SCALE)
+            _configured = True
+        return _active
+
+
+@contextmanager
+def use_backend(backend: Any) -> Iterator[Any]:
+    """Route every upstream call of the process to `backend` inside the block.
+
+    The backend is a `Cassette` or an object with the same replay interface.
+    """
+    global _active, _configured
+    with _active_lock:
+        previous, previous_configured = _active, _configured
+        _active, _configured = backend, True
+    try:
+        yield backend
+    finally:
+        with _active_lock:
+            _active, _configured = previous, previous_configured
+
+
+def use_cassette(
+    path: str | Path, mode: str = "replay", latency_scale: float = 1.0, loop: bool = False
+) -> ContextManager[Cassette]:
+    """Record or replay every upstream call of the process inside the block."""
+    return use_backend(Cassette(path, mode, latency_scale, loop))
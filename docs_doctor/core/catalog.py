@@ -0,0 +1,190 @@
+"""Indexed catalog of the available models.
+
+The model selector of every Streamlit session used to copy, sort and index the
+whole OpenRouter model list on each rerun. `ModelCatalog` does that work once
+per model list: sorted views by name, prompt and completion price and context
+length, indexes by tool support and modality, a price index for "at most"
+filters, prefix search over names and ids, and the formatted details of each
+model. `AgentResources.model_catalog` shares one catalog between all sessions
+and rebuilds it only when the model list is refreshed.
+"""
+
+import math
+from bisect import bisect_left, bisect_right
+from typing import Any, Iterable, Iterator, Optional
+
+# Sorted views, by the key computed for each model
+SORTS = ("name", "prompt_price", "completion_price", "context_length")
+
+
+def _price(model: dict, kind: str) -> float:
+    # OpenRouter prices are strings per token, variable prices are negative
+    try:
+        price = float((model.get("pricing") or {}).get(kind))
+    except (TypeError, ValueError):
+        return math.inf
+    return price if price >= 0 else math.inf
+
+
+def supports_tools(model: dict) -> bool:
+    """Whether a model accepts tool calls.
+
+    Models without `supported_parameters` come from the tool-capable list of
+    `list_tools_models`.
+    """
+    parameters = model.get("supported_parameters")
+    return parameters is None or "tools" in parameters
+
+
+def _details(model: dict) -> str:
+    architecture = model.get("architecture") or {}
+    prompt, completion = _price(model, "prompt"), _price(model, "completion")
+    pricing = (
+        f"${round(prompt * 1_000_000, 3)}/${round(completion * 1_000_000, 3)} per M token"
+        if math.isfinite(prompt) and math.isfinite(completion) else "variable"
+    )
+    return f"""
+                ##### {model['name']}
+                **Context Length:** {model.get('context_length') or 0:,} tokens\n
+                **Pricing:** {pricing}\n
+                **Architecture:**
+                - Modality: {architecture.get('modality')}
+                - Type: {architecture.get('instruct_type')}
+
+                {model.get('description', '')}
+            """
+
+
+class ModelCatalog:
+    """Read-only views and indexes over a list of OpenRouter model dicts."""
+
+    def __init__(self, models: Iterable[dict]):
+        self.source = models
+        self.models: tuple[dict, ...] = tuple(models)
+        self._by_id = {model["id"]: position for position, model in enumerate(self.models)}
+        self._by_name: dict[str, int] = {}
+        for position, model in enumerate(self.models):
+            self._by_name.setdefault(model["name"], position)
+
+        keys = {
+            "name": lambda model: model["name"].lower(),
+            "prompt_price": lambda model: _price(model, "prompt"),
+            "completion_price": lambda model: _price(model, "completion"),
+            "context_length": lambda model: model.get("context_length") or 0,
+        }
+        self._orders: dict[str, tuple[int, ...]] = {}
+        self._keys: dict[str, list] = {}
+        for sort, key in keys.items():
+            order = sorted(range(len(self.models)), key=lambda position: (key(self.models[position]), position))
+            self._orders[sort] = tuple(order)
+            self._keys[sort] = [key(self.models[position]) for position in order]
+        self._views: dict[tuple[str, bool], tuple[dict, ...]] = {}
+
+        self._tools = frozenset(position for position, model in enumerate(self.models) if supports_tools(model))
+        self._modalities: dict[str, set[int]] = {}
+        for position, model in enumerate(self.models):
+            modality = (model.get("architecture") or {}).get("modality")
+            self._modalities.setdefault(modality, set()).add(position)
+
+        # Lowercased search terms (name, id, id without the provider, name words), sorted for bisection
+        terms = set()
+        for position, model in enumerate(self.models):
+            name, model_id = model["name"].lower(), model["id"].lower()
+            for term in (name, model_id, model_id.split("/", 1)[-1], *name.split()):
+                terms.add((term, position))
+        self._terms = sorted(terms)
+        self._term_keys = [term for term, _ in self._terms]
+        self._details = [_details(model) for model in self.models]
+
+    def __len__(self) -> int:
+        return len(self.models)
+
+    def __iter__(self) -> Iterator[dict]:
+        return iter(self.models)
+
+    def get(self, model_id: str) -> Optional[dict]:
+        position = self._by_id.get(model_id)
+        return None if position is None else self.models[position]
+
+    def by_name(self, name: str) -> Optional[dict]:
+        position = self._by_name.get(name)
+        return None if position is None else self.models[position]
+
+    def details(self, model: dict | str) -> str:
+        """Markdown description of a model, formatted once."""
+        position = self._by_id.get(model if isinstance(model, str) else model["id"])
+        if position is None:
+            # A model from an older list, e.g. still selected in a session
+            return _details(model) if isinstance(model, dict) else ""
+        return self._details[position]
+
+    @property
+    def modalities(self) -> list[str]:
+        return sorted(modality for modality in self._modalities if modality)
+
+    def sorted(self, sort: str = "name", descending: bool = False) -> tuple[dict, ...]:
+        """All models in a sort order, the same tuple on every call."""
+        view = self._views.get((sort, descending))
+        if view is None:
+            order = self._orders[sort]
+            view = self._views[sort, descending] = tuple(
+                self.models[position] for position in (reversed(order) if descending else order)
+            )
+        return view
+
+    def _search(self, prefix: str) -> set[int]:
+        prefix = prefix.lower()
+        start = bisect_left(self._term_keys, prefix)
+        matches = set()
+        for term, position in self._terms[start:]:
+            if not term.startswith(prefix):
+                break
+            matches.add(position)
+        return matches
+
+    def _at_most(self, sort: str, value: float) -> set[int]:
+        return set(self._orders[sort][: bisect_right(self._keys[sort], value)])
+
+    def search(self, prefix: str, sort: str = "name", descending: bool = False) -> tuple[dict, ...]:
+        """Models whose name, id or a word of their name starts with `prefix`."""
+        return self.query(prefix=prefix, sort=sort, descending=descending)
+
+    def query(
+        self,
+        prefix: str = "",
+        sort: str = "name",
+        descending: bool = False,
+        tools: Optional[bool] = None,
+        modality: Optional[str] = None,
+        max_prompt_price: Optional[float] = None,
+        max_completion_price: Optional[float] = None,
+    ) -> tuple[dict, ...]:
+        """Models matching every given filter, in a sort order.
+
+        Args:
+            prefix: Prefix of the name, id or a word of the name, case-insensitive.
+            sort: One of `SORTS`.
+            descending: Reverse the sort order.
+            tools: Only models with (True) or without (False) tool support.
+            modality: Only models of this modality, e.g. "text->text".
+            max_prompt_price: Highest prompt price per token.
+            max_completion_price: Highest completion price per token.
+        """
+        selections: list[Any] = []
+        if prefix:
+            selections.append(self._search(prefix))
+        if tools is not None:
+            selections.append(self._tools if tools else set(range(len(self.models))) - self._tools)
+        if modality is not None:
+            selections.append(self._modalities.get(modality, set()))
+        if max_prompt_price is not None:
+            selections.append(self._at_most("prompt_price", max_prompt_price))
+        if max_completion_price is not None:
+            selections.append(self._at_most("completion_price", max_completion_price))
+        if not selections:
+            return self.sorted(sort, descending)
+        selected = set(min(selections, key=len)).intersection(*selections)
+        order = self._orders[sort]
+        return tuple(
+            self.models[position] for position in (reversed(order) if descending else order) if position in selected
+        )
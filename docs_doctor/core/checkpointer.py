@@ -0,0 +1,50 @@
+"""Durable checkpointers shared by every worker process.
+
+Postgres is used when `POSTGRES_CONN_STRING` is set, otherwise a SQLite file at
+`SQLITE_DB_PATH`. Several service workers pointing at the same database see the
+same threads, so any worker can continue any conversation.
+
+Checkpoints are written with the `CompactSerializer` unless
+`CHECKPOINT_COMPACT` is disabled.
+"""
+
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.serde.base import SerializerProtocol
+
+from docs_doctor.core.settings import settings
+
+
+def checkpoint_serializer() -> Optional[SerializerProtocol]:
+    """Serializer of the checkpointers, None for LangGraph's default."""
+    if not settings.CHECKPOINT_COMPACT:
+        return None
+    from docs_doctor.core.serde import CompactSerializer
+
+    return CompactSerializer()
+
+
+@asynccontextmanager
+async def open_checkpointer() -> AsyncIterator[BaseCheckpointSaver]:
+    """Open the configured durable checkpointer for the lifetime of the context."""
+    serde = checkpoint_serializer()
+    if settings.POSTGRES_CONN_STRING:
+        from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+
+        async with AsyncPostgresSaver.from_conn_string(
+            settings.POSTGRES_CONN_STRING.get_secret_value()
+        ) as saver:
+            if serde:
+                saver.serde = serde
+            await saver.setup()
+            yield saver
+    else:
+        from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+        async with AsyncSqliteSaver.from_conn_string(settings.SQLITE_DB_PATH) as saver:
+            if serde:
+                saver.serde = serde
+            await saver.setup()
+            yield saver
@@ -0,0 +1,240 @@
+"""Synthetic upstreams for offline load tests.
+
+`FakeBackend` answers chat model, embedding and Supabase calls in-process,
+through the same interface as a replaying `Cassette`, so the whole graph runs
+(streaming, tool calls, retrieval, checkpoints) without keys or network:
+
+- Chat completions stream `answer_tokens` tokens after `ttft` seconds at
+  `tokens_per_second`. When tools are offered and the last message is the
+  user's, the model first calls one of them (a package expert if there is one,
+  else the documentation search) with the user's question as its argument.
+- Embeddings return a fixed-size vector per input after `embedding_latency`.
+- Supabase queries return canned chunks of one `fake_docs` package after
+  `supabase_latency`.
+
+Activate it with `cassette.use_backend(FakeBackend(...))`.
+"""
+
+import asyncio
+import base64
+import hashlib
+import json
+import random
+import struct
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Optional
+
+import httpx
+
+from docs_doctor.core.cassette import _api_response
+from docs_doctor.core.metrics import metrics
+
+EMBEDDING_DIMENSIONS = 1536
+FAKE_PACKAGE = {
+    "id": 1,
+    "package": "Fake Docs",
+    "package_name": "fake_docs",
+    "description": "Synthetic documentation used by load tests",
+}
+FAKE_MODEL = {
+    "id": "fake/model",
+    "name": "Fake model",
+    "context_length": 128000,
+    "pricing": {"prompt": "0", "completion": "0"},
+    "architecture": {"modality": "text->text", "instruct_type": None},
+    "description": "Synthetic model answering offline, see docs_doctor.core.fake",
+}
+# Tools called before answering, in order of preference
+PREFERRED_TOOL_SUFFIXES = ("_expert_tool", "retrieve_relevant_documentation")
+WORDS = (
+    "Agents", "run", "synchronously", "with", "run_sync,", "which", "returns", "the", "result", "of",
+    "the", "model", "call.", "Tools", "are", "registered", "with", "a", "decorator", "and", "receive",
+    "the", "run", "context.", "See", "the", "documentation", "page", "for", "details.",
+)
+
+
+def _vector(text: str) -> list[float]:
+    rng = random.Random(hashlib.sha256(text.encode("utf-8")).digest())
+    return [rng.uniform(-1.0, 1.0) for _ in range(EMBEDDING_DIMENSIONS)]
+
+
+def _message_text(message: dict) -> str:
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        return " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return str(content)
+
+
+def _pick_tool(tools: list[dict]) -> Optional[dict]:
+    functions = [tool["function"] for tool in tools if tool.get("type") == "function"]
+    for suffix in PREFERRED_TOOL_SUFFIXES:
+        for function in functions:
+            if function["name"].endswith(suffix):
+                return function
+    return None
+
+
+def _tool_arguments(function: dict, question: str) -> str:
+    parameters = function.get("parameters") or {}
+    properties = parameters.get("properties") or {}
+    return json.dumps({
+        name: question
+        for name in parameters.get("required", [])
+        if properties.get(name, {}).get("type") == "string"
+    })
+
+
+class FakeBackend:
+    """In-process stand-in for the model, embedding and Supabase upstreams."""
+
+    replaying = True
+
+    def __init__(
+        self,
+        ttft: float = 0.3,
+        tokens_per_second: float = 60.0,
+        answer_tokens: int = 60,
+        embedding_latency: float = 0.05,
+        supabase_latency: float = 0.03,
+        latency_scale: float = 1.0,
+    ):
+        """Create the backend.
+
+        Args:
+            ttft: Seconds until a chat completion's first token.
+            tokens_per_second: Pace of the streamed tokens.
+            answer_tokens: Tokens of every text answer.
+            embedding_latency: Seconds per embedding request.
+            supabase_latency: Seconds per Supabase query.
+            latency_scale: Multiplies every latency, 0 answers instantly.
+        """
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+        self.answer_tokens = answer_tokens
+        self.embedding_latency = embedding_latency
+        self.supabase_latency = supabase_latency
+        self.latency_scale = latency_scale
+        self._rows = self._chunks()
+
+    @staticmethod
+    def _chunks() -> list[dict]:
+        rows = []
+        for number in range(6):
+            url = f"https://fake-docs.invalid/page-{number // 2}"
+            rows.append({
+                "id": number + 1,
+                "url": url,
+                "chunk_number": number % 2,
+                "title": f"Page {number // 2} - Fake Docs",
+                "summary": "Synthetic documentation chunk",
+                "content": " ".join(WORDS) * 8,
+                "metadata": {"source": FAKE_PACKAGE["package_name"]},
+                # pgvector columns come back from PostgREST as a string
+                "embedding": json.dumps([round(value, 4) for value in _vector(url + str(number))]),
+            })
+        return rows
+
+    def delay(self, seconds: float) -> float:
+        return max(seconds, 0.0) * self.latency_scale
+
+    # HTTP upstreams, answered through `CassetteTransport`
+
+    def respond(self, request: httpx.Request) -> dict:
+        """Interaction answering an HTTP request, in the format of a cassette."""
+        body = json.loads(request.content or b"{}")
+        if request.url.path.endswith("/embeddings"):
+            metrics.incr("fake.embeddings")
+            return self._json(self.embedding_latency, self._embeddings(body))
+        if request.url.path.endswith("/chat/completions"):
+            metrics.incr("fake.chat")
+            return self._chat(body)
+        return {"latency": 0.0, "status": 404, "headers": {"content-type": "application/json"},
+                "chunks": [[0.0, json.dumps({"error": {"message": f"No fake for {request.url.path}"}})]]}
+
+    @staticmethod
+    def _json(latency: float, payload: dict) -> dict:
+        return {"latency": latency, "status": 200, "headers": {"content-type": "application/json"},
+                "chunks": [[latency, json.dumps(payload)]]}
+
+    def _embeddings(self, body: dict) -> dict:
+        inputs = body.get("input")
+        if not isinstance(inputs, list) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        data = []
+        for index, value in enumerate(inputs):
+            vector = _vector(str(value))
+            if body.get("encoding_format") == "base64":
+                vector = base64.b64encode(struct.pack(f"<{len(vector)}f", *vector)).decode("ascii")
+            data.append({"object": "embedding", "index": index, "embedding": vector})
+        tokens = sum(len(value) if isinstance(value, list) else len(str(value)) // 4 + 1 for value in inputs)
+        return {"object": "list", "data": data, "model": body.get("model"),
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens}}
+
+    def _chat(self, body: dict) -> dict:
+        messages = body.get("messages") or []
+        last = messages[-1] if messages else {}
+        question = next((_message_text(m) for m in reversed(messages) if m.get("role") == "user"), "")
+        function = _pick_tool(body.get("tools") or []) if last.get("role") == "user" else None
+        if function is not None:
+            tool_call = {"id": f"call_{uuid.uuid4().hex[:24]}", "type": "function",
+                         "function": {"name": function["name"], "arguments": _tool_arguments(function, question)}}
+            message, pieces, finish_reason = {"role": "assistant", "content": None, "tool_calls": [tool_call]}, [], "tool_calls"
+        else:
+            pieces = [WORDS[i % len(WORDS)] + " " for i in range(self.answer_tokens)]
+            message, tool_call, finish_reason = {"role": "assistant", "content": "".join(pieces)}, None, "stop"
+        prompt_tokens = sum(len(_message_text(m)) for m in messages) // 4 + 1
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(pieces) or 1,
+                 "total_tokens": prompt_tokens + (len(pieces) or 1)}
+        base = {"id": f"chatcmpl-{uuid.uuid4().hex}", "created": int(time.time()), "model": body.get("model")}
+        if not body.get("stream"):
+            latency = self.ttft + len(pieces) / self.tokens_per_second
+            return self._json(latency, {**base, "object": "chat.completion", "usage": usage, "choices": [
+                {"index": 0, "message": message, "finish_reason": finish_reason}]})
+
+        def event(delta: dict, finish: Optional[str] = None) -> str:
+            chunk = {**base, "object": "chat.completion.chunk",
+                     "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]}
+            return f"data: {json.dumps(chunk)}\n\n"
+
+        offset, step = self.ttft, 1.0 / self.tokens_per_second
+        chunks = [[offset, event({"role": "assistant", "content": ""})]]
+        if tool_call is not None:
+            chunks.append([offset, event({"tool_calls": [{"index": 0, **tool_call}]})])
+        for piece in pieces:
+            chunks.append([offset, event({"content": piece})])
+            offset += step
+        chunks.append([offset, event({}, finish_reason)])
+        if (body.get("stream_options") or {}).get("include_usage"):
+            chunks.append([offset, f"data: {json.dumps({**base, 'object': 'chat.completion.chunk', 'choices': [], 'usage': usage})}\n\n"])
+        chunks.append([offset, "data: [DONE]\n\n"])
+        return {"latency": self.ttft, "status": 200, "headers": {"content-type": "text/event-stream"}, "chunks": chunks}
+
+    # Supabase, answered through the `execute` helpers of `docs_doctor.utils`
+
+    def _rows_for(self, query: Any) -> list[dict]:
+        # Postgrest request builders keep the request they will send in `request`
+        request = query.request
+        method, path = str(request.http_method), str(request.path)
+        metrics.incr("fake.supabase")
+        if path.endswith("/rpc/match_site_pages"):
+            return [{**row, "similarity": 0.9 - 0.05 * rank} for rank, row in enumerate(self._rows)]
+        if path.endswith("/rpc/search_site_pages"):
+            return [{**row, "rank": 1.0 / (rank + 1)} for rank, row in enumerate(self._rows[::-1])]
+        if method != "GET":
+            return []
+        if path.endswith("/packages"):
+            return [dict(FAKE_PACKAGE)]
+        if path.endswith("/site_pages"):
+            return [dict(row) for row in self._rows]
+        return []
+
+    async def aquery(self, query: Any, execute: Callable[[], Awaitable[Any]]) -> Any:
+        """Answer a Supabase query with canned rows."""
+        await asyncio.sleep(self.delay(self.supabase_latency))
+        return _api_response({"data": self._rows_for(query), "count": None})
+
+    def query(self, query: Any, execute: Callable[[], Any]) -> Any:
+        """Blocking `aquery`."""
+        time.sleep(self.delay(self.supabase_latency))
+        return _api_response({"data": self._rows_for(query), "count": None})
@@ -0,0 +1,178 @@
+"""Hedged and failover chat model requests.
+
+A slow upstream on OpenRouter stalls a whole agent step because every node
+awaits a single `ainvoke`. `HedgedChatModel` wraps a primary model and an
+ordered chain of fallbacks:
+
+- Hedging: when the primary has not answered after `hedge_delay` seconds (or
+  its measured p95 latency), the same request is sent to the next model in the
+  chain. The first answer wins and the other request is cancelled.
+- Failover: when a request fails, the next model in the chain is tried.
+
+Only the primary request streams its tokens, hedge and failover requests run
+without callbacks. When another model's answer wins, a `STREAM_RESET_EVENT`
+custom event tells the renderers to drop what the primary streamed so far and
+show the winning message instead.
+
+Hedge rate, failovers and wasted tokens are recorded in `metrics` so the extra
+cost stays visible, see `hedge_stats()`.
+"""
+
+import asyncio
+import time
+from typing import Any, Optional, Sequence
+
+from langchain_core.callbacks import adispatch_custom_event
+from langchain_core.messages import BaseMessage
+from langchain_core.runnables import Runnable, RunnableConfig
+from langchain_core.runnables.config import patch_config
+
+from docs_doctor.core.metrics import metrics
+
+# Minimum number of latency samples before the p95 is trusted as a hedge delay
+MIN_P95_SAMPLES = 20
+# Custom event sent when a fallback model's answer replaces the streamed tokens
+STREAM_RESET_EVENT = "stream_reset"
+
+
+class HedgedChatModel(Runnable):
+    """Race and fail over between chat models for a single request."""
+
+    def __init__(
+        self,
+        models: Sequence[tuple[str, Runnable]],
+        hedge_delay: Optional[float] = None,
+        hedge_on_p95: bool = False,
+    ):
+        """Wrap an ordered chain of (model id, runnable) pairs.
+
+        Args:
+            models: Primary model first, followed by the fallbacks in order.
+            hedge_delay: Seconds to wait for the primary before sending a hedge
+                request. None disables hedging (failover still applies).
+            hedge_on_p95: Use the primary's measured p95 latency as the hedge
+                delay once enough samples exist, falling back to `hedge_delay`.
+        """
+        if not models:
+            raise ValueError("HedgedChatModel needs at least one model")
+        self.models = list(models)
+        self.hedge_delay = hedge_delay
+        self.hedge_on_p95 = hedge_on_p95
+
+    @property
+    def InputType(self) -> Any:
+        return self.models[0][1].InputType
+
+    @property
+    def OutputType(self) -> Any:
+        return self.models[0][1].OutputType
+
+    def _delay(self, model_id: str) -> Optional[float]:
+        if self.hedge_on_p95:
+            name = f"llm.latency.{model_id}"
+            if metrics.sample_count(name) >= MIN_P95_SAMPLES:
+                return metrics.percentile(name, 95)
+        return self.hedge_delay
+
+    def invoke(
+        self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any
+    ) -> BaseMessage:
+        # Blocking calls only get failover, hedging needs the event loop
+        primary, *fallbacks = [runnable for _, runnable in self.models]
+        if fallbacks:
+            primary = primary.with_fallbacks(fallbacks)
+        return primary.invoke(input, config, **kwargs)
+
+    async def ainvoke(
+        self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any
+    ) -> BaseMessage:
+        candidates = iter(self.models)
+        pending: dict[asyncio.Task, tuple[str, float]] = {}
+        hedged = False
+        error: BaseException | None = None
+
+        def launch(hedge: bool) -> bool:
+            model_id, runnable = next(candidates, (None, None))
+            if runnable is None:
+                return False
+            # Hedge requests run without callbacks so their tokens are not streamed twice
+            run_config = patch_config(config, callbacks=[]) if hedge else config
+            task = asyncio.create_task(runnable.ainvoke(input, run_config, **kwargs))
+            pending[task] = (model_id, time.perf_counter())
+            metrics.incr("llm.requests")
+            return True
+
+        metrics.incr("llm.calls")
+        launch(hedge=False)
+        primary_id = self.models[0][0]
+        try:
+            while pending:
+                delay = None
+                if not hedged and len(self.models) > 1:
+                    delay = self._delay(primary_id)
+                done, _ = await asyncio.wait(
+                    pending, timeout=delay, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    hedged = True
+                    if launch(hedge=True):
+                        metrics.incr("llm.hedges")
+                    continue
+
+                winner = None
+                for task in done:
+                    model_id, started = pending.pop(task)
+                    if task.exception() is not None:
+                        error = task.exception()
+                        metrics.incr("llm.errors")
+                        print(f"Error calling {model_id}: {error}")
+                        continue
+                    if winner is None:
+                        metrics.observe(f"llm.latency.{model_id}", time.perf_counter() - started)
+                        winner = (model_id, task.result())
+                    else:
+                        # Both requests finished together, the loser's tokens were paid for
+                        usage = getattr(task.result(), "usage_metadata", None) or {}
+                        metrics.incr("llm.wasted_tokens", usage.get("total_tokens", 0))
+
+                if winner is not None:
+                    model_id, response = winner
+                    if pending:
+                        # The cancelled request was sent the same prompt
+                        usage = getattr(response, "usage_metadata", None) or {}
+                        metrics.incr("llm.cancelled", len(pending))
+                        metrics.incr("llm.wasted_tokens", usage.get("input_tokens", 0) * len(pending))
+                        for task in pending:
+                            task.cancel()
+                    if model_id != primary_id:
+                        metrics.incr("llm.fallback_wins")
+                        if config and config.get("callbacks"):
+                            # The primary may have streamed part of its own answer already
+                            await adispatch_custom_event(STREAM_RESET_EVENT, {"model": model_id}, config=config)
+                    return response
+
+                if not pending:
+                    if not launch(hedge=False):
+                        break
+                    metrics.incr("llm.failovers")
+        finally:
+            for task in pending:
+                task.cancel()
+
+        raise error if error else RuntimeError("No model returned a response")
+
+
+def hedge_stats() -> dict[str, float]:
+    """Summarize hedging cost: hedge rate, failovers and wasted tokens."""
+    calls = metrics.counter("llm.calls")
+    hedges = metrics.counter("llm.hedges")
+    return {
+        "calls": calls,
+        "requests": metrics.counter("llm.requests"),
+        "hedges": hedges,
+        "hedge_rate": hedges / calls if calls else 0.0,
+        "fallback_wins": metrics.counter("llm.fallback_wins"),
+        "failovers": metrics.counter("llm.failovers"),
+        "cancelled": metrics.counter("llm.cancelled"),
+        "wasted_tokens": metrics.counter("llm.wasted_tokens"),
+    }
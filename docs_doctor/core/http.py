@@ -0,0 +1,167 @@
+"""Shared HTTP connection pools for all outbound API traffic.
+
+Every `ChatOpenAI` instance returned by `get_model` talks to OpenRouter through
+the same keep-alive, HTTP/2-capable pool so warm connections are reused across
+models, threads and sessions. Pool limits are tuned through the `HTTP_*`
+settings and live pool metrics are available from `pool_stats()`.
+
+Each upstream (OpenRouter, the embedding API) gets its own client, whose
+requests wait for the upstream's shared rate limit (see `core.ratelimit`) and
+are recorded or replayed when a cassette is active (see `core.cassette`).
+"""
+
+import asyncio
+import threading
+import time
+import weakref
+from functools import cache
+from importlib.util import find_spec
+from typing import Any
+
+import httpx
+
+from docs_doctor.core.cassette import CassetteTransport
+from docs_doctor.core.metrics import metrics
+from docs_doctor.core.ratelimit import RateLimitedTransport
+from docs_doctor.core.settings import settings
+
+
+def _http2_enabled() -> bool:
+    # HTTP/2 needs the optional `h2` package (installed with httpx[http2])
+    return settings.HTTP2 and find_spec("h2") is not None
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+    )
+
+
+class LoopLocalTransport(httpx.AsyncBaseTransport):
+    """Async transport keeping one connection pool per running event loop.
+
+    Pooled connections are bound to the event loop that opened them, so a single
+    `httpx.AsyncClient` shared by every model instance delegates to a pool owned
+    by the calling loop. Pools are dropped together with their loop.
+    """
+
+    def __init__(self, **transport_kwargs: Any):
+        self._transport_kwargs = transport_kwargs
+        self._transports: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncHTTPTransport] = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def _current(self) -> httpx.AsyncHTTPTransport:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            transport = self._transports.get(loop)
+            if transport is None:
+                transport = httpx.AsyncHTTPTransport(**self._transport_kwargs)
+                self._transports[loop] = transport
+            return transport
+
+    def transports(self) -> list[httpx.AsyncHTTPTransport]:
+        """Return the transports of all live event loops."""
+        with self._lock:
+            return list(self._transports.values())
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self._current().handle_async_request(request)
+
+    async def aclose(self) -> None:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            transport = self._transports.pop(loop, None)
+        if transport is not None:
+            await transport.aclose()
+
+
+async def _trace(event_name: str, info: dict) -> None:
+    if event_name == "connection.connect_tcp.complete":
+        metrics.incr("http.connections_opened")
+
+
+async def _on_request(request: httpx.Request) -> None:
+    request.extensions["trace"] = _trace
+    request.extensions["docs_doctor_started"] = time.perf_counter()
+    metrics.incr("http.requests")
+
+
+async def _on_response(response: httpx.Response) -> None:
+    started = response.request.extensions.get("docs_doctor_started")
+    if started is not None:
+        metrics.observe("http.response_headers_seconds", time.perf_counter() - started)
+    metrics.incr(f"http.status.{response.status_code}")
+
+
+@cache
+def get_async_http_client(upstream: str = "openrouter") -> httpx.AsyncClient:
+    """Get the process-wide async HTTP client of an upstream, shared by all its calls."""
+    transport = LoopLocalTransport(
+        http2=_http2_enabled(),
+        limits=_limits(),
+        retries=settings.HTTP_CONNECT_RETRIES,
+    )
+    return httpx.AsyncClient(
+        # Replayed requests are neither rate limited nor sent
+        transport=CassetteTransport(RateLimitedTransport(transport, upstream)),
+        timeout=httpx.Timeout(settings.HTTP_TIMEOUT, connect=settings.HTTP_CONNECT_TIMEOUT),
+        event_hooks={"request": [_on_request], "response": [_on_response]},
+    )
+
+
+@cache
+def get_http_client(upstream: str = "openrouter") -> httpx.Client:
+    """Get the process-wide sync HTTP client of an upstream, used by the rare blocking calls."""
+    transport = httpx.HTTPTransport(http2=_http2_enabled(), limits=_limits())
+    return httpx.Client(
+        transport=CassetteTransport(RateLimitedTransport(transport, upstream)),
+        timeout=httpx.Timeout(settings.HTTP_TIMEOUT, connect=settings.HTTP_CONNECT_TIMEOUT),
+    )
+
+
+def pool_stats() -> dict:
+    """Return live connection pool metrics for the shared async client.
+
+    Returns:
+        dict: Connection counts per state, number of event loops holding a pool,
+            and request/connection counters (requests minus connections opened is
+            the number of requests served on a warm connection).
+    """
+    stats = {
+        "http2": _http2_enabled(),
+        "max_connections": settings.HTTP_MAX_CONNECTIONS,
+        "max_keepalive_connections": settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        "pools": 0,
+        "connections": 0,
+        "idle": 0,
+        "active": 0,
+        "http2_connections": 0,
+    }
+    if get_async_http_client.cache_info().currsize:
+        transport = get_async_http_client()._transport
+        # Unwrap the cassette and rate limit transports
+        while hasattr(transport, "transport"):
+            transport = transport.transport
+        if isinstance(transport, LoopLocalTransport):
+            for loop_transport in transport.transports():
+                stats["pools"] += 1
+                # httpcore does not expose pool stats publicly, read the connection list
+                pool = getattr(loop_transport, "_pool", None)
+                for connection in getattr(pool, "connections", []):
+                    stats["connections"] += 1
+                    if connection.is_idle():
+                        stats["idle"] += 1
+                    else:
+                        stats["active"] += 1
+                    if "HTTP/2" in connection.info():
+                        stats["http2_connections"] += 1
+    requests = metrics.counter("http.requests")
+    opened = metrics.counter("http.connections_opened")
+    stats["requests"] = int(requests)
+    stats["connections_opened"] = int(opened)
+    stats["reused_requests"] = int(max(requests - opened, 0))
+    for key in ("pools", "connections", "idle", "active"):
+        metrics.set_gauge(f"http.pool.{key}", stats[key])
+    return stats
@@ -1,17 +1,49 @@
 from functools import cache
+from typing import Any
+
 from langchain_openai import ChatOpenAI
 
+from docs_doctor.core.http import get_async_http_client, get_http_client
 from docs_doctor.core.settings import settings, OpenRouterModel
 
+ModelLike = str | dict | OpenRouterModel | None
+
+
+def model_id(model: ModelLike) -> str:
+    """Normalize a model id, OpenRouter model dict or `OpenRouterModel` to its id."""
+    if model is None:
+        model = settings.DEFAULT_MODEL
+    if isinstance(model, OpenRouterModel):
+        return model.id
+    if isinstance(model, dict):
+        return model["id"]
+    return model
+
+
+def get_model(model: ModelLike = None, *, temperature: float = 0.5, streaming: bool = True) -> ChatOpenAI:
+    """Get a cached chat model for a model id and its parameters.
+
+    All instances share the process-wide HTTP connection pool.
+    """
+    return _get_model(model_id(model), temperature, streaming)
+
+
 @cache
-def get_model(model: str) -> ChatOpenAI:
+def _get_model(model: str, temperature: float, streaming: bool) -> ChatOpenAI:
     # NOTE: models with streaming=True will send tokens as they are generated
     # if the /stream endpoint is called with stream_tokens=True (the default)
     print("MODEL: ", model)
     return ChatOpenAI(
         model=model,
-        temperature=0.5,
-        streaming=True,
-        openai_api_base='https://openrouter.ai/api/v1',
+        temperature=temperature,
+        streaming=streaming,
+        openai_api_base=settings.OPEN_ROUTER_BASE_URL,
         openai_api_key=settings.OPEN_ROUTER_API_KEY,
+        http_async_client=get_async_http_client(),
+        http_client=get_http_client(),
     )
+
+
+def model_cache_info() -> dict[str, Any]:
+    """Return hit/miss statistics of the model instance cache."""
+    return _get_model.cache_info()._asdict()
@@ -0,0 +1,64 @@
+"""Process-wide background event loop for agent execution.
+
+Streamlit runs every script rerun in a fresh event loop, which would throw away
+the pooled HTTP connections after each message. Agent coroutines are instead
+submitted to one long-lived loop running in a daemon thread, so warm
+connections are reused across reruns and sessions.
+"""
+
+import asyncio
+import threading
+from typing import AsyncIterator, Awaitable, TypeVar
+
+T = TypeVar("T")
+
+_loop: asyncio.AbstractEventLoop | None = None
+_lock = threading.Lock()
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """Get the shared background event loop, starting it on first use."""
+    global _loop
+    with _lock:
+        if _loop is None or _loop.is_closed():
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(
+                target=loop.run_forever, name="docs-doctor-loop", daemon=True
+            )
+            thread.start()
+            _loop = loop
+        return _loop
+
+
+async def run_in_loop(coro: Awaitable[T]) -> T:
+    """Await a coroutine on the shared loop from any other event loop."""
+    loop = get_loop()
+    if asyncio.get_running_loop() is loop:
+        return await coro
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
+
+async def iterate_in_loop(agen: AsyncIterator[T]) -> AsyncIterator[T]:
+    """Consume an async generator on the shared loop from any other event loop."""
+    loop = get_loop()
+    if asyncio.get_running_loop() is loop:
+        async for item in agen:
+            yield item
+        return
+
+    async def _next() -> tuple[bool, T | None]:
+        try:
+            return False, await agen.__anext__()
+        except StopAsyncIteration:
+            return True, None
+
+    try:
+        while True:
+            done, item = await run_in_loop(_next())
+            if done:
+                return
+            yield item
+    finally:
+        aclose = getattr(agen, "aclose", None)
+        if aclose is not None:
+            await run_in_loop(aclose())
@@ -0,0 +1,250 @@
+"""Memory diagnostics of long-running processes.
+
+With `MEMORY_SNAPSHOT_INTERVAL` set, a `MemoryMonitor` thread takes a
+tracemalloc snapshot at that interval and attributes the process's memory:
+
+- by owner: traced allocations are assigned to checkpoints, model clients,
+  graphs, Streamlit (sessions and rendering), docs_doctor or other code, by the
+  innermost frame of their traceback that belongs to one of them;
+- by conversation thread: bytes of the checkpoints and pending writes each
+  thread holds in an in-memory checkpointer, reported under a hash of the
+  thread id since the id is all it takes to read a conversation;
+- by cache: entries of the process-wide caches (model instances, HTTP
+  clients, tool sets, hydrated blobs);
+- by source line: the allocations that grew most since the previous snapshot.
+
+Totals are published as `memory.*` gauges and the last report is returned by
+`memory_stats()`, served on the `?debug=memory` page of the Streamlit app and
+the API's `/debug/memory` when `MEMORY_DEBUG_PAGE` is set.
+"""
+
+import hashlib
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import deque
+from typing import Any, Optional
+
+from docs_doctor.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Owners of traced allocations, matched against traceback file names in order
+OWNERS = (
+    ("checkpoints", ("langgraph/checkpoint", "docs_doctor/core/serde.py", "docs_doctor/core/checkpointer.py", "ormsgpack")),
+    ("model_clients", ("langchain_openai", "/openai/", "httpx", "httpcore", "/h2/", "docs_doctor/core/http.py", "docs_doctor/core/llm.py")),
+    ("graphs", ("langgraph", "langchain_core")),
+    ("streamlit", ("streamlit",)),
+    ("docs_doctor", ("docs_doctor",)),
+)
+# Process-wide caches reported by size, as (name, module, function with cache_info)
+CACHES = (
+    ("models", "docs_doctor.core.llm", "_get_model"),
+    ("http_clients", "docs_doctor.core.http", "get_async_http_client"),
+    ("sync_http_clients", "docs_doctor.core.http", "get_http_client"),
+    ("tool_sets", "docs_doctor.agent.tools", "_select_tools"),
+    ("tool_nodes", "docs_doctor.agent.tools", "_select_tool_node"),
+    ("blobs", "docs_doctor.core.blobs", "_read"),
+)
+# Snapshot totals kept for the growth history
+HISTORY = 120
+
+
+def rss_bytes() -> int:
+    """Resident memory of the process."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+
+        # Peak instead of current where /proc is missing; kilobytes on Linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def thread_label(thread_id: str) -> str:
+    """Stable label of a conversation thread that does not reveal its id."""
+    return "thread-" + hashlib.sha256(thread_id.encode("utf-8")).hexdigest()[:12]
+
+
+def _owner(traceback: tracemalloc.Traceback) -> str:
+    # Innermost frame first, so `json.dumps` called by the serializer counts as checkpoints
+    for frame in reversed(traceback):
+        filename = frame.filename.replace("\\", "/")
+        for owner, patterns in OWNERS:
+            if any(pattern in filename for pattern in patterns):
+                return owner
+    return "other"
+
+
+def _payload_bytes(value: Any) -> int:
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(_payload_bytes(item) for item in list(value.values()))
+    if isinstance(value, (tuple, list)):
+        return sum(_payload_bytes(item) for item in value)
+    return 0
+
+
+def checkpoint_sizes(checkpointer: Any) -> dict[str, int]:
+    """Serialized bytes held per conversation thread by an in-memory checkpointer.
+
+    Empty for durable checkpointers, whose checkpoints live in the database.
+    """
+    sizes: dict[str, int] = {}
+    storage = getattr(checkpointer, "storage", None)
+    if not isinstance(storage, dict):
+        return sizes
+    for thread_id, namespaces in list(storage.items()):
+        sizes[str(thread_id)] = _payload_bytes(namespaces)
+    # Pending writes and channel blobs are keyed by tuples starting with the thread id
+    for attribute in ("writes", "blobs"):
+        entries = getattr(checkpointer, attribute, None)
+        if isinstance(entries, dict):
+            for key, value in list(entries.items()):
+                thread_id = str(key[0] if isinstance(key, tuple) else key)
+                sizes[thread_id] = sizes.get(thread_id, 0) + _payload_bytes(value)
+    return sizes
+
+
+def cache_sizes() -> dict[str, int]:
+    """Entries of the process-wide caches, for the modules already imported."""
+    sizes = {}
+    for name, module_name, function in CACHES:
+        module = sys.modules.get(module_name)
+        cache_info = getattr(getattr(module, function, None), "cache_info", None)
+        if cache_info is not None:
+            sizes[name] = cache_info().currsize
+    return sizes
+
+
+class MemoryMonitor(threading.Thread):
+    """Takes tracemalloc snapshots at an interval and attributes memory."""
+
+    def __init__(self, interval: float, checkpointer: Any = None, frames: int = 8, top: int = 10):
+        """Create the monitor, `start()` it to take snapshots.
+
+        Args:
+            interval: Seconds between snapshots.
+            checkpointer: Checkpointer whose threads are measured.
+            frames: Frames kept per traced allocation, more attribute better but cost more.
+            top: Threads and growing source lines listed in a report.
+        """
+        super().__init__(name="docs-doctor-memory", daemon=True)
+        self.interval = interval
+        self.checkpointer = checkpointer
+        self.frames = frames
+        self.top = top
+        self.report: dict = {}
+        self.history: deque = deque(maxlen=HISTORY)
+        self._previous: Optional[tracemalloc.Snapshot] = None
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+
+    def run(self) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+        while True:
+            try:
+                self.snapshot()
+            except Exception:
+                logger.exception("Memory snapshot failed")
+            if self._stopped.wait(self.interval):
+                return
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def snapshot(self) -> dict:
+        """Take a snapshot, publish its metrics and return its report."""
+        started = time.perf_counter()
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        ))
+        owners: dict[str, int] = {}
+        for statistic in snapshot.statistics("traceback"):
+            owner = _owner(statistic.traceback)
+            owners[owner] = owners.get(owner, 0) + statistic.size
+        growth = []
+        if self._previous is not None:
+            for diff in snapshot.compare_to(self._previous, "lineno")[: self.top]:
+                if diff.size_diff > 0:
+                    frame = diff.traceback[0]
+                    growth.append({"line": f"{frame.filename}:{frame.lineno}", "size": diff.size, "growth": diff.size_diff})
+        self._previous = snapshot
+
+        threads = checkpoint_sizes(self.checkpointer)
+        caches = cache_sizes()
+        traced, peak = tracemalloc.get_traced_memory()
+        report = {
+            "time": time.time(),
+            "rss": rss_bytes(),
+            "traced": traced,
+            "traced_peak": peak,
+            "owners": dict(sorted(owners.items(), key=lambda item: -item[1])),
+            "checkpoint_threads": len(threads),
+            "checkpoint_bytes": sum(threads.values()),
+            "largest_threads": {
+                thread_label(thread_id): size
+                for thread_id, size in sorted(threads.items(), key=lambda item: -item[1])[: self.top]
+            },
+            "caches": caches,
+            "growth": growth,
+            "snapshot_seconds": round(time.perf_counter() - started, 3),
+        }
+        with self._lock:
+            self.report = report
+            self.history.append({"time": report["time"], "rss": report["rss"], "traced": traced})
+
+        metrics.set_gauge("memory.rss_bytes", report["rss"])
+        metrics.set_gauge("memory.traced_bytes", traced)
+        for owner, size in owners.items():
+            metrics.set_gauge(f"memory.owner.{owner}_bytes", size)
+        metrics.set_gauge("memory.checkpoint_threads", report["checkpoint_threads"])
+        metrics.set_gauge("memory.checkpoint_bytes", report["checkpoint_bytes"])
+        for name, size in caches.items():
+            metrics.set_gauge(f"memory.cache.{name}", size)
+        metrics.observe("memory.snapshot_seconds", report["snapshot_seconds"])
+        return report
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self.report, "history": list(self.history)}
+
+
+_monitor: Optional[MemoryMonitor] = None
+_monitor_lock = threading.Lock()
+
+
+def start_memory_monitor(checkpointer: Any = None) -> Optional[MemoryMonitor]:
+    """Start the process's memory monitor if `MEMORY_SNAPSHOT_INTERVAL` is set.
+
+    Tracing slows allocations down, so it is off by default.
+    """
+    global _monitor
+    from docs_doctor.core.settings import settings
+
+    with _monitor_lock:
+        if _monitor is None and settings.MEMORY_SNAPSHOT_INTERVAL > 0:
+            _monitor = MemoryMonitor(
+                settings.MEMORY_SNAPSHOT_INTERVAL, checkpointer, settings.MEMORY_TRACE_FRAMES, settings.MEMORY_TOP
+            )
+            _monitor.start()
+        return _monitor
+
+
+def memory_stats() -> dict:
+    """Last memory report, or only the RSS and cache sizes while the monitor is off."""
+    with _monitor_lock:
+        monitor = _monitor
+    if monitor is None:
+        return {"rss": rss_bytes(), "caches": cache_sizes(), "monitoring": False}
+    return {**monitor.stats(), "monitoring": True}
@@ -0,0 +1,246 @@
+"""Per-request profiles.
+
+`profile_request` runs one request under a profiler and writes one file per
+request to `PROFILE_DIR`, named after its thread id and model, and indexed
+with its tags (thread id, packages, model, duration) in `profiles.jsonl`:
+
+- "sample": a wall-clock stack sampler over every thread of the process,
+  written as a speedscope file (https://www.speedscope.app) with one profile
+  per thread. Event-loop stacks are split by asyncio task: samples of the
+  profiled request's tasks sit under a `[request]` frame, other sessions'
+  tasks under `[task] <coroutine>` and an idle loop under `[loop idle]`, so
+  graph scheduling, message conversion, rendering and I/O waits each show up
+  separately.
+- "cprofile": deterministic cProfile, written as a pstats `.prof` file (e.g.
+  for snakeviz). Since Python 3.12 it sees every thread, so it covers every
+  task running meanwhile, not only the request's: other sessions' work during
+  the request is charged to it, and its index entry has `"scope": "process"`
+  (`"request"` for the sampler). Only one cProfile can run per process, so a
+  request profiled while another one is uses the sampler.
+"""
+
+import asyncio
+import cProfile
+import json
+import re
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+from docs_doctor.core.metrics import metrics
+
+PROFILERS = ("sample", "cprofile")
+INDEX_FILE = "profiles.jsonl"
+SPEEDSCOPE_SCHEMA = "https://www.speedscope.app/file-format-schema.json"
+
+# Held by the request being profiled with cProfile, one per process
+_cprofile_lock = threading.Lock()
+# Id of the profiled request, inherited by its tasks on any event loop
+_profiled: ContextVar[Optional[str]] = ContextVar("docs_doctor_profiled", default=None)
+
+
+@dataclass
+class Profile:
+    """A profiled request, `path` is set once its file was written."""
+
+    tags: dict
+    profiler: str
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    started: float = 0.0
+    duration: float = 0.0
+    path: Optional[Path] = None
+
+    @property
+    def label(self) -> str:
+        return " ".join(f"{key}={_tag(value)}" for key, value in self.tags.items())
+
+
+def _tag(value: Any) -> str:
+    return ",".join(map(str, value)) if isinstance(value, (list, tuple)) else str(value)
+
+
+def _slug(value: Any, length: int = 40) -> str:
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", _tag(value)).strip("_")[:length] or "none"
+
+
+def request_tags(thread_id: Optional[str], packages: list[str], model: str) -> dict:
+    """Tags of a profiled request."""
+    return {"thread_id": thread_id, "packages": list(packages), "model": model}
+
+
+class StackSampler(threading.Thread):
+    """Samples the stack of every thread at a fixed interval."""
+
+    def __init__(self, interval: float, request_id: str):
+        super().__init__(name="docs-doctor-profiler", daemon=True)
+        self.interval = interval
+        self.request_id = request_id
+        self.frames: list[dict] = []
+        self._frame_index: dict[tuple, int] = {}
+        self.samples: dict[int, list[list[int]]] = {}
+        self.weights: dict[int, list[float]] = {}
+        self.thread_names: dict[int, str] = {}
+        self._stopped = threading.Event()
+
+    def _frame(self, name: str, file: str = "", line: int = 0) -> int:
+        key = (name, file, line)
+        index = self._frame_index.get(key)
+        if index is None:
+            index = self._frame_index[key] = len(self.frames)
+            self.frames.append({"name": name, "file": file, "line": line})
+        return index
+
+    def _task_frame(self, loop: Any) -> int:
+        try:
+            task = asyncio.current_task(loop)
+        except Exception:
+            task = None
+        if task is None:
+            return self._frame("[loop idle]")
+        get_context = getattr(task, "get_context", None)
+        if get_context is not None and get_context().get(_profiled) == self.request_id:
+            return self._frame("[request]")
+        coro = task.get_coro()
+        return self._frame(f"[task] {getattr(coro, '__qualname__', type(coro).__name__)}")
+
+    def _stack(self, frame: Any) -> list[int]:
+        codes = []
+        while frame is not None:
+            codes.append(frame)
+            frame = frame.f_back
+        stack = []
+        for frame in reversed(codes):
+            code = frame.f_code
+            stack.append(self._frame(code.co_qualname, code.co_filename, code.co_firstlineno))
+            # The loop's current task runs below `_run_once`, label it there
+            if code.co_name == "_run_once":
+                loop = frame.f_locals.get("self")
+                if isinstance(loop, asyncio.AbstractEventLoop):
+                    stack.append(self._task_frame(loop))
+        return stack
+
+    def sample(self, weight: float) -> None:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == self.ident:
+                continue
+            self.thread_names.setdefault(ident, names.get(ident, str(ident)))
+            self.samples.setdefault(ident, []).append(self._stack(frame))
+            self.weights.setdefault(ident, []).append(weight)
+
+    def run(self) -> None:
+        last = time.perf_counter()
+        while not self._stopped.wait(self.interval):
+            now = time.perf_counter()
+            self.sample(now - last)
+            last = now
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self.join()
+
+    def speedscope(self, name: str) -> dict:
+        """The samples as a speedscope file, one profile per thread."""
+        request_frame = self._frame_index.get(("[request]", "", 0))
+        profiles, active = [], None
+        for ident, samples in self.samples.items():
+            # Open the thread that ran the request's tasks
+            if active is None and request_frame is not None and any(request_frame in stack for stack in samples):
+                active = len(profiles)
+            weights = self.weights[ident]
+            profiles.append({
+                "type": "sampled",
+                "name": self.thread_names[ident],
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights,
+            })
+        return {
+            "$schema": SPEEDSCOPE_SCHEMA,
+            "name": name,
+            "exporter": "docs-doctor",
+            "activeProfileIndex": active or 0,
+            "shared": {"frames": self.frames},
+            "profiles": profiles,
+        }
+
+
+def _write(profile: Profile, directory: Path, suffix: str, write) -> None:
+    directory.mkdir(parents=True, exist_ok=True)
+    stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(profile.started))
+    profile.path = directory / (
+        f"{stamp}-{_slug(profile.tags.get('thread_id'), 12)}-{_slug(profile.tags.get('model'))}-{profile.id[:6]}{suffix}"
+    )
+    write(profile.path)
+    with (directory / INDEX_FILE).open("a", encoding="utf-8") as f:
+        f.write(json.dumps({
+            "path": profile.path.name,
+            "profiler": profile.profiler,
+            "scope": "process" if profile.profiler == "cprofile" else "request",
+            "started": profile.started,
+            "duration": round(profile.duration, 4),
+            **profile.tags,
+        }) + "\n")
+
+
+@contextmanager
+def profile_request(
+    tags: dict,
+    profiler: str = "sample",
+    directory: str | Path | None = None,
+    interval: Optional[float] = None,
+) -> Iterator[Profile]:
+    """Profile the request run inside the block and write its profile file.
+
+    Args:
+        tags: Tags of the request, see `request_tags`.
+        profiler: "sample" (speedscope) or "cprofile" (pstats). The sampler is
+            used instead of cProfile while another request is profiled with it.
+        directory: Directory of the profiles, defaults to `PROFILE_DIR`.
+        interval: Seconds between samples, defaults to `PROFILE_INTERVAL`.
+    """
+    from docs_doctor.core.settings import settings
+
+    if profiler not in PROFILERS:
+        raise ValueError(f"Profiler must be one of {PROFILERS}, got {profiler!r}")
+    directory = Path(directory or settings.PROFILE_DIR)
+    if profiler == "cprofile" and not _cprofile_lock.acquire(blocking=False):
+        metrics.incr("profile.cprofile_busy")
+        profiler = "sample"
+    profile = Profile(tags=tags, profiler=profiler, started=time.time())
+    token = _profiled.set(profile.id)
+    started = time.perf_counter()
+    if profiler == "sample":
+        sampler = StackSampler(interval or settings.PROFILE_INTERVAL, profile.id)
+        sampler.start()
+        try:
+            yield profile
+        finally:
+            sampler.stop()
+            _profiled.reset(token)
+            profile.duration = time.perf_counter() - started
+            _write(profile, directory, ".speedscope.json",
+                   lambda path: path.write_text(json.dumps(sampler.speedscope(profile.label)), encoding="utf-8"))
+    else:
+        cprofiler = cProfile.Profile()
+        try:
+            cprofiler.enable()
+            try:
+                yield profile
+            finally:
+                cprofiler.disable()
+        finally:
+            _cprofile_lock.release()
+            _profiled.reset(token)
+            profile.duration = time.perf_counter() - started
+            _write(profile, directory, ".prof", cprofiler.dump_stats)
+    metrics.incr(f"profile.{profiler}")
+    metrics.observe("profile.duration_seconds", profile.duration)
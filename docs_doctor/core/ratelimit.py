@@ -0,0 +1,349 @@
+"""Shared rate limiting of upstream APIs.
+
+Sessions, parallel package experts and ingestion runs all call the same few
+upstreams. Without coordination they burst past the provider's limits and the
+resulting 429s turn into retry storms. Every upstream (`openrouter`,
+`embeddings`, `supabase`) gets one process-wide `RateLimiter`:
+
+- Token buckets refilled continuously for requests and tokens per minute, so
+  throughput stays at the configured ceiling instead of bursting past it.
+- Fair queueing: waiting calls are queued per key (the conversation thread,
+  see `fair_share`) and granted round-robin between keys, so one busy thread
+  cannot starve the others.
+- Queue depth, throttled calls and wait times are recorded in `metrics`, see
+  `rate_limit_stats()`.
+
+Limits come from the `*_REQUESTS_PER_MINUTE` / `*_TOKENS_PER_MINUTE` settings,
+0 disables a limit. The limiter works across event loops and threads, blocking
+callers use `acquire_blocking`.
+"""
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Callable, Deque, Iterator, Optional
+
+import httpx
+
+from docs_doctor.core.metrics import metrics
+
+# Rough number of characters per token when estimating request sizes
+CHARS_PER_TOKEN = 4
+# Upstreams with a shared limiter, configured by the settings of the same prefix
+UPSTREAMS = ("openrouter", "embeddings", "supabase")
+
+_DEFAULT_KEY = "default"
+_fair_key: ContextVar[Optional[str]] = ContextVar("docs_doctor_fair_key", default=None)
+# Upstreams whose limit the current call already waited for, see `limit_acquired`
+_acquired: ContextVar[frozenset] = ContextVar("docs_doctor_limit_acquired", default=frozenset())
+
+
+@contextmanager
+def fair_share(key: Optional[str]) -> Iterator[None]:
+    """Queue the rate-limited calls made in this block under `key`.
+
+    Nodes set it to the conversation's thread id, and tasks started inside the
+    block (e.g. nested package experts) inherit it. A None key keeps the
+    current one.
+    """
+    if key is None:
+        yield
+        return
+    token = _fair_key.set(str(key))
+    try:
+        yield
+    finally:
+        _fair_key.reset(token)
+
+
+@contextmanager
+def limit_acquired(name: Optional[str]) -> Iterator[None]:
+    """Let the requests made in this block skip the `name` upstream's limit.
+
+    Used by callers that waited for the limit themselves, outside of their
+    timeout, so the transport does not wait a second time inside it. A None
+    name changes nothing.
+    """
+    if name is None:
+        yield
+        return
+    token = _acquired.set(_acquired.get() | {name})
+    try:
+        yield
+    finally:
+        _acquired.reset(token)
+
+
+def estimate_tokens(text: str | bytes) -> int:
+    """Rough token count of a text or request body."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+@dataclass
+class _Waiter:
+    tokens: int
+    wake: Callable[[], None]
+    enqueued: float
+    granted: bool = False
+
+
+def _resolve(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class RateLimiter:
+    """Token bucket limiting requests and tokens per minute, with fair queueing."""
+
+    def __init__(
+        self,
+        name: str,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+    ):
+        """Create a limiter.
+
+        Args:
+            name: Name of the upstream, used in metric names.
+            requests_per_minute: Request budget, None or 0 for no limit.
+            tokens_per_minute: Token budget, None or 0 for no limit.
+        """
+        self.name = name
+        self.requests_per_minute = float(requests_per_minute or 0)
+        self.tokens_per_minute = float(tokens_per_minute or 0)
+        self._requests = self.requests_per_minute
+        self._tokens = self.tokens_per_minute
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        # Waiters per key, in round-robin order
+        self._queues: "OrderedDict[str, Deque[_Waiter]]" = OrderedDict()
+        self._depth = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.requests_per_minute or self.tokens_per_minute)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed, self._updated = now - self._updated, now
+        if self.requests_per_minute:
+            self._requests = min(self.requests_per_minute, self._requests + elapsed * self.requests_per_minute / 60)
+        if self.tokens_per_minute:
+            self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60)
+
+    def _delay(self, tokens: int) -> float:
+        # Seconds until both buckets hold enough for one request of `tokens`
+        delay = 0.0
+        if self.requests_per_minute and self._requests < 1:
+            delay = (1 - self._requests) * 60 / self.requests_per_minute
+        if self.tokens_per_minute and self._tokens < tokens:
+            delay = max(delay, (tokens - self._tokens) * 60 / self.tokens_per_minute)
+        return delay
+
+    def _take(self, tokens: int) -> None:
+        if self.requests_per_minute:
+            self._requests -= 1
+        if self.tokens_per_minute:
+            self._tokens -= tokens
+
+    def _dispatch(self) -> Optional[float]:
+        """Grant queued waiters round-robin between keys, while the buckets allow.
+
+        Must be called with the lock held. Returns the seconds until the next
+        waiter can be granted, or None once the queue is empty.
+        """
+        self._refill()
+        delay = None
+        while self._queues:
+            key, queue = next(iter(self._queues.items()))
+            waiter = queue[0]
+            delay = self._delay(waiter.tokens)
+            if delay > 0:
+                break
+            delay = None
+            self._take(waiter.tokens)
+            queue.popleft()
+            self._depth -= 1
+            # The key moves to the back of the rotation, or leaves it once empty
+            del self._queues[key]
+            if queue:
+                self._queues[key] = queue
+            waiter.granted = True
+            waiter.wake()
+        metrics.set_gauge(f"ratelimit.{self.name}.queue_depth", self._depth)
+        metrics.set_gauge(f"ratelimit.{self.name}.queued_keys", len(self._queues))
+        return delay
+
+    def _enqueue(self, waiter: _Waiter) -> Optional[float]:
+        key = _fair_key.get() or _DEFAULT_KEY
+        with self._lock:
+            self._queues.setdefault(key, deque()).append(waiter)
+            self._depth += 1
+            return self._dispatch()
+
+    def _withdraw(self, waiter: _Waiter) -> None:
+        # A cancelled call leaves the queue, or gives back what it was granted
+        with self._lock:
+            if waiter.granted:
+                if self.requests_per_minute:
+                    self._requests += 1
+                if self.tokens_per_minute:
+                    self._tokens += waiter.tokens
+            else:
+                for key, queue in self._queues.items():
+                    if waiter in queue:
+                        queue.remove(waiter)
+                        self._depth -= 1
+                        if not queue:
+                            del self._queues[key]
+                        break
+            self._dispatch()
+
+    def _granted(self, waiter: _Waiter) -> None:
+        waited = time.monotonic() - waiter.enqueued
+        metrics.incr(f"ratelimit.{self.name}.requests")
+        metrics.incr(f"ratelimit.{self.name}.tokens", waiter.tokens)
+        metrics.observe(f"ratelimit.{self.name}.wait_seconds", waited)
+        if waited > 0.001:
+            metrics.incr(f"ratelimit.{self.name}.throttled")
+
+    def _waiter(self, tokens: int, wake: Callable[[], None]) -> _Waiter:
+        # A request larger than the whole bucket could never be granted
+        if self.tokens_per_minute:
+            tokens = min(tokens, int(self.tokens_per_minute))
+        return _Waiter(tokens=max(tokens, 0), wake=wake, enqueued=time.monotonic())
+
+    async def acquire(self, tokens: int = 0) -> None:
+        """Wait for the budget of one request of `tokens` tokens."""
+        if not self.enabled:
+            return
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        waiter = self._waiter(tokens, lambda: loop.call_soon_threadsafe(_resolve, future))
+        delay = self._enqueue(waiter)
+        try:
+            while not waiter.granted:
+                try:
+                    await asyncio.wait_for(asyncio.shield(future), delay)
+                except asyncio.TimeoutError:
+                    # The head of the queue can be served now, grant it (which may be another waiter)
+                    with self._lock:
+                        delay = self._dispatch()
+        except BaseException:
+            self._withdraw(waiter)
+            raise
+        self._granted(waiter)
+
+    def acquire_blocking(self, tokens: int = 0) -> None:
+        """Blocking `acquire`, for calls made from worker threads."""
+        if not self.enabled:
+            return
+        event = threading.Event()
+        waiter = self._waiter(tokens, event.set)
+        delay = self._enqueue(waiter)
+        try:
+            while not waiter.granted:
+                if not event.wait(delay):
+                    with self._lock:
+                        delay = self._dispatch()
+        except BaseException:
+            self._withdraw(waiter)
+            raise
+        self._granted(waiter)
+
+    def charge(self, tokens: int) -> None:
+        """Charge tokens only known after the call, e.g. completion tokens.
+
+        The bucket can go negative, which delays the next calls.
+        """
+        if not self.tokens_per_minute or tokens <= 0:
+            return
+        with self._lock:
+            self._refill()
+            self._tokens -= tokens
+        metrics.incr(f"ratelimit.{self.name}.tokens", tokens)
+
+    def stats(self) -> dict:
+        """Current budget, queue and wait times of the limiter."""
+        with self._lock:
+            self._refill()
+            stats = {
+                "requests_per_minute": self.requests_per_minute,
+                "tokens_per_minute": self.tokens_per_minute,
+                "available_requests": round(self._requests, 1),
+                "available_tokens": round(self._tokens),
+                "queue_depth": self._depth,
+                "queued_keys": len(self._queues),
+            }
+        stats.update({
+            "requests": metrics.counter(f"ratelimit.{self.name}.requests"),
+            "throttled": metrics.counter(f"ratelimit.{self.name}.throttled"),
+            "wait_p50": metrics.percentile(f"ratelimit.{self.name}.wait_seconds", 50) or 0.0,
+            "wait_p95": metrics.percentile(f"ratelimit.{self.name}.wait_seconds", 95) or 0.0,
+        })
+        return stats
+
+
+_limiters: dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(name: str) -> RateLimiter:
+    """Get the shared limiter of an upstream, configured from the settings."""
+    with _limiters_lock:
+        limiter = _limiters.get(name)
+        if limiter is None:
+            from docs_doctor.core.settings import settings
+
+            prefix = name.upper()
+            limiter = _limiters[name] = RateLimiter(
+                name,
+                getattr(settings, f"{prefix}_REQUESTS_PER_MINUTE", 0),
+                getattr(settings, f"{prefix}_TOKENS_PER_MINUTE", 0),
+            )
+        return limiter
+
+
+def rate_limit_stats() -> dict[str, dict]:
+    """Stats of every upstream's limiter."""
+    return {name: get_rate_limiter(name).stats() for name in UPSTREAMS}
+
+
+def _request_tokens(request: httpx.Request) -> int:
+    try:
+        return estimate_tokens(request.content)
+    except httpx.RequestNotRead:
+        # Streamed request bodies are not known up front
+        return 0
+
+
+class RateLimitedTransport(httpx.AsyncBaseTransport, httpx.BaseTransport):
+    """Transport waiting for an upstream's rate limit before each request.
+
+    Tokens are estimated from the size of the request body. Requests made
+    inside `limit_acquired(upstream)` are not limited again.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport | httpx.BaseTransport, upstream: str):
+        self.transport = transport
+        self.upstream = upstream
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if self.upstream not in _acquired.get():
+            await get_rate_limiter(self.upstream).acquire(_request_tokens(request))
+        return await self.transport.handle_async_request(request)
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        if self.upstream not in _acquired.get():
+            get_rate_limiter(self.upstream).acquire_blocking(_request_tokens(request))
+        return self.transport.handle_request(request)
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+    def close(self) -> None:
+        self.transport.close()
@@ -0,0 +1,297 @@
+"""Retries and circuit breakers for upstream dependencies.
+
+Calls to the embedding API and Supabase are retried with full-jitter
+exponential backoff and a per-attempt timeout. Only transient errors are
+retried (timeouts, connection errors, 429 and 5xx responses, see `retryable`);
+any other error, e.g. a bad request, is raised at once and does not count
+against the dependency. Every dependency has a
+`CircuitBreaker`: after `BREAKER_FAILURE_THRESHOLD` consecutive failed calls it
+opens and further calls fail immediately with a `DependencyError`, until a
+trial call after `BREAKER_RESET_TIMEOUT` seconds succeeds.
+
+Callers get a `DependencyError` instead of a fallback value, so a tool can
+report the outage and the graph can stop instead of looping over it.
+"""
+
+import asyncio
+import random
+import sys
+import threading
+import time
+from typing import Awaitable, Callable, Optional, TypeVar
+
+import httpx
+
+from docs_doctor.core.metrics import metrics
+from docs_doctor.core.ratelimit import RateLimiter, limit_acquired
+
+T = TypeVar("T")
+
+# SQLSTATE classes of transient database errors: connection exception,
+# transaction rollback (deadlocks, serialization), insufficient resources and
+# operator intervention (statement timeouts)
+TRANSIENT_SQLSTATE_CLASSES = ("08", "40", "53", "57")
+
+
+class DependencyError(Exception):
+    """An upstream dependency failed or is known to be down."""
+
+    def __init__(self, dependency: str, reason: str, message: str = ""):
+        """Create the error.
+
+        Args:
+            dependency: Name of the dependency, e.g. "supabase".
+            reason: "circuit_open", "timeout" or "error".
+            message: Description of the last underlying error.
+        """
+        self.dependency = dependency
+        self.reason = reason
+        self.message = message
+        super().__init__(f"{dependency} unavailable ({reason}){': ' + message if message else ''}")
+
+    def to_dict(self) -> dict:
+        return {"dependency": self.dependency, "reason": self.reason, "message": self.message}
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with a single half-open trial call."""
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        """Whether a call may go through; only one trial call while half open."""
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.opened_at is not None:
+                metrics.incr(f"breaker.{self.name}.closed")
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+            metrics.set_gauge(f"breaker.{self.name}.open", 0)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.failure_threshold:
+                if self.opened_at is None or self._trial:
+                    metrics.incr(f"breaker.{self.name}.opened")
+                self.opened_at = time.monotonic()
+                self._trial = False
+                metrics.set_gauge(f"breaker.{self.name}.open", 1)
+
+    def abandon(self) -> None:
+        """Forget a call that ended without a result, e.g. cancelled, so a new trial can run."""
+        with self._lock:
+            self._trial = False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"state": self._state(), "failures": self.failures}
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(dependency: str) -> CircuitBreaker:
+    """Get the shared circuit breaker of a dependency."""
+    with _breakers_lock:
+        breaker = _breakers.get(dependency)
+        if breaker is None:
+            from docs_doctor.core.settings import settings
+
+            breaker = _breakers[dependency] = CircuitBreaker(
+                dependency, settings.BREAKER_FAILURE_THRESHOLD, settings.BREAKER_RESET_TIMEOUT
+            )
+        return breaker
+
+
+def breaker_stats() -> dict[str, dict]:
+    """State of every circuit breaker created so far."""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.stats() for breaker in breakers}
+
+
+def backoff(attempt: int, base_delay: float, max_delay: float) -> float:
+    """Full-jitter exponential backoff before retry number `attempt` (from 1)."""
+    return random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    if status is None and type(error).__module__.startswith("postgrest"):
+        # PostgREST errors carry the HTTP status as their code when the body was not
+        # JSON, else a PGRST or five-character SQLSTATE code
+        code = str(getattr(error, "code", "") or "")
+        if len(code) == 3 and code.isdigit():
+            status = code
+    return int(status) if status is not None else None
+
+
+def retryable(error: BaseException) -> bool:
+    """Whether an error is transient: a timeout, a connection error, a 429 or a 5xx.
+
+    Other errors (bad requests, authentication, missing rows, validation) fail
+    the same way on every attempt.
+    """
+    if isinstance(error, (TimeoutError, ConnectionError, httpx.TransportError)):
+        return True
+    openai = sys.modules.get("openai")
+    # APIConnectionError includes the client's timeouts
+    if openai is not None and isinstance(error, openai.APIConnectionError):
+        return True
+    status = _status_code(error)
+    if status is not None:
+        return status == 429 or status >= 500
+    if type(error).__module__.startswith("postgrest"):
+        code = str(getattr(error, "code", "") or "")
+        # PGRST000-PGRST003: PostgREST could not connect to or get a connection from the database
+        return code.startswith("PGRST00") or code[:2] in TRANSIENT_SQLSTATE_CLASSES
+    return False
+
+
+def _retry_settings(attempts, timeout, dependency):
+    from docs_doctor.core.settings import settings
+
+    if attempts is None:
+        attempts = settings.RETRY_ATTEMPTS
+    if timeout is None:
+        timeout = getattr(settings, f"{dependency.upper()}_TIMEOUT", None)
+    return max(attempts, 1), timeout or None, settings.RETRY_BASE_DELAY, settings.RETRY_MAX_DELAY
+
+
+def _open(dependency: str) -> DependencyError:
+    metrics.incr(f"breaker.{dependency}.rejected")
+    return DependencyError(dependency, "circuit_open")
+
+
+async def call_with_retry(
+    dependency: str,
+    call: Callable[[], Awaitable[T]],
+    attempts: Optional[int] = None,
+    timeout: Optional[float] = None,
+    limiter: Optional[RateLimiter] = None,
+    tokens: int = 0,
+) -> T:
+    """Await `call()` with retries, a timeout per attempt and the dependency's breaker.
+
+    Args:
+        dependency: Name of the dependency, selects the breaker and the
+            `<DEPENDENCY>_TIMEOUT` setting.
+        call: Starts one attempt, called again for every retry.
+        attempts: Attempts in total, defaults to `RETRY_ATTEMPTS`.
+        timeout: Seconds per attempt, defaults to the dependency's timeout setting.
+        limiter: Rate limit waited for before every attempt, outside of its timeout.
+            Requests of the attempt then skip the limiter in the HTTP transport, so
+            throttling never counts as a timeout or a breaker failure.
+        tokens: Estimated tokens of an attempt, taken from `limiter`.
+
+    Raises:
+        DependencyError: The breaker is open, or every attempt failed.
+        Exception: An error that is not `retryable`, raised from the first attempt.
+    """
+    breaker = get_breaker(dependency)
+    if not breaker.allow():
+        raise _open(dependency)
+    attempts, timeout, base_delay, max_delay = _retry_settings(attempts, timeout, dependency)
+    reason, error = "error", None
+    try:
+        for attempt in range(1, attempts + 1):
+            if attempt > 1:
+                metrics.incr(f"retry.{dependency}.retries")
+                await asyncio.sleep(backoff(attempt - 1, base_delay, max_delay))
+            if limiter is not None:
+                await limiter.acquire(tokens)
+            try:
+                with limit_acquired(limiter.name if limiter is not None else None):
+                    result = await asyncio.wait_for(call(), timeout)
+            except asyncio.TimeoutError:
+                reason, error = "timeout", None
+            except Exception as e:
+                if not retryable(e):
+                    metrics.incr(f"retry.{dependency}.not_retried")
+                    raise
+                reason, error = "error", e
+            else:
+                breaker.record_success()
+                return result
+            metrics.incr(f"retry.{dependency}.failures")
+    except BaseException:
+        breaker.abandon()
+        raise
+    breaker.record_failure()
+    raise DependencyError(dependency, reason, str(error or "")) from error
+
+
+def call_with_retry_blocking(
+    dependency: str,
+    call: Callable[[], T],
+    attempts: Optional[int] = None,
+    limiter: Optional[RateLimiter] = None,
+    tokens: int = 0,
+) -> T:
+    """Blocking `call_with_retry`, for calls made from worker threads.
+
+    Attempts rely on the client's own timeouts. Errors that are not `retryable`
+    are raised from the first attempt, like in `call_with_retry`.
+    """
+    breaker = get_breaker(dependency)
+    if not breaker.allow():
+        raise _open(dependency)
+    attempts, _, base_delay, max_delay = _retry_settings(attempts, None, dependency)
+    error = None
+    try:
+        for attempt in range(1, attempts + 1):
+            if attempt > 1:
+                metrics.incr(f"retry.{dependency}.retries")
+                time.sleep(backoff(attempt - 1, base_delay, max_delay))
+            if limiter is not None:
+                limiter.acquire_blocking(tokens)
+            try:
+                with limit_acquired(limiter.name if limiter is not None else None):
+                    result = call()
+            except Exception as e:
+                if not retryable(e):
+                    metrics.incr(f"retry.{dependency}.not_retried")
+                    raise
+                error = e
+                metrics.incr(f"retry.{dependency}.failures")
+                continue
+            breaker.record_success()
+            return result
+    except BaseException:
+        breaker.abandon()
+        raise
+    breaker.record_failure()
+    raise DependencyError(dependency, "error", str(error)) from error
@@ -0,0 +1,90 @@
+"""Compact checkpoint serializer.
+
+Every step of a thread serializes its whole message list. Chat model messages
+carry verbose `response_metadata` (headers, logprobs, system fingerprints)
+that is never read back, and long threads compress well. `CompactSerializer`
+keeps LangGraph's msgpack encoding but drops that metadata and compresses
+large payloads with zstd when the `zstandard` package is installed.
+
+Payloads written by the default serializer are still read, so existing
+checkpoints keep working.
+"""
+
+from typing import Any, Optional
+
+from langchain_core.messages import BaseMessage
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from docs_doctor.core.metrics import metrics
+from docs_doctor.core.settings import settings
+
+try:
+    import zstandard
+except ImportError:  # compression is optional
+    zstandard = None
+
+# Type tag suffix of compressed payloads
+ZSTD_SUFFIX = "+zstd"
+# response_metadata keys kept on messages, everything else is dropped
+KEPT_RESPONSE_METADATA = ("model_name", "finish_reason")
+
+
+def strip_message(message: BaseMessage) -> BaseMessage:
+    """Copy of a message without non-essential response metadata."""
+    metadata = getattr(message, "response_metadata", None)
+    if not metadata or set(metadata) <= set(KEPT_RESPONSE_METADATA):
+        return message
+    kept = {key: metadata[key] for key in KEPT_RESPONSE_METADATA if key in metadata}
+    return message.model_copy(update={"response_metadata": kept})
+
+
+def _strip(obj: Any) -> Any:
+    if isinstance(obj, BaseMessage):
+        return strip_message(obj)
+    if isinstance(obj, dict):
+        return {key: _strip(value) for key, value in obj.items()}
+    if isinstance(obj, list):
+        return [_strip(value) for value in obj]
+    if isinstance(obj, tuple) and not hasattr(obj, "_fields"):
+        return tuple(_strip(value) for value in obj)
+    return obj
+
+
+class CompactSerializer(JsonPlusSerializer):
+    """JsonPlusSerializer stripping message metadata and compressing large payloads."""
+
+    def __init__(
+        self,
+        *args: Any,
+        compression_threshold: Optional[int] = None,
+        compression_level: Optional[int] = None,
+        strip_metadata: bool = True,
+        **kwargs: Any,
+    ):
+        super().__init__(*args, **kwargs)
+        self.compression_threshold = (
+            settings.CHECKPOINT_ZSTD_THRESHOLD if compression_threshold is None else compression_threshold
+        )
+        self.strip_metadata = strip_metadata
+        level = settings.CHECKPOINT_ZSTD_LEVEL if compression_level is None else compression_level
+        self._compressor = zstandard.ZstdCompressor(level=level) if zstandard else None
+        self._decompressor = zstandard.ZstdDecompressor() if zstandard else None
+
+    def dumps_typed(self, obj: Any) -> tuple[str, bytes]:
+        if self.strip_metadata:
+            obj = _strip(obj)
+        type_, data = super().dumps_typed(obj)
+        metrics.incr("checkpoint.serialized_bytes", len(data))
+        if self._compressor is None or len(data) < self.compression_threshold or type_ in ("null", "bytes"):
+            return type_, data
+        compressed = self._compressor.compress(data)
+        metrics.incr("checkpoint.compressed_bytes_saved", len(data) - len(compressed))
+        return type_ + ZSTD_SUFFIX, compressed
+
+    def loads_typed(self, data: tuple[str, bytes]) -> Any:
+        type_, payload = data
+        if type_.endswith(ZSTD_SUFFIX):
+            if self._decompressor is None:
+                raise RuntimeError("Checkpoint is zstd compressed, install the zstandard package to read it")
+            type_, payload = type_[: -len(ZSTD_SUFFIX)], self._decompressor.decompress(payload)
+        return super().loads_typed((type_, payload))
@@ -1,8 +1,9 @@
 import socket
-from typing import Annotated, Any
+import threading
+from typing import Annotated, Literal
 
 from dotenv import find_dotenv
-from pydantic import BeforeValidator, HttpUrl, SecretStr, TypeAdapter, computed_field, BaseModel
+from pydantic import BeforeValidator, HttpUrl, PrivateAttr, SecretStr, TypeAdapter, computed_field, BaseModel
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 import requests
@@ -59,11 +60,72 @@ class Settings(BaseSettings):
     PORT: int = 8000
 
     OPEN_ROUTER_API_KEY: SecretStr
-
-    DEFAULT_MODEL: OpenRouterModel | None = None  # type: ignore[assignment]
-    AVAILABLE_MODELS: list[OpenRouterModel] = list()  # type: ignore[assignment]
+    OPEN_ROUTER_BASE_URL: str = "https://openrouter.ai/api/v1"
+
+    # Shared HTTP connection pool used by every LLM client
+    HTTP2: bool = True
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_KEEPALIVE_EXPIRY: float = 60.0
+    HTTP_TIMEOUT: float = 120.0
+    HTTP_CONNECT_TIMEOUT: float = 10.0
+    HTTP_CONNECT_RETRIES: int = 1
+
+    # Shared rate limits per upstream, 0 disables a limit
+    OPENROUTER_REQUESTS_PER_MINUTE: int = 600
+    OPENROUTER_TOKENS_PER_MINUTE: int = 0
+    EMBEDDINGS_REQUESTS_PER_MINUTE: int = 3000
+    EMBEDDINGS_TOKENS_PER_MINUTE: int = 1_000_000
+    SUPABASE_REQUESTS_PER_MINUTE: int = 1200
+
+    # Retries and circuit breakers of the embedding API and Supabase
+    RETRY_ATTEMPTS: int = 3
+    RETRY_BASE_DELAY: float = 0.25
+    RETRY_MAX_DELAY: float = 4.0
+    EMBEDDINGS_TIMEOUT: float = 30.0
+    SUPABASE_TIMEOUT: float = 15.0
+    BREAKER_FAILURE_THRESHOLD: int = 5
+    BREAKER_RESET_TIMEOUT: float = 30.0
+
+    # Record or replay every upstream call of the process, see core.cassette
+    CASSETTE_MODE: Literal["record", "replay"] | None = None
+    CASSETTE_PATH: str = ".docs_doctor/cassette.jsonl"
+    CASSETTE_LATENCY_SCALE: float = 1.0
+
+    # Per-request profiles, see core.profiling; set by `serve --profile`
+    PROFILE_MODE: Literal["sample", "cprofile"] | None = None
+    PROFILE_DIR: str = ".docs_doctor/profiles"
+    PROFILE_INTERVAL: float = 0.005
+
+    # tracemalloc snapshots every MEMORY_SNAPSHOT_INTERVAL seconds, 0 disables, see core.memory
+    MEMORY_SNAPSHOT_INTERVAL: float = 0.0
+    MEMORY_TRACE_FRAMES: int = 8
+    MEMORY_TOP: int = 10
+    # Serve the report on the API's /debug/memory and the app's ?debug=memory page
+    MEMORY_DEBUG_PAGE: bool = False
+
+    # OpenRouter models with tool support, listed on first use rather than at import
+    _available_models: list[OpenRouterModel] | None = PrivateAttr(default=None)
+    _models_lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
 
     DEFAULT_STREAMING: bool | None = True
+    STREAM_FRAMES_PER_SECOND: float = 12.0
+
+    # Durable checkpointer shared by the API service workers
+    POSTGRES_CONN_STRING: SecretStr | None = None
+    SQLITE_DB_PATH: str = "checkpoints.db"
+    # Compact checkpoint serialization, zstd needs the `compression` extra
+    CHECKPOINT_COMPACT: bool = True
+    CHECKPOINT_ZSTD_THRESHOLD: int = 16_384
+    CHECKPOINT_ZSTD_LEVEL: int = 3
+
+    # Tool outputs over BLOB_THRESHOLD characters are kept out of the graph state
+    BLOB_STORE_PATH: str = ".docs_doctor/blobs"
+    BLOB_THRESHOLD: int = 4000
+    BLOB_SUMMARY_CHARS: int = 500
+    # Set when BLOB_STORE_PATH is storage mounted by every host of the service (e.g. NFS).
+    # Otherwise tool outputs stay in the checkpoints when they are shared through Postgres.
+    BLOB_STORE_SHARED: bool = False
 
     LANGCHAIN_TRACING_V2: bool = False
     LANGCHAIN_PROJECT: str = "default"
@@ -88,9 +150,16 @@ class Settings(BaseSettings):
             sock.close()
 
 
-    def model_post_init(self, __context: Any) -> None:
-        self.AVAILABLE_MODELS = list_tools_models()
-        self.DEFAULT_MODEL = self.AVAILABLE_MODELS[0]
+    @property
+    def AVAILABLE_MODELS(self) -> list[OpenRouterModel]:
+        with self._models_lock:
+            if self._available_models is None:
+                self._available_models = list_tools_models()
+            return self._available_models
+
+    @property
+    def DEFAULT_MODEL(self) -> OpenRouterModel:
+        return self.AVAILABLE_MODELS[0]
 
     @computed_field
     @property
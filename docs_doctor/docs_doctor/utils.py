@@ -5,7 +5,7 @@ from langchain_core.messages import BaseMessage
 from langchain_openai import OpenAIEmbeddings
 from langchain_core.runnables import RunnableConfig
 
-from docs_doctor.core.llm import get_model, settings
+from docs_doctor.core.llm import get_model
 
 def get_message_text(msg: BaseMessage) -> str:
     """Get the text content of a message."""
@@ -25,7 +25,7 @@ def call_model(config: RunnableConfig) -> BaseChatModel:
     Args:
         fully_specified_name (str): String in the format 'provider/model'.
     """
-    model = get_model(config["configurable"].get("model", settings.DEFAULT_MODEL))
+    model = get_model(config["configurable"].get("model"))
     return model
 
 
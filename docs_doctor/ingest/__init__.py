@@ -0,0 +1,3 @@
+from docs_doctor.ingest.pipeline import IngestOptions, IngestStats, ingest_package
+
+__all__ = ["IngestOptions", "IngestStats", "ingest_package"]
@@ -0,0 +1,264 @@
+"""Discover, convert and chunk documentation pages.
+
+Everything in this module is a plain function of its arguments so it can run in
+a process pool.
+"""
+
+import hashlib
+import re
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass, field
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Dict, List, Optional
+
+MARKDOWN_SUFFIXES = {".md", ".markdown", ".mdx"}
+HTML_SUFFIXES = {".html", ".htm"}
+TEXT_SUFFIXES = {".txt", ".rst"}
+
+# Build artefacts of mkdocs / Sphinx output that are not documentation pages
+IGNORED_PARTS = {"_static", "_sources", "_images", "_modules", "assets", "search", "node_modules", ".git"}
+IGNORED_NAMES = {"404.html", "genindex.html", "search.html", "py-modindex.html"}
+
+
+@dataclass
+class Chunk:
+    """A chunk of a documentation page, ready to be embedded."""
+
+    url: str
+    chunk_number: int
+    title: str
+    summary: str
+    content: str
+    metadata: Dict = field(default_factory=dict)
+    content_hash: str = ""
+
+
+def content_hash(content: str) -> str:
+    """Hash of a chunk's content, which identifies its embedding."""
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def discover_files(root: str | Path) -> List[Path]:
+    """List documentation files under a local doc tree (or a single file)."""
+    root = Path(root)
+    if root.is_file():
+        return [root]
+    suffixes = MARKDOWN_SUFFIXES | HTML_SUFFIXES | TEXT_SUFFIXES
+    return sorted(
+        path for path in root.rglob("*")
+        if path.is_file()
+        and path.suffix.lower() in suffixes
+        and path.name not in IGNORED_NAMES
+        and not IGNORED_PARTS.intersection(path.relative_to(root).parts)
+    )
+
+
+def file_url(path: Path, root: Path, source: str, base_url: Optional[str] = None) -> str:
+    """Build the page URL of a local file, mapping mkdocs `page/index.html` to `page/`.
+
+    Without a `base_url` the URL is `local://<source>/<path>`, so the pages of
+    two packages never share a URL.
+    """
+    relative = path.relative_to(root).as_posix() if root.is_dir() else path.name
+    if relative.endswith("index.html"):
+        relative = relative[: -len("index.html")]
+    elif path.suffix.lower() in MARKDOWN_SUFFIXES | HTML_SUFFIXES:
+        relative = relative.rsplit(".", 1)[0]
+    if base_url:
+        return base_url.rstrip("/") + "/" + relative
+    return f"local://{source}/{relative or 'index'}"
+
+
+def parse_sitemap(text: str) -> List[str]:
+    """Extract page URLs from a sitemap XML document."""
+    tree = ET.fromstring(text)
+    return [
+        element.text.strip()
+        for element in tree.iter()
+        if element.tag.rsplit("}", 1)[-1] == "loc" and element.text
+    ]
+
+
+class _HTMLToMarkdown(HTMLParser):
+    """Minimal HTML to markdown converter keeping headings, code, lists and text."""
+
+    SKIPPED = {"script", "style", "nav", "header", "footer", "aside", "form", "button", "svg", "noscript"}
+    BLOCKS = {"p", "div", "section", "article", "main", "table", "tr", "dl", "dt", "dd", "blockquote", "ul", "ol"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self.title = ""
+        self._skip_depth = 0
+        self._in_pre = False
+        self._in_title = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIPPED:
+            self._skip_depth += 1
+        elif self._skip_depth:
+            return
+        elif tag == "title":
+            self._in_title = True
+        elif re.fullmatch(r"h[1-6]", tag):
+            self.parts.append("\n\n" + "#" * int(tag[1]) + " ")
+        elif tag == "pre":
+            self._in_pre = True
+            self.parts.append("\n\n```\n")
+        elif tag == "code" and not self._in_pre:
+            self.parts.append("`")
+        elif tag == "li":
+            self.parts.append("\n- ")
+        elif tag == "br":
+            self.parts.append("\n")
+        elif tag in self.BLOCKS:
+            self.parts.append("\n\n")
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIPPED:
+            self._skip_depth = max(self._skip_depth - 1, 0)
+        elif self._skip_depth:
+            return
+        elif tag == "title":
+            self._in_title = False
+        elif tag == "pre":
+            self._in_pre = False
+            self.parts.append("\n```\n\n")
+        elif tag == "code" and not self._in_pre:
+            self.parts.append("`")
+        elif re.fullmatch(r"h[1-6]", tag) or tag in self.BLOCKS:
+            self.parts.append("\n\n")
+        elif tag in ("td", "th"):
+            self.parts.append(" | ")
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+        elif self._skip_depth:
+            return
+        elif self._in_pre:
+            self.parts.append(data)
+        else:
+            self.parts.append(re.sub(r"\s+", " ", data))
+
+    def markdown(self) -> str:
+        text = "".join(self.parts)
+        text = re.sub(r"[ \t]+\n", "\n", text)
+        return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+
+def _main_content(html: str) -> str:
+    """Keep the main content of a page when the theme marks it."""
+    for pattern in (r"<main[\s>].*?</main>", r"<article[\s>].*?</article>", r'<div[^>]+role="main".*?</div>\s*</div>'):
+        match = re.search(pattern, html, flags=re.S | re.I)
+        if match:
+            return match.group(0)
+    return html
+
+
+def html_to_markdown(html: str) -> tuple[str, str]:
+    """Convert an HTML page to (title, markdown)."""
+    title_parser = _HTMLToMarkdown()
+    title_match = re.search(r"<title[^>]*>.*?</title>", html, flags=re.S | re.I)
+    if title_match:
+        title_parser.feed(title_match.group(0))
+    parser = _HTMLToMarkdown()
+    parser.feed(_main_content(html))
+    return title_parser.title.strip(), parser.markdown()
+
+
+def chunk_text(text: str, chunk_size: int = 5000) -> List[str]:
+    """Split text into chunks, respecting code blocks and paragraphs."""
+    chunks = []
+    start = 0
+    text_length = len(text)
+
+    while start < text_length:
+        end = start + chunk_size
+        if end >= text_length:
+            chunks.append(text[start:].strip())
+            break
+
+        chunk = text[start:end]
+        code_block = chunk.rfind("```")
+        if code_block != -1 and code_block > chunk_size * 0.3:
+            # Break before the last code fence so code blocks are not cut
+            end = start + code_block
+        elif "\n\n" in chunk:
+            last_break = chunk.rfind("\n\n")
+            if last_break > chunk_size * 0.3:
+                end = start + last_break
+        elif ". " in chunk:
+            last_period = chunk.rfind(". ")
+            if last_period > chunk_size * 0.3:
+                end = start + last_period + 1
+
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        start = max(start + 1, end)
+
+    return [chunk for chunk in chunks if chunk]
+
+
+def _title_and_summary(chunk: str, page_title: str) -> tuple[str, str]:
+    heading = re.search(r"^#{1,6} (.+)$", chunk, flags=re.M)
+    title = page_title or (heading.group(1).strip() if heading else "")
+    if heading and page_title and heading.group(1).strip() != page_title:
+        title = f"{page_title} - {heading.group(1).strip()}"
+    prose = [
+        line.strip() for line in re.sub(r"```.*?(```|$)", "", chunk, flags=re.S).splitlines()
+        if line.strip() and not line.lstrip().startswith(("#", "```", "|", "-"))
+    ]
+    summary = " ".join(prose)[:300]
+    return title or "Untitled", summary
+
+
+def chunk_page(url: str, text: str, source: str, kind: str = "markdown", chunk_size: int = 5000) -> List[Chunk]:
+    """Convert a page and split it into `Chunk`s.
+
+    Titles and summaries are derived from the page headings and first sentences
+    rather than generated by an LLM, which keeps ingestion cheap.
+
+    Args:
+        url: URL of the page.
+        text: Raw page content.
+        source: Package name stored as `metadata.source`, used to filter retrieval.
+        kind: "html", "markdown" or "text".
+        chunk_size: Maximum number of characters per chunk.
+    """
+    page_title = ""
+    if kind == "html":
+        page_title, text = html_to_markdown(text)
+    else:
+        heading = re.search(r"^# (.+)$", text, flags=re.M)
+        page_title = heading.group(1).strip() if heading else ""
+    page_title = page_title.split(" - ")[0].split(" — ")[0].strip()
+
+    chunks = []
+    for number, content in enumerate(chunk_text(text, chunk_size)):
+        title, summary = _title_and_summary(content, page_title)
+        chunks.append(Chunk(
+            url=url,
+            chunk_number=number,
+            title=title,
+            summary=summary,
+            content=content,
+            content_hash=content_hash(content),
+            metadata={
+                "source": source,
+                "chunk_size": len(content),
+                "url_path": url,
+            },
+        ))
+    return chunks
+
+
+def chunk_file(path: str, root: str, base_url: Optional[str], source: str, chunk_size: int = 5000) -> List[Chunk]:
+    """Read a local documentation file and chunk it."""
+    path, root = Path(path), Path(root)
+    suffix = path.suffix.lower()
+    kind = "html" if suffix in HTML_SUFFIXES else "markdown" if suffix in MARKDOWN_SUFFIXES else "text"
+    text = path.read_text(encoding="utf-8", errors="replace")
+    return chunk_page(file_url(path, root, source, base_url), text, source, kind, chunk_size)
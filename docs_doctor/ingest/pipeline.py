@@ -0,0 +1,491 @@
+"""Streaming ingestion of documentation into `site_pages` and `packages`.
+
+Pages flow through three concurrent stages connected by bounded queues, so a
+slow stage applies backpressure to the ones before it:
+
+1. convert: pages are converted and chunked in a process pool,
+2. embed: chunks are embedded in batches bounded by size and token count,
+   under the run's requests/tokens per minute budget and the process-wide
+   embedding rate limit,
+3. write: rows are bulk-upserted into Supabase.
+
+Re-ingesting a package is incremental: every row carries the hash of its
+content, chunks whose hash did not change are skipped, embeddings of content
+already stored (under any package or version) are reused, and rows of chunks
+that disappeared are deleted.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from docs_doctor.ingest.documents import Chunk, chunk_file, chunk_page, discover_files, parse_sitemap
+
+logger = logging.getLogger(__name__)
+
+# Rough number of characters per token for budgeting embedding requests
+CHARS_PER_TOKEN = 4
+# Rows per Supabase select / delete when diffing against the stored chunks
+INDEX_PAGE_SIZE = 1000
+_DONE = object()
+
+ChunkKey = Tuple[str, int]
+
+
+@dataclass
+class IngestOptions:
+    """Tuning knobs of an ingestion run."""
+
+    workers: Optional[int] = None
+    """Processes converting and chunking pages, defaults to the CPU count."""
+    chunk_size: int = 5000
+    """Maximum number of characters per chunk."""
+    embed_batch_size: int = 64
+    """Maximum number of chunks per embedding request."""
+    embed_batch_tokens: int = 100_000
+    """Maximum estimated tokens per embedding request."""
+    embed_concurrency: int = 4
+    """Embedding requests in flight."""
+    requests_per_minute: int = 3000
+    tokens_per_minute: int = 1_000_000
+    write_batch_size: int = 100
+    """Rows per Supabase upsert."""
+    fetch_concurrency: int = 8
+    """Pages fetched at the same time when ingesting a sitemap."""
+    queue_size: int = 1000
+    """Maximum chunks waiting between two stages."""
+
+
+@dataclass
+class IngestStats:
+    """Progress and throughput of an ingestion run."""
+
+    pages: int = 0
+    failed_pages: int = 0
+    chunks: int = 0
+    unchanged: int = 0
+    reused: int = 0
+    embedded: int = 0
+    embedding_requests: int = 0
+    tokens: int = 0
+    written: int = 0
+    deleted: int = 0
+    started: float = field(default_factory=time.perf_counter)
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def summary(self) -> str:
+        elapsed = self.elapsed or 1e-9
+        return (
+            f"{self.pages} pages ({self.failed_pages} failed), {self.chunks} chunks "
+            f"({self.unchanged} unchanged, {self.reused} reused), "
+            f"{self.embedded} embedded in {self.embedding_requests} requests (~{self.tokens} tokens), "
+            f"{self.written} rows written, {self.deleted} deleted in {elapsed:.1f}s "
+            f"({self.pages / elapsed:.1f} pages/s, {self.written / elapsed:.1f} rows/s)"
+        )
+
+
+@dataclass
+class IndexState:
+    """Chunks already stored for a package, keyed by (url, chunk_number)."""
+
+    hashes: Dict[ChunkKey, str] = field(default_factory=dict)
+    # Title and summary are not part of the content hash, which only identifies the embedding
+    headings: Dict[ChunkKey, Tuple[str, str]] = field(default_factory=dict)
+    ids: Dict[ChunkKey, int] = field(default_factory=dict)
+    seen: Set[ChunkKey] = field(default_factory=set)
+
+    def add(self, row: dict) -> None:
+        key = (row["url"], row["chunk_number"])
+        self.hashes[key] = row.get("content_hash") or ""
+        self.headings[key] = (row.get("title") or "", row.get("summary") or "")
+        self.ids[key] = row["id"]
+
+    def is_unchanged(self, chunk: Chunk) -> bool:
+        """Mark a chunk as seen and tell whether its stored row is identical.
+
+        A chunk whose content is unchanged but whose title or summary changed is
+        rewritten, reusing the stored embedding of its content.
+        """
+        key = (chunk.url, chunk.chunk_number)
+        self.seen.add(key)
+        return (
+            bool(chunk.content_hash)
+            and self.hashes.get(key) == chunk.content_hash
+            and self.headings.get(key) == (chunk.title, chunk.summary)
+        )
+
+    def stale_ids(self) -> List[int]:
+        """Ids of stored chunks not produced by this run."""
+        return [row_id for key, row_id in self.ids.items() if key not in self.seen]
+
+
+def _estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+async def _embed_stage(
+    chunks: asyncio.Queue,
+    rows: asyncio.Queue,
+    embed: Callable[[List[str]], Awaitable[List[List[float]]]],
+    options: IngestOptions,
+    stats: IngestStats,
+    index: Optional[IndexState] = None,
+    lookup: Optional[Callable[[List[str]], Awaitable[Dict[str, List[float]]]]] = None,
+) -> None:
+    # Imported here, process pool workers load this module to unpickle their tasks
+    from docs_doctor.core.ratelimit import RateLimiter
+
+    budget = RateLimiter("ingest", options.requests_per_minute, options.tokens_per_minute)
+    in_flight = asyncio.Semaphore(options.embed_concurrency)
+    tasks: List[asyncio.Task] = []
+
+    async def embed_batch(batch: List[Chunk]) -> None:
+        try:
+            known = await lookup([chunk.content_hash for chunk in batch]) if lookup else {}
+            # Identical chunks of one batch are embedded once
+            missing = {}
+            for chunk in batch:
+                if chunk.content_hash not in known:
+                    missing.setdefault(chunk.content_hash or id(chunk), chunk.content)
+            embeddings = dict(known)
+            if missing:
+                tokens = sum(_estimate_tokens(text) for text in missing.values())
+                await budget.acquire(tokens)
+                embedded = await embed(list(missing.values()))
+                embeddings.update(zip(missing.keys(), embedded))
+                stats.embedding_requests += 1
+                stats.embedded += len(missing)
+                stats.tokens += tokens
+            stats.reused += len(batch) - len(missing)
+            crawled_at = datetime.now(timezone.utc).isoformat()
+            for chunk in batch:
+                row = asdict(chunk)
+                row["metadata"] = {**chunk.metadata, "crawled_at": crawled_at}
+                row["embedding"] = embeddings[chunk.content_hash or id(chunk)]
+                await rows.put(row)
+        except Exception as e:
+            # The batch's pages are incomplete, which also keeps their stored chunks
+            stats.failed_pages += len({chunk.url for chunk in batch})
+            logger.warning(f"Error embedding {len(batch)} chunks: {e}")
+        finally:
+            in_flight.release()
+
+    async def flush(batch: List[Chunk]) -> None:
+        # Waiting for a free slot stops reading chunks, which backs up the converters
+        await in_flight.acquire()
+        tasks.append(asyncio.create_task(embed_batch(batch)))
+
+    batch: List[Chunk] = []
+    batch_tokens = 0
+    while (chunk := await chunks.get()) is not _DONE:
+        if index is not None and index.is_unchanged(chunk):
+            stats.unchanged += 1
+            continue
+        tokens = _estimate_tokens(chunk.content)
+        if batch and (len(batch) >= options.embed_batch_size or batch_tokens + tokens > options.embed_batch_tokens):
+            await flush(batch)
+            batch, batch_tokens = [], 0
+        batch.append(chunk)
+        batch_tokens += tokens
+    if batch:
+        await flush(batch)
+    await asyncio.gather(*tasks)
+    await rows.put(_DONE)
+
+
+async def _write_stage(
+    rows: asyncio.Queue,
+    write: Callable[[List[dict]], Awaitable[None]],
+    options: IngestOptions,
+    stats: IngestStats,
+) -> None:
+    batch: List[dict] = []
+    while (row := await rows.get()) is not _DONE:
+        batch.append(row)
+        if len(batch) >= options.write_batch_size:
+            await write(batch)
+            stats.written += len(batch)
+            batch = []
+    if batch:
+        await write(batch)
+        stats.written += len(batch)
+
+
+async def _report(stats: IngestStats, progress: Callable[[IngestStats], None], interval: float) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        progress(stats)
+
+
+async def run_pipeline(
+    pages: Iterable[Callable[[], List[Chunk]]] | None,
+    embed: Callable[[List[str]], Awaitable[List[List[float]]]],
+    write: Callable[[List[dict]], Awaitable[None]],
+    options: IngestOptions,
+    page_source: Optional[Callable[[asyncio.Queue, IngestStats], Awaitable[None]]] = None,
+    progress: Optional[Callable[[IngestStats], None]] = None,
+    progress_interval: float = 5.0,
+    index: Optional[IndexState] = None,
+    lookup: Optional[Callable[[List[str]], Awaitable[Dict[str, List[float]]]]] = None,
+) -> IngestStats:
+    """Run the convert -> embed -> write stages.
+
+    Args:
+        pages: Picklable zero-argument callables returning a page's chunks, run in
+            the process pool. Use `page_source` instead for pages produced by async code.
+        embed: Embeds a batch of texts.
+        write: Upserts a batch of rows.
+        options: Batch sizes, concurrency and rate limits.
+        page_source: Coroutine putting chunks on the queue itself, e.g. from fetched pages.
+        progress: Called every `progress_interval` seconds with the running stats.
+        index: Chunks already stored; unchanged ones are skipped and the rest marked as seen.
+        lookup: Returns the stored embeddings of content hashes, so only new content is embedded.
+    """
+    stats = IngestStats()
+    chunks: asyncio.Queue = asyncio.Queue(maxsize=options.queue_size)
+    rows: asyncio.Queue = asyncio.Queue(maxsize=options.queue_size)
+
+    embedder = asyncio.create_task(_embed_stage(chunks, rows, embed, options, stats, index, lookup))
+    writer = asyncio.create_task(_write_stage(rows, write, options, stats))
+    reporter = asyncio.create_task(_report(stats, progress, progress_interval)) if progress else None
+
+    async def produce() -> None:
+        if page_source is not None:
+            await page_source(chunks, stats)
+        if pages is not None:
+            await _convert_stage(pages, chunks, options, stats)
+        await chunks.put(_DONE)
+
+    producer = asyncio.create_task(produce())
+    try:
+        # A failing stage cancels the others instead of leaving them blocked on a full queue
+        await asyncio.gather(producer, embedder, writer)
+    finally:
+        for task in (producer, embedder, writer, reporter):
+            if task is not None and not task.done():
+                task.cancel()
+    return stats
+
+
+async def _convert_stage(
+    pages: Iterable[Callable[[], List[Chunk]]],
+    chunks: asyncio.Queue,
+    options: IngestOptions,
+    stats: IngestStats,
+) -> None:
+    loop = asyncio.get_running_loop()
+    with ProcessPoolExecutor(max_workers=options.workers) as pool:
+        # Keep at most two pages per worker queued in the pool
+        in_flight = asyncio.Semaphore(2 * (options.workers or os.cpu_count() or 1))
+
+        async def convert(page: Callable[[], List[Chunk]]) -> None:
+            try:
+                page_chunks = await loop.run_in_executor(pool, page)
+                stats.pages += 1
+                for chunk in page_chunks:
+                    stats.chunks += 1
+                    await chunks.put(chunk)
+            except Exception as e:
+                stats.failed_pages += 1
+                logger.warning(f"Error converting page: {e}")
+            finally:
+                # Freed once the page's chunks are queued, so a full chunk queue stops conversion
+                in_flight.release()
+
+        tasks = []
+        for page in pages:
+            await in_flight.acquire()
+            tasks.append(asyncio.create_task(convert(page)))
+        await asyncio.gather(*tasks)
+
+
+class _ChunkFile:
+    """Picklable task chunking one local file in a worker process."""
+
+    def __init__(self, path: Path, root: Path, base_url: Optional[str], source: str, chunk_size: int):
+        self.args = (str(path), str(root), base_url, source, chunk_size)
+
+    def __call__(self) -> List[Chunk]:
+        return chunk_file(*self.args)
+
+
+class _ChunkPage:
+    """Picklable task chunking one fetched page in a worker process."""
+
+    def __init__(self, url: str, html: str, source: str, chunk_size: int):
+        self.args = (url, html, source, "html", chunk_size)
+
+    def __call__(self) -> List[Chunk]:
+        return chunk_page(*self.args)
+
+
+def local_pages(root: str | Path, source: str, base_url: Optional[str], chunk_size: int) -> List[_ChunkFile]:
+    """Tasks chunking every documentation file of a local doc tree."""
+    root = Path(root)
+    return [_ChunkFile(path, root, base_url, source, chunk_size) for path in discover_files(root)]
+
+
+def sitemap_source(sitemap_file: str | Path, source: str, options: IngestOptions):
+    """Page source fetching the URLs of a saved sitemap and chunking them in a process pool."""
+    urls = parse_sitemap(Path(sitemap_file).read_text(encoding="utf-8"))
+
+    async def produce(chunks: asyncio.Queue, stats: IngestStats) -> None:
+        import httpx
+
+        loop = asyncio.get_running_loop()
+        fetch_slots = asyncio.Semaphore(options.fetch_concurrency)
+        with ProcessPoolExecutor(max_workers=options.workers) as pool:
+            async with httpx.AsyncClient(follow_redirects=True, timeout=30) as client:
+
+                async def ingest(url: str) -> None:
+                    try:
+                        async with fetch_slots:
+                            response = await client.get(url)
+                            response.raise_for_status()
+                        page_chunks = await loop.run_in_executor(
+                            pool, _ChunkPage(url, response.text, source, options.chunk_size)
+                        )
+                    except Exception as e:
+                        stats.failed_pages += 1
+                        logger.warning(f"Error ingesting {url}: {e}")
+                        return
+                    stats.pages += 1
+                    for chunk in page_chunks:
+                        stats.chunks += 1
+                        await chunks.put(chunk)
+
+                await asyncio.gather(*(ingest(url) for url in urls))
+
+    return produce
+
+
+def _parse_embedding(value) -> List[float]:
+    # pgvector columns come back from PostgREST as a "[0.1,...]" string
+    return json.loads(value) if isinstance(value, str) else value
+
+
+async def ingest_package(
+    path: str | Path,
+    package_name: str,
+    package: str,
+    description: str,
+    base_url: Optional[str] = None,
+    sitemap: bool = False,
+    options: Optional[IngestOptions] = None,
+    progress: Optional[Callable[[IngestStats], None]] = None,
+    full: bool = False,
+) -> IngestStats:
+    """Ingest a package's documentation and register it in the `packages` table.
+
+    Only new or changed chunks are embedded and written, and chunks that are no
+    longer part of the docs are deleted, unless some pages failed to convert.
+
+    Args:
+        path: Local doc tree (mkdocs/Sphinx build output, Markdown or HTML files),
+            or a saved sitemap XML file when `sitemap` is set.
+        package_name: Identifier of the package expert, stored as `metadata.source`.
+        package: Display name of the package.
+        description: Short description shown to the supervisor.
+        base_url: Public URL of the docs, used to build page URLs of local files.
+        sitemap: Whether `path` is a sitemap listing the pages to fetch.
+        options: Batch sizes, concurrency and rate limits.
+        progress: Called periodically with the running stats.
+        full: Re-embed and rewrite every chunk instead of diffing against the stored ones.
+    """
+    from docs_doctor.agent.utils import get_embedding_model, get_embeddings_limiter
+    from docs_doctor.core.ratelimit import estimate_tokens
+    from docs_doctor.core.resilience import call_with_retry
+    from docs_doctor.utils import aexecute, execute, get_supabase
+
+    embedding_model = get_embedding_model()
+    supabase = get_supabase()
+
+    async def embed(texts: List[str]) -> List[List[float]]:
+        return await call_with_retry(
+            "embeddings",
+            lambda: embedding_model.aembed_documents(texts),
+            limiter=get_embeddings_limiter(),
+            tokens=sum(estimate_tokens(text) for text in texts),
+        )
+
+    options = options or IngestOptions()
+
+    def load_index() -> IndexState:
+        index = IndexState()
+        start = 0
+        while True:
+            result = execute(
+                supabase.table("site_pages")
+                .select("id, url, chunk_number, content_hash, title, summary")
+                .eq("metadata->>source", package_name)
+                .order("id")
+                .range(start, start + INDEX_PAGE_SIZE - 1)
+            )
+            for row in result.data:
+                index.add(row)
+            if len(result.data) < INDEX_PAGE_SIZE:
+                return index
+            start += INDEX_PAGE_SIZE
+
+    async def lookup(hashes: List[str]) -> Dict[str, List[float]]:
+        hashes = sorted({h for h in hashes if h})
+        if not hashes:
+            return {}
+        result = await aexecute(
+            supabase.table("site_pages")
+            .select("content_hash, embedding")
+            .in_("content_hash", hashes)
+        )
+        return {
+            row["content_hash"]: _parse_embedding(row["embedding"])
+            for row in result.data if row.get("embedding") is not None
+        }
+
+    async def write(rows: List[dict]) -> None:
+        await aexecute(supabase.table("site_pages").upsert(rows, on_conflict="url,chunk_number"))
+
+    def delete(ids: List[int]) -> None:
+        for start in range(0, len(ids), INDEX_PAGE_SIZE):
+            execute(supabase.table("site_pages").delete().in_("id", ids[start:start + INDEX_PAGE_SIZE]))
+
+    index = await asyncio.to_thread(load_index)
+    if full:
+        # Without stored hashes every chunk is rewritten, but removed ones are still tracked
+        index = IndexState(ids=index.ids)
+    if sitemap:
+        stats = await run_pipeline(
+            None, embed, write, options,
+            page_source=sitemap_source(path, package_name, options), progress=progress,
+            index=index, lookup=None if full else lookup,
+        )
+    else:
+        pages = local_pages(path, package_name, base_url, options.chunk_size)
+        stats = await run_pipeline(
+            pages, embed, write, options, progress=progress,
+            index=index, lookup=None if full else lookup,
+        )
+
+    if stats.failed_pages:
+        logger.warning(f"Keeping stored chunks of {package_name}: {stats.failed_pages} pages failed")
+    else:
+        stale = index.stale_ids()
+        await asyncio.to_thread(delete, stale)
+        stats.deleted = len(stale)
+
+    await aexecute(
+        supabase.table("packages").upsert(
+            {"package": package, "package_name": package_name, "description": description},
+            on_conflict="package_name",
+        )
+    )
+    return stats
@@ -0,0 +1,227 @@
+"""Concurrent-session load generator used by the `loadtest` CLI command.
+
+Simulated users hold scripted multi-turn conversations through
+`DirectAgentClient`, the same path as the Streamlit sessions, while the load
+steps up through a list of user counts. Each stage reports throughput,
+turn latency, time to first token, lag of the shared event loop and memory
+growth. Run it against `core.fake` or a replayed cassette to measure the
+overhead of the graph itself, offline.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, Optional
+
+from docs_doctor.client import DirectAgentClient
+from docs_doctor.core.loop import get_loop
+from docs_doctor.core.memory import rss_bytes
+from docs_doctor.core.metrics import percentile
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SCRIPTS = [
+    ["How do I create an agent?", "How do I run it synchronously?", "Can it call tools?"],
+    ["What does the documentation say about dependencies?", "Show an example."],
+    ["How are results validated?", "What happens when validation fails?", "How do I retry?"],
+]
+# Seconds between two event-loop lag probes
+LAG_INTERVAL = 0.05
+
+
+def read_scripts(lines: Iterable[str]) -> list[list[str]]:
+    """Parse JSONL conversation scripts.
+
+    Each line is a list of user messages, an object with a `turns` list or a
+    single message.
+    """
+    scripts = []
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        item = json.loads(line)
+        if isinstance(item, dict):
+            item = item.get("turns")
+        if isinstance(item, str):
+            item = [item]
+        if not item or not all(isinstance(turn, str) for turn in item):
+            raise ValueError(f"Line {number} is not a list of user messages")
+        scripts.append(item)
+    return scripts
+
+
+@dataclass
+class StageStats:
+    """Results of one load stage."""
+
+    users: int
+    turns: int = 0
+    errors: int = 0
+    elapsed: float = 0.0
+    rss_start: int = 0
+    rss_end: int = 0
+    latencies: list[float] = field(default_factory=list, repr=False)
+    ttfts: list[float] = field(default_factory=list, repr=False)
+    loop_lags: list[float] = field(default_factory=list, repr=False)
+
+    @property
+    def throughput(self) -> float:
+        return self.turns / self.elapsed if self.elapsed else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "users": self.users,
+            "turns": self.turns,
+            "errors": self.errors,
+            "elapsed": round(self.elapsed, 3),
+            "turns_per_second": round(self.throughput, 3),
+            "latency_p50": percentile(self.latencies, 50),
+            "latency_p95": percentile(self.latencies, 95),
+            "latency_p99": percentile(self.latencies, 99),
+            "ttft_p50": percentile(self.ttfts, 50),
+            "ttft_p95": percentile(self.ttfts, 95),
+            "loop_lag_p95": percentile(self.loop_lags, 95),
+            "loop_lag_max": max(self.loop_lags, default=0.0),
+            "rss_start": self.rss_start,
+            "rss_end": self.rss_end,
+        }
+
+    def summary(self) -> str:
+        ttft = (
+            f" ttft p50={percentile(self.ttfts, 50):.2f}s p95={percentile(self.ttfts, 95):.2f}s"
+            if self.ttfts else ""
+        )
+        return (
+            f"{self.users:4d} users: {self.turns} turns ({self.errors} failed) in {self.elapsed:.1f}s - "
+            f"{self.throughput:.2f} turns/s\n"
+            f"      latency p50={percentile(self.latencies, 50):.2f}s p95={percentile(self.latencies, 95):.2f}s "
+            f"p99={percentile(self.latencies, 99):.2f}s{ttft}\n"
+            f"      loop lag p95={percentile(self.loop_lags, 95) * 1000:.1f}ms "
+            f"max={max(self.loop_lags, default=0.0) * 1000:.1f}ms  "
+            f"rss {self.rss_start / 2**20:.0f} -> {self.rss_end / 2**20:.0f} MiB"
+        )
+
+
+async def _monitor_lag(samples: list[float], stop: threading.Event) -> None:
+    # How late the loop wakes a sleeping coroutine: time other callbacks held it
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(LAG_INTERVAL)
+        samples.append(max(time.perf_counter() - started - LAG_INTERVAL, 0.0))
+
+
+async def _user(
+    client: DirectAgentClient,
+    scripts: list[list[str]],
+    user: int,
+    model: str,
+    stream: bool,
+    deadline: float,
+    stats: StageStats,
+) -> None:
+    conversation = user
+    while time.monotonic() < deadline:
+        # A new thread per conversation, so checkpoints grow like real sessions
+        thread_id = str(uuid.uuid4())
+        for message in scripts[conversation % len(scripts)]:
+            if time.monotonic() >= deadline:
+                return
+            started = time.perf_counter()
+            try:
+                if stream:
+                    first_token = None
+                    async for item in client.astream(message, model, thread_id):
+                        if first_token is None and isinstance(item, str):
+                            first_token = time.perf_counter() - started
+                    if first_token is not None:
+                        stats.ttfts.append(first_token)
+                else:
+                    await client.ainvoke(message, model, thread_id)
+            except Exception:
+                logger.debug("Load test turn failed", exc_info=True)
+                stats.errors += 1
+            else:
+                stats.turns += 1
+                stats.latencies.append(time.perf_counter() - started)
+        conversation += 1
+
+
+async def run_stage(
+    client: DirectAgentClient,
+    scripts: list[list[str]],
+    users: int,
+    model: str,
+    stage_seconds: float,
+    ramp_seconds: float = 0.0,
+    stream: bool = True,
+) -> StageStats:
+    """Run `users` simulated users for `stage_seconds`.
+
+    Users start evenly spread over `ramp_seconds` and start no new turn after
+    the stage's time is up; the stage ends once their last turns finished.
+    """
+    stats = StageStats(users=users, rss_start=rss_bytes())
+    stop = threading.Event()
+    lag = asyncio.run_coroutine_threadsafe(_monitor_lag(stats.loop_lags, stop), get_loop())
+    started = time.monotonic()
+    deadline = started + stage_seconds
+
+    async def start(user: int) -> None:
+        await asyncio.sleep(ramp_seconds * user / users)
+        await _user(client, scripts, user, model, stream, deadline, stats)
+
+    try:
+        await asyncio.gather(*(start(user) for user in range(users)))
+    finally:
+        stop.set()
+        await asyncio.wrap_future(lag)
+    stats.elapsed = time.monotonic() - started
+    stats.rss_end = rss_bytes()
+    return stats
+
+
+async def run_load(
+    client: DirectAgentClient,
+    scripts: list[list[str]],
+    levels: list[int],
+    model: str,
+    stage_seconds: float = 30.0,
+    ramp_seconds: float = 5.0,
+    stream: bool = True,
+    on_stage: Optional[Callable[[StageStats], None]] = None,
+) -> list[StageStats]:
+    """Step the load through `levels` simulated users, one stage per level.
+
+    Args:
+        client: Client shared by every simulated user, like the sessions of a process.
+        scripts: Conversations, each a list of user messages, assigned round-robin.
+        levels: Concurrent users of each stage.
+        model: Model id of every turn.
+        stage_seconds: Duration of each stage.
+        ramp_seconds: Time over which a stage's users start.
+        stream: Use `astream` and measure time to first token, else `ainvoke`.
+        on_stage: Called with the results of each stage as it finishes.
+
+    Raises:
+        ValueError: If no model is given. Resolving the default model lists the
+            OpenRouter models over the network, outside the replayed upstreams.
+    """
+    if not model:
+        raise ValueError("run_load needs an explicit model id")
+    results = []
+    for users in levels:
+        stats = await run_stage(client, scripts, users, model, stage_seconds, ramp_seconds, stream)
+        results.append(stats)
+        if on_stage is not None:
+            on_stage(stats)
+    return results
+
+
+def report(results: list[StageStats]) -> dict:
+    """JSON report of a load run."""
+    return {"stages": [stats.to_dict() for stats in results]}
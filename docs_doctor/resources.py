@@ -0,0 +1,133 @@
+"""Process-wide agent resources shared by every session.
+
+The compiled supervisor graph, the model and package catalogs, the local
+dependency list and the HTTP connection pool are built once per process. A
+Streamlit session or CLI run only keeps its own thread id and package
+selection, so opening a new tab does not query Supabase, parse dependency
+files or compile a graph again.
+"""
+
+import threading
+from functools import cached_property
+
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.graph.state import CompiledStateGraph
+
+from docs_doctor.agent.graph import equip_docs_doctor
+from docs_doctor.agent.tools import clear_tool_cache, use_package_catalog
+from docs_doctor.core.catalog import ModelCatalog
+from docs_doctor.core.checkpointer import checkpoint_serializer
+from docs_doctor.core.http import get_async_http_client, pool_stats
+from docs_doctor.core.memory import memory_stats, start_memory_monitor
+from docs_doctor.core.ratelimit import rate_limit_stats
+from docs_doctor.core.resilience import breaker_stats
+from docs_doctor.core.settings import settings
+from docs_doctor.utils.packages import get_available_packages, get_local_packages
+
+
+class AgentResources:
+    """Lazily built resources shared by all sessions of a process."""
+
+    def __init__(self, checkpointer: BaseCheckpointSaver | None = None, models: list[dict] | None = None):
+        """Create the resources of a process.
+
+        Args:
+            checkpointer: Shared checkpointer, threads are kept in memory by default.
+            models: Pinned model list, e.g. for offline runs, instead of the
+                OpenRouter models with tool support.
+        """
+        self._lock = threading.RLock()
+        # One checkpointer for all sessions, threads survive package changes
+        self.checkpointer = checkpointer or MemorySaver(serde=checkpoint_serializer())
+        self._agent: CompiledStateGraph | None = None
+        self._package_catalog: list[dict] | None = None
+        self._models = models
+        self._model_catalog: ModelCatalog | None = None
+
+    @property
+    def models(self) -> list[dict]:
+        return settings.AVAILABLE_MODELS if self._models is None else self._models
+
+    @property
+    def default_model(self) -> dict:
+        return settings.DEFAULT_MODEL if self._models is None else self._models[0]
+
+    @property
+    def model_catalog(self) -> ModelCatalog:
+        """Sorted views and indexes of `models`, rebuilt only when the model list changes."""
+        models = self.models
+        with self._lock:
+            if self._model_catalog is None or self._model_catalog.source is not models:
+                self._model_catalog = ModelCatalog(models)
+            return self._model_catalog
+
+    @property
+    def package_catalog(self) -> list[dict]:
+        """Rows of the Supabase `packages` table, fetched once."""
+        with self._lock:
+            if self._package_catalog is None:
+                self._package_catalog = get_available_packages()
+            return self._package_catalog
+
+    @cached_property
+    def local_packages(self) -> list[str]:
+        return get_local_packages()
+
+    @property
+    def available_packages(self) -> list[str]:
+        return [package["package_name"] for package in self.package_catalog]
+
+    @property
+    def default_packages(self) -> list[str]:
+        local_packages = set(self.local_packages)
+        return [name for name in self.available_packages if name in local_packages]
+
+    def get_agent(self) -> CompiledStateGraph:
+        """Get the compiled DocsDoctor graph, compiling it once.
+
+        Enabled packages are chosen per request with the `packages` configurable.
+        """
+        with self._lock:
+            if self._agent is None:
+                # Tool sets are built from the cached catalog, not from a Supabase query in a node
+                use_package_catalog(lambda: self.package_catalog)
+                self._agent = equip_docs_doctor(checkpointer=self.checkpointer)
+            return self._agent
+
+    def refresh_packages(self) -> None:
+        """Re-fetch the package catalog and drop the tool sets built from the old one."""
+        with self._lock:
+            self._package_catalog = None
+            clear_tool_cache()
+
+    @property
+    def http_client(self):
+        return get_async_http_client()
+
+    def stats(self) -> dict:
+        """Sizes of the shared resources, for diagnostics."""
+        with self._lock:
+            return {
+                "compiled_graphs": int(self._agent is not None),
+                "packages": len(self._package_catalog or []),
+                "models": len(self.models),
+                "http_pool": pool_stats(),
+                "rate_limits": rate_limit_stats(),
+                "breakers": breaker_stats(),
+                "memory": memory_stats(),
+            }
+
+
+_resources: AgentResources | None = None
+_resources_lock = threading.Lock()
+
+
+def get_resources() -> AgentResources:
+    """Get the process-wide `AgentResources`, creating it on first use."""
+    global _resources
+    with _resources_lock:
+        if _resources is None:
+            _resources = AgentResources()
+            start_memory_monitor(_resources.checkpointer)
+        return _resources
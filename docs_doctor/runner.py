@@ -0,0 +1,174 @@
+"""Headless agent runs used by the `ask` and `batch` CLI commands."""
+
+import asyncio
+import json
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from typing import IO, Any, AsyncIterator, Iterable
+
+from langchain_core.messages import HumanMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.graph.state import CompiledStateGraph
+
+from docs_doctor.core.budget import attach_budget
+from docs_doctor.core.metrics import percentile
+from docs_doctor.utils.streamlit_utils import (
+    convert_message_content_to_string,
+    remove_tool_calls,
+)
+
+# Only stream the supervisor's tokens, not the nested package experts'
+ANSWER_NODE = "package_supervisor"
+
+
+def make_config(
+    model: str, thread_id: str | None = None, packages: list[str] | None = None, **configurable: Any
+) -> RunnableConfig:
+    """Build the run config for a single question.
+
+    Extra keyword arguments are passed as configurable fields, e.g. `prefetch=True`.
+    A `timeout`, `max_model_calls` or `max_tokens` starts the request's budget.
+    """
+    return attach_budget(RunnableConfig(
+        configurable={
+            **configurable,
+            "thread_id": thread_id or str(uuid.uuid4()),
+            "model": model,
+            "packages": packages or [],
+        },
+    ))
+
+
+async def astream_answer(
+    agent: CompiledStateGraph, question: str, config: RunnableConfig
+) -> AsyncIterator[str]:
+    """Stream the tokens of the agent's answer to a question."""
+    async for event in agent.astream_events(
+        {"messages": [HumanMessage(content=question)]}, config, version="v2"
+    ):
+        if (event["event"] == "on_chat_model_stream" and
+                event.get("metadata", {}).get("langgraph_node") == ANSWER_NODE):
+            content = remove_tool_calls(event["data"]["chunk"].content)
+            if content:
+                yield convert_message_content_to_string(content)
+
+
+async def ainvoke_answer(
+    agent: CompiledStateGraph, question: str, config: RunnableConfig
+) -> str:
+    """Run the agent on a question and return the final answer."""
+    result = await agent.ainvoke({"messages": [HumanMessage(content=question)]}, config)
+    return convert_message_content_to_string(result["messages"][-1].content)
+
+
+@dataclass
+class BatchResult:
+    """Outcome of one question of a batch run."""
+
+    id: Any
+    question: str
+    thread_id: str
+    model: str
+    answer: str | None = None
+    error: str | None = None
+    latency: float = 0.0
+
+
+@dataclass
+class BatchStats:
+    """Throughput and latency summary of a batch run."""
+
+    total: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    elapsed: float = 0.0
+    latencies: list[float] = field(default_factory=list, repr=False)
+
+    @property
+    def throughput(self) -> float:
+        return self.total / self.elapsed if self.elapsed else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"{self.total} questions ({self.succeeded} ok, {self.failed} failed) "
+            f"in {self.elapsed:.1f}s - {self.throughput:.2f} q/s\n"
+            f"latency p50={percentile(self.latencies, 50):.2f}s "
+            f"p95={percentile(self.latencies, 95):.2f}s "
+            f"p99={percentile(self.latencies, 99):.2f}s "
+            f"max={max(self.latencies, default=0):.2f}s"
+        )
+
+
+def read_questions(lines: Iterable[str]) -> list[dict]:
+    """Parse JSONL questions, each with a `question` and optional `id`, `thread_id` and `model`."""
+    questions = []
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        item = json.loads(line)
+        if isinstance(item, str):
+            item = {"question": item}
+        if "question" not in item:
+            raise ValueError(f"Line {number} has no 'question' field")
+        item.setdefault("id", number)
+        questions.append(item)
+    return questions
+
+
+async def run_batch(
+    agent: CompiledStateGraph,
+    questions: list[dict],
+    output: IO[str],
+    model: str,
+    concurrency: int = 8,
+    packages: list[str] | None = None,
+    configurable: dict | None = None,
+) -> BatchStats:
+    """Run questions through one compiled agent with bounded concurrency.
+
+    Results are written to `output` as JSONL in completion order.
+
+    Args:
+        agent: Compiled DocsDoctor graph shared by every question.
+        questions: Parsed questions, see `read_questions`.
+        output: Text stream receiving one JSON result per line.
+        model: Default model id, overridden by a question's `model`.
+        concurrency: Maximum number of questions in flight.
+        packages: Package experts enabled for every question.
+        configurable: Extra configurable fields of every question, see `make_config`.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    stats = BatchStats(total=len(questions))
+
+    async def run_one(item: dict) -> BatchResult:
+        async with semaphore:
+            # Built once a slot is free, so the budget's deadline excludes the queueing
+            config = make_config(item.get("model", model), item.get("thread_id"), packages, **(configurable or {}))
+            result = BatchResult(
+                id=item["id"],
+                question=item["question"],
+                thread_id=config["configurable"]["thread_id"],
+                model=config["configurable"]["model"],
+            )
+            started = time.perf_counter()
+            try:
+                result.answer = await ainvoke_answer(agent, item["question"], config)
+            except Exception as e:
+                result.error = f"{type(e).__name__}: {e}"
+            result.latency = time.perf_counter() - started
+        return result
+
+    started = time.perf_counter()
+    for next_result in asyncio.as_completed([run_one(item) for item in questions]):
+        result = await next_result
+        if result.error:
+            stats.failed += 1
+        else:
+            stats.succeeded += 1
+        stats.latencies.append(result.latency)
+        output.write(json.dumps(asdict(result)) + "\n")
+        output.flush()
+    stats.elapsed = time.perf_counter() - started
+    return stats
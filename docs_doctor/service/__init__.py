@@ -0,0 +1,3 @@
+from docs_doctor.service.service import app
+
+__all__ = ["app"]
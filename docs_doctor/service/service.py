@@ -0,0 +1,232 @@
+import json
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncGenerator
+from uuid import uuid4
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from langchain_core.messages import HumanMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.graph.state import CompiledStateGraph
+from langsmith import Client as LangsmithClient
+
+from docs_doctor.core.budget import attach_budget
+from docs_doctor.core.checkpointer import open_checkpointer
+from docs_doctor.core.hedging import STREAM_RESET_EVENT
+from docs_doctor.core.llm import model_id
+from docs_doctor.core.memory import memory_stats, start_memory_monitor
+from docs_doctor.core.settings import settings
+from docs_doctor.resources import AgentResources
+from docs_doctor.runner import ANSWER_NODE
+from docs_doctor.schema import (
+    ChatHistory,
+    ChatHistoryInput,
+    ChatMessage,
+    Feedback,
+    FeedbackResponse,
+    ServiceMetadata,
+    StreamInput,
+    UserInput,
+)
+from docs_doctor.utils.streamlit_utils import (
+    convert_message_content_to_string,
+    hydrate_chat_message,
+    langchain_to_chat_message,
+    remove_tool_calls,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
+    # Every worker opens the same durable checkpointer, so threads are shared
+    async with open_checkpointer() as saver:
+        app.state.resources = AgentResources(checkpointer=saver)
+        start_memory_monitor(saver)
+        yield
+
+
+app = FastAPI(lifespan=lifespan)
+
+# Configurable keys the service sets from the request, or that LangGraph and the
+# agent use internally (as do keys starting with "__")
+RESERVED_CONFIG_KEYS = {"thread_id", "model", "checkpoint_ns", "checkpoint_id", "checkpoint_map"}
+
+
+def _check_agent_config(agent_config: dict[str, Any]) -> None:
+    reserved = sorted(key for key in agent_config if key in RESERVED_CONFIG_KEYS or key.startswith("__"))
+    if reserved:
+        raise HTTPException(status_code=422, detail=f"agent_config cannot set {', '.join(reserved)}")
+
+
+def _parse_input(request: Request, user_input: UserInput) -> tuple[CompiledStateGraph, dict[str, Any], str]:
+    _check_agent_config(user_input.agent_config)
+    run_id = uuid4()
+    thread_id = user_input.thread_id or str(uuid4())
+    agent_config = dict(user_input.agent_config)
+    resources: AgentResources = request.app.state.resources
+    packages = agent_config.pop("packages", resources.default_packages)
+    # The checkpointer holds the thread history, only the new message is sent
+    kwargs = {
+        "input": {"messages": [HumanMessage(content=user_input.message)]},
+        # timeout, max_model_calls and max_tokens in agent_config start the request's budget
+        "config": attach_budget(RunnableConfig(
+            configurable={
+                **agent_config,
+                "packages": packages,
+                # Last, so the request's own fields always win
+                "thread_id": thread_id,
+                "model": model_id(user_input.model),
+            },
+            run_id=run_id,
+        )),
+    }
+    return resources.get_agent(), kwargs, str(run_id)
+
+
+@app.get("/info")
+async def info(request: Request) -> ServiceMetadata:
+    resources: AgentResources = request.app.state.resources
+    return ServiceMetadata(
+        models=resources.models,
+        default_model=resources.default_model,
+        default_packages=resources.default_packages,
+        available_packages=resources.package_catalog,
+        packages=resources.default_packages,
+    )
+
+
+@app.post("/invoke")
+async def invoke(user_input: UserInput, request: Request) -> ChatMessage:
+    """Invoke the agent with user input to retrieve a final response.
+
+    Use thread_id to persist and continue a multi-turn conversation. The
+    `packages` key of agent_config selects the enabled package experts, toggling
+    them keeps the thread's history. agent_config cannot set the thread, the
+    model or internal keys, requests doing so are rejected with a 422.
+    """
+    agent, kwargs, run_id = _parse_input(request, user_input)
+    try:
+        response = await agent.ainvoke(**kwargs)
+        output = langchain_to_chat_message(response["messages"][-1])
+        output.run_id = run_id
+        return output
+    except Exception as e:
+        logger.error(f"An exception occurred: {e}")
+        raise HTTPException(status_code=500, detail="Unexpected error")
+
+
+async def message_generator(
+    user_input: StreamInput, request: Request
+) -> AsyncGenerator[str, None]:
+    """Generate a stream of messages from the agent as server-sent events."""
+    agent, kwargs, run_id = _parse_input(request, user_input)
+
+    try:
+        async for event in agent.astream_events(**kwargs, version="v2"):
+            if not event:
+                continue
+
+            new_messages = []
+            if (event["event"] == "on_chain_end" and
+                    any(t.startswith("graph:step:") for t in event.get("tags", [])) and
+                    isinstance(event["data"].get("output"), dict) and
+                    "messages" in event["data"]["output"]):
+                new_messages = event["data"]["output"]["messages"]
+            elif event["event"] == "on_custom_event" and "custom_data_dispatch" in event.get("tags", []):
+                new_messages = [event["data"]]
+
+            for message in new_messages:
+                try:
+                    chat_message = langchain_to_chat_message(message)
+                    chat_message.run_id = run_id
+                except Exception as e:
+                    logger.error(f"Error parsing message: {e}")
+                    yield f"data: {json.dumps({'type': 'error', 'content': 'Unexpected error'})}\n\n"
+                    continue
+                # LangGraph re-sends the input message, skip it
+                if chat_message.type == "human" and chat_message.content == user_input.message:
+                    continue
+                yield f"data: {json.dumps({'type': 'message', 'content': chat_message.model_dump()})}\n\n"
+
+            if (event["event"] == "on_chat_model_stream" and
+                    user_input.stream_tokens and
+                    event.get("metadata", {}).get("langgraph_node") == ANSWER_NODE):
+                content = remove_tool_calls(event["data"]["chunk"].content)
+                if content:
+                    yield f"data: {json.dumps({'type': 'token', 'content': convert_message_content_to_string(content)})}\n\n"
+
+            # A fallback model answered, clients drop the tokens streamed so far
+            if (event["event"] == "on_custom_event" and event["name"] == STREAM_RESET_EVENT and
+                    user_input.stream_tokens and
+                    event.get("metadata", {}).get("langgraph_node") == ANSWER_NODE):
+                yield f"data: {json.dumps({'type': 'reset', 'content': event['data']})}\n\n"
+    except Exception as e:
+        logger.error(f"Error in message generator: {e}")
+        yield f"data: {json.dumps({'type': 'error', 'content': 'Internal server error'})}\n\n"
+        return
+    yield "data: [DONE]\n\n"
+
+
+@app.post("/stream", response_class=StreamingResponse)
+async def stream(user_input: StreamInput, request: Request) -> StreamingResponse:
+    """Stream the agent's response to user input, including intermediate messages and tokens.
+
+    Sends server-sent events with a JSON `{"type": "message" | "token" | "reset" | "error", "content": ...}`
+    payload. A complete response is terminated by `[DONE]`, a failed one ends with an
+    error event instead. Tokens are only sent when `stream_tokens` is true. A reset
+    event means a fallback model answered: the tokens received so far are dropped,
+    and the answer arrives as a message event.
+    """
+    # Rejected before the response starts, errors in the stream can only be events
+    _check_agent_config(user_input.agent_config)
+    return StreamingResponse(
+        message_generator(user_input, request),
+        media_type="text/event-stream",
+    )
+
+
+@app.post("/feedback")
+async def feedback(feedback: Feedback) -> FeedbackResponse:
+    """Record feedback for a run to LangSmith."""
+    client = LangsmithClient()
+    kwargs = feedback.kwargs or {}
+    client.create_feedback(
+        run_id=feedback.run_id,
+        key=feedback.key,
+        score=feedback.score,
+        **kwargs,
+    )
+    return FeedbackResponse()
+
+
+@app.post("/history")
+async def history(input: ChatHistoryInput, request: Request) -> ChatHistory:
+    """Get the chat history of a thread."""
+    resources: AgentResources = request.app.state.resources
+    agent = resources.get_agent()
+    try:
+        state = await agent.aget_state(
+            config=RunnableConfig(configurable={"thread_id": input.thread_id})
+        )
+        messages = state.values.get("messages", []) if state else []
+        # Tool outputs stored out of band are returned in full
+        return ChatHistory(messages=[hydrate_chat_message(langchain_to_chat_message(m)) for m in messages])
+    except Exception as e:
+        logger.error(f"An exception occurred: {e}")
+        raise HTTPException(status_code=500, detail="Unexpected error")
+
+
+@app.get("/health")
+async def health_check() -> dict[str, str]:
+    return {"status": "ok"}
+
+
+@app.get("/debug/memory")
+async def debug_memory() -> dict[str, Any]:
+    """Last memory report, see `docs_doctor.core.memory`. Only served with `MEMORY_DEBUG_PAGE`."""
+    if not settings.MEMORY_DEBUG_PAGE:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return memory_stats()
@@ -1,8 +1,10 @@
 -- Enable the pgvector extension
 create extension if not exists vector;
 
+-- This script is idempotent: run it again on an existing database to migrate it
+
 -- Create the documentation chunks table
-create table site_pages (
+create table if not exists site_pages (
     id bigserial primary key,
     url varchar not null,
     chunk_number integer not null,
@@ -11,6 +13,7 @@ create table site_pages (
     content text not null,  -- Added content column
     metadata jsonb not null default '{}'::jsonb,  -- Added metadata column
     embedding vector(1536),  -- OpenAI embeddings are 1536 dimensions
+    content_hash varchar,  -- sha256 of content only, finds stored embeddings to reuse and unchanged chunks when re-indexing
     created_at timestamp with time zone default timezone('utc'::text, now()) not null,
     
     -- Add a unique constraint to prevent duplicate chunks for the same URL
@@ -18,7 +21,7 @@ create table site_pages (
 );
 
 -- Create the packages table
-create table packages (
+create table if not exists packages (
     id serial primary key,
     package varchar unique not null,
     package_name varchar unique not null,
@@ -26,38 +29,37 @@ create table packages (
     created_at timestamp with time zone default timezone('utc'::text, now()) not null
 );
 
--- First, drop the rule if it already exists
+-- Packages are registered with an upsert on package_name (insert ... on conflict do update).
+-- Postgres rejects ON CONFLICT on tables with INSERT rules, so drop the rule that
+-- earlier versions of this script used to emulate it.
 DROP RULE IF EXISTS packages_upsert_rule ON packages;
 
--- Create the rule
-CREATE RULE packages_upsert_rule AS
-    ON INSERT TO packages
-    DO INSTEAD
-        SELECT CASE WHEN EXISTS (
-            SELECT 1 FROM packages WHERE package_name = NEW.package_name
-        )
-        THEN 
-            (
-                UPDATE packages SET
-                    package = NEW.package,
-                    description = NEW.description,
-                    created_at = timezone('utc'::text, now())
-                WHERE package_name = NEW.package_name
-                RETURNING *
-            )
-        ELSE 
-            (
-                INSERT INTO packages (package, package_name, description)
-                VALUES (NEW.package, NEW.package_name, NEW.description)
-                RETURNING *
-            )
-        END;
-
 -- Create an index for better vector similarity search performance
-create index on site_pages using ivfflat (embedding vector_cosine_ops);
+-- Named like the index earlier versions created without a name
+create index if not exists site_pages_embedding_idx on site_pages using ivfflat (embedding vector_cosine_ops);
 
 -- Create an index on metadata for faster filtering
-create index idx_site_pages_metadata on site_pages using gin (metadata);
+create index if not exists idx_site_pages_metadata on site_pages using gin (metadata);
+
+-- Existing databases: add the content hash used by incremental re-indexing
+alter table site_pages add column if not exists content_hash varchar;
+
+-- Create an index to reuse embeddings of identical chunks across packages and versions
+create index if not exists idx_site_pages_content_hash on site_pages (content_hash);
+
+-- Full-text index over titles and content, used with vector search by hybrid retrieval.
+-- The 'simple' configuration does not stem, so API names like Agent.run_sync match exactly.
+alter table site_pages add column if not exists fts tsvector
+  generated always as (
+    setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+    setweight(to_tsvector('simple', content), 'B')
+  ) stored;
+
+create index if not exists idx_site_pages_fts on site_pages using gin (fts);
+
+-- Search functions return the chunk embeddings for diversification, existing ones are recreated
+drop function if exists match_site_pages(vector, int, jsonb);
+drop function if exists search_site_pages(text, int, jsonb);
 
 -- Create a function to search for documentation chunks
 create function match_site_pages (
@@ -72,6 +74,7 @@ create function match_site_pages (
   summary varchar,
   content text,
   metadata jsonb,
+  embedding vector(1536),
   similarity float
 )
 language plpgsql
@@ -87,6 +90,7 @@ begin
     summary,
     content,
     metadata,
+    embedding,
     1 - (site_pages.embedding <=> query_embedding) as similarity
   from site_pages
   where metadata @> filter
@@ -95,12 +99,54 @@ begin
 end;
 $$;
 
+-- Create a function to search documentation chunks by keywords
+create function search_site_pages (
+  query_text text,
+  match_count int default 10,
+  filter jsonb DEFAULT '{}'::jsonb
+) returns table (
+  id bigint,
+  url varchar,
+  chunk_number integer,
+  title varchar,
+  summary varchar,
+  content text,
+  metadata jsonb,
+  embedding vector(1536),
+  rank float
+)
+language plpgsql
+as $$
+#variable_conflict use_column
+begin
+  return query
+  select
+    id,
+    url,
+    chunk_number,
+    title,
+    summary,
+    content,
+    metadata,
+    embedding,
+    ts_rank_cd(site_pages.fts, query)::float as rank
+  -- Any of the query terms may match, chunks matching more of them rank first
+  from site_pages, to_tsquery('simple', array_to_string(
+    tsvector_to_array(to_tsvector('simple', query_text)), ' | '
+  )) query
+  where metadata @> filter and site_pages.fts @@ query
+  order by rank desc
+  limit match_count;
+end;
+$$;
+
 -- Everything above will work for any PostgreSQL database. The below commands are for Supabase security
 
 -- Enable RLS on the table
 alter table site_pages enable row level security;
 
 -- Create a policy that allows anyone to read
+drop policy if exists "Allow public read access" on site_pages;
 create policy "Allow public read access"
   on site_pages
   for select
@@ -1,180 +1,166 @@
 import asyncio
+import json
 import logging
-from types import SimpleNamespace
-from typing import Any, AsyncGenerator
+import time
+from typing import AsyncGenerator, NamedTuple
 
 import streamlit as st
 from dotenv import load_dotenv
-from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
-from langchain_core.runnables import RunnableConfig
 from streamlit.runtime.scriptrunner import get_script_run_ctx
 
+from docs_doctor.client import DirectAgentClient
 from docs_doctor.core import settings
-from docs_doctor.agent.graph import equip_docs_doctor
-from docs_doctor.schema import ChatHistory, ChatMessage
-from docs_doctor.utils.streamlit_utils import (
-    convert_message_content_to_string,
-    langchain_to_chat_message,
-    remove_tool_calls,
-)
-from docs_doctor.utils.packages import get_available_packages, get_local_packages
+from docs_doctor.core.hedging import STREAM_RESET_EVENT
+from docs_doctor.schema import ChatMessage
 
 APP_TITLE = "DocsDoctor"
 APP_ICON = "🧰"
 logger = logging.getLogger(__name__)
 
-class DirectAgentClient:
-    def __init__(self):
-        self.info = self._get_service_info()
-        self._current_packages = set(self.info.packages)
-        self.agent = equip_docs_doctor(self.info.packages)
-        
-    def _get_service_info(self):
-        available_packages = get_available_packages()
-        local_packages = get_local_packages()
-        preset_packages = [
-            package['package_name']
-            for package in available_packages
-            if package['package_name'] in local_packages
-        ]
-        return SimpleNamespace(
-            models=settings.AVAILABLE_MODELS,
-            default_model=settings.DEFAULT_MODEL,
-            default_packages=preset_packages,
-            available_packages=[package['package_name'] for package in available_packages],
-            packages=preset_packages
-        )
-    
-    def _ensure_agent_current(self):
-        if set(self._current_packages) != set(self.info.packages):
-            self.agent = equip_docs_doctor(self.info.packages)
-            self._current_packages = set(self.info.packages)
-    
-    def _create_config(self, message: str, model: str, thread_id: str) -> dict[str, Any]:
-        history = self.get_history(thread_id)
-        messages_to_send = []
-        
-        i = 0
-        while i < len(history.messages):
-            msg = history.messages[i]
-            
-            if msg.type == "human":
-                messages_to_send.append(HumanMessage(content=msg.content))
-            elif msg.type == "ai":
-                ai_message = AIMessage(content=msg.content, tool_calls=msg.tool_calls)
-                messages_to_send.append(ai_message)
-                
-                if msg.tool_calls:
-                    tool_call_ids = [call["id"] for call in msg.tool_calls]
-                    i += 1
-                    while i < len(history.messages) and history.messages[i].type == "tool":
-                        tool_msg = history.messages[i]
-                        if tool_msg.tool_call_id in tool_call_ids:
-                            messages_to_send.append(ToolMessage(
-                                tool_call_id=tool_msg.tool_call_id,
-                                content=tool_msg.content
-                            ))
-                        i += 1
-                    i -= 1
-            i += 1
-        
-        messages_to_send.append(HumanMessage(content=message))
-        
-        return {
-            "input": {"messages": messages_to_send},
-            "config": RunnableConfig(
-                configurable={
-                    "thread_id": thread_id,
-                    "model": model,
-                },
-            ),
-        }
-    
-    async def ainvoke(self, message: str, model: str, thread_id: str) -> ChatMessage:
-        self._ensure_agent_current()
-        config = self._create_config(message, model, thread_id)
-        response = await self.agent.ainvoke(**config)
-        return langchain_to_chat_message(response["messages"][-1])
-    
-    async def astream(self, message: str, model: str, thread_id: str) -> AsyncGenerator[ChatMessage | str, None]:
-        self._ensure_agent_current()
-        config = self._create_config(message, model, thread_id)
-        
-        async for event in self.agent.astream_events(**config, version="v2"):
-            if not event:
-                continue
-            
-            new_messages = []
-            if (event["event"] == "on_chain_end" and 
-                any(t.startswith("graph:step:") for t in event.get("tags", [])) and 
-                "messages" in event["data"]["output"]):
-                new_messages = event["data"]["output"]["messages"]
-            elif event["event"] == "on_custom_event" and "custom_data_dispatch" in event.get("tags", []):
-                new_messages = [event["data"]]
-
-            for message in new_messages:
-                try:
-                    chat_message = langchain_to_chat_message(message)
-                    if not (chat_message.type == "human" and chat_message.content == message):
-                        yield chat_message
-                except Exception as e:
-                    logger.error(f"Error parsing message: {e}")
-
-            if (event["event"] == "on_chat_model_stream" and 
-                "llama_guard" not in event.get("tags", [])):
-                content = remove_tool_calls(event["data"]["chunk"].content)
-                if content:
-                    yield convert_message_content_to_string(content)
-
-    def get_history(self, thread_id: str) -> ChatHistory:
-        state = self.agent.get_state(
-            config=RunnableConfig(
-                configurable={"thread_id": thread_id},
-                callbacks=None,
-            )
-        )
-        messages = state.values.get('messages', []) if state else []
-        return ChatHistory(messages=[langchain_to_chat_message(m) for m in messages])
+def _split_finished_blocks(content: str) -> tuple[str, str]:
+    """Split markdown into finished blocks and the still-growing tail.
+
+    Blocks end at a blank line outside of a code fence, so a finished block
+    renders the same whatever tokens arrive next.
+    """
+    split_at = 0
+    search_from = 0
+    while (index := content.find("\n\n", search_from)) != -1:
+        if content.count("```", 0, index) % 2 == 0:
+            split_at = index + 2
+        search_from = index + 2
+    return content[:split_at], content[split_at:]
+
+
+class MessageView(NamedTuple):
+    """Renderable form of a finished message, built once and drawn on every rerun."""
+
+    role: str
+    markdown: str
+    tool_calls: tuple[tuple[str, str], ...]
+    """Label and JSON input of each tool call."""
+
 
 class MessageRenderer:
+    @staticmethod
+    def message_view(msg: ChatMessage) -> MessageView:
+        tool_calls = tuple(
+            (f"Tool Call: {tool_call['name']}", json.dumps(tool_call["args"], indent=2))
+            for tool_call in msg.tool_calls
+        ) if msg.type == "ai" else ()
+        return MessageView(msg.type, msg.content, tool_calls)
+
+    @staticmethod
+    def draw_view(view: MessageView):
+        if view.role == "human":
+            st.chat_message("human").markdown(view.markdown)
+        elif view.role == "ai":
+            with st.chat_message("ai"):
+                if view.markdown:
+                    st.markdown(view.markdown)
+                for label, tool_input in view.tool_calls:
+                    status = st.status(label, state="complete")
+                    status.write("Input:")
+                    status.json(tool_input)
+                    return status  # Return status for tool result updates
+
     @staticmethod
     def render_message(msg: ChatMessage):
-        if msg.type == "human":
-            st.chat_message("human").write(msg.content)
-        elif msg.type == "ai":
-            with st.chat_message("ai") as container:
-                if msg.content:
-                    st.write(msg.content)
-                if msg.tool_calls:
-                    for tool_call in msg.tool_calls:
-                        status = st.status(
-                            f"Tool Call: {tool_call['name']}",
-                            state="complete"
-                        )
-                        status.write("Input:")
-                        status.write(tool_call["args"])
-                        return status  # Return status for tool result updates
+        return MessageRenderer.draw_view(MessageRenderer.message_view(msg))
+
+    @staticmethod
+    def render_history(messages: list[ChatMessage]):
+        """Render past messages from the views cached on previous reruns.
+
+        Views are keyed by the message's position and a hash of its content, so
+        a rerun only builds the views of new or changed messages and draws the
+        others from the cache. Views of messages no longer in the thread are dropped.
+        """
+        views = st.session_state.get("history_views", {})
+        current = {}
+        for index, msg in enumerate(messages):
+            if msg.type not in ("human", "ai"):
+                continue
+            # str caches its hash, so the key costs nothing for messages seen before
+            key = (index, msg.type, hash(msg.content), len(msg.tool_calls))
+            view = views.get(key)
+            if view is None:
+                view = MessageRenderer.message_view(msg)
+            current[key] = view
+            MessageRenderer.draw_view(view)
+        st.session_state["history_views"] = current
 
     @staticmethod
     async def render_stream(messages_agen: AsyncGenerator[ChatMessage | str, None],
-                          existing_messages: bool = False):
-        streaming_content = ""
-        streaming_placeholder = None
+                          existing_messages: bool = False,
+                          frames_per_second: float | None = None):
+        """Render streamed tokens, coalesced into frames.
+
+        Tokens are buffered and drawn at most `frames_per_second` times per second
+        (`STREAM_FRAMES_PER_SECOND` by default). Finished markdown blocks are
+        frozen in their own element, so each frame only redraws the open block
+        instead of the whole answer.
+
+        When a fallback model's answer wins a hedged request, the tokens streamed
+        by the primary are cleared and the winning message is drawn instead.
+        """
+        frame_interval = 1 / (frames_per_second or settings.STREAM_FRAMES_PER_SECOND)
+        buffer: list[str] = []
+        tail = ""
+        last_frame = 0.0
+        placeholders = []
+        replaced = False
         current_ai_message = None
         message_container = st.chat_message("ai") if not existing_messages else None
-        
+
+        def new_placeholder():
+            with message_container:
+                placeholders.append(st.empty())
+
+        def draw_frame():
+            nonlocal tail, last_frame
+            tail += "".join(buffer)
+            buffer.clear()
+            finished, tail = _split_finished_blocks(tail)
+            if finished:
+                placeholders[-1].markdown(finished)
+                new_placeholder()
+            if tail:
+                placeholders[-1].markdown(tail)
+            last_frame = time.monotonic()
+
         async for msg in messages_agen:
             if isinstance(msg, str):
                 if not existing_messages:
-                    if not streaming_placeholder:
-                        with message_container:
-                            streaming_placeholder = st.empty()
-                    streaming_content += msg
-                    streaming_placeholder.write(streaming_content)
+                    if not placeholders:
+                        new_placeholder()
+                    buffer.append(msg)
+                    if time.monotonic() - last_frame >= frame_interval:
+                        draw_frame()
                 continue
-            
+
+            if msg.type == "custom" and msg.custom_data.get("event") == STREAM_RESET_EVENT:
+                buffer.clear()
+                tail = ""
+                for placeholder in placeholders:
+                    placeholder.empty()
+                placeholders.clear()
+                replaced = True
+                continue
+
+            # Tool calls and results are not tokens, show the text buffered before them
+            if buffer:
+                draw_frame()
             if msg.type == "ai":
                 current_ai_message = msg
+                if replaced and not placeholders and msg.content and not existing_messages:
+                    # The winning answer was not streamed
+                    new_placeholder()
+                    placeholders[-1].markdown(msg.content)
+                replaced = False
+
+        if buffer:
+            draw_frame()
         
         if not existing_messages and current_ai_message:
             st.session_state.messages.append(current_ai_message)
@@ -213,6 +199,12 @@ def setup_sidebar(agent_client: DirectAgentClient):
             help="Select packages to enable"
         )
         use_streaming = st.toggle("Stream results", value=settings.DEFAULT_STREAMING)
+        if settings.PROFILE_MODE:
+            st.toggle(
+                "Profile messages",
+                key="profile_messages",
+                help=f"Write a {settings.PROFILE_MODE} profile of each message to {settings.PROFILE_DIR}",
+            )
         
         st.write("[View the source code](https://github.com/Jules-Astier/docs-doctor)")
         st.caption("Made with :material/favorite: by [Jules] in London")
@@ -220,6 +212,9 @@ def setup_sidebar(agent_client: DirectAgentClient):
         return use_streaming
 
 def setup_model_selection(agent_client: DirectAgentClient):
+    # Shared by all sessions, sorted and indexed once per model list
+    catalog = agent_client.info.model_catalog
+
     # Initialize session state
     if "selected_model" not in st.session_state:
         st.session_state.selected_model = agent_client.info.models[0]
@@ -228,26 +223,13 @@ def setup_model_selection(agent_client: DirectAgentClient):
     
     sort_keys = {
         "Name": ("name", False),
-        "Prompt Price ↑": ("pricing.prompt", False),
-        "Prompt Price ↓": ("pricing.prompt", True),
-        "Completion Price ↑": ("pricing.completion", False),
-        "Completion Price ↓": ("pricing.completion", True)
+        "Prompt Price ↑": ("prompt_price", False),
+        "Prompt Price ↓": ("prompt_price", True),
+        "Completion Price ↑": ("completion_price", False),
+        "Completion Price ↓": ("completion_price", True),
+        "Context Length ↓": ("context_length", True),
     }
     
-    # Get sorted models before creating the expander
-    models = agent_client.info.models.copy()
-    sort_option = st.session_state.get("model_sort", "Prompt Price ↑")
-    key, reverse = sort_keys[sort_option]
-    
-    def get_nested_value(d, key_path):
-        current = d
-        for k in key_path.split('.'):
-            current = current[k]
-        return current
-    
-    models.sort(key=lambda x: get_nested_value(x, key), reverse=reverse)
-    model_options = {m['name']: m for m in models}
-    
     # Create expander using the current selected model
     current_model_id = st.session_state.selected_model['id']
     model_select = st.expander(
@@ -268,35 +250,31 @@ def setup_model_selection(agent_client: DirectAgentClient):
                     index=1,
                     key="model_sort"
                 )
+                search = st.text_input("Search", key="model_search", placeholder="e.g. gpt, claude")
             
+            key, reverse = sort_keys[sort_option]
+            model_names = [model['name'] for model in catalog.query(prefix=search.strip(), sort=key, descending=reverse)]
+            if st.session_state.selected_model['name'] not in model_names:
+                model_names.insert(0, st.session_state.selected_model['name'])
+
             with col1:
                 # Model selection
                 selected_model_name = st.selectbox(
                     "Select Model",
-                    options=list(model_options.keys()),
-                    index=list(model_options.keys()).index(st.session_state.selected_model['name']),
+                    options=model_names,
+                    index=model_names.index(st.session_state.selected_model['name']),
                     key="model_selection"
                 )
                 
                 # Update session state with new selection
-                st.session_state.selected_model = model_options[selected_model_name]
+                st.session_state.selected_model = catalog.by_name(selected_model_name) or st.session_state.selected_model
                 
                 # Force a rerun to update the expander label using the current method
                 if current_model_id != st.session_state.selected_model['id']:
                     st.rerun()
             
             # Display model info
-            st.info(f"""
-                ##### {st.session_state.selected_model['name']}
-                **Context Length:** {st.session_state.selected_model['context_length']:,} tokens\n
-                **Pricing:** ${round(float(st.session_state.selected_model['pricing']['prompt']) * 1000000, 3)}/
-                            ${round(float(st.session_state.selected_model['pricing']['completion']) * 1000000, 3)} per M token\n
-                **Architecture:**
-                - Modality: {st.session_state.selected_model['architecture']['modality']}
-                - Type: {st.session_state.selected_model['architecture']['instruct_type']}
-                
-                {st.session_state.selected_model['description']}
-            """)
+            st.info(catalog.details(st.session_state.selected_model))
     else:
         st.session_state.model_settings_expanded = False
     
@@ -310,6 +288,20 @@ async def handle_user_input(agent_client: DirectAgentClient,
 	st.session_state.messages.append(user_message)
 	MessageRenderer.render_message(user_message)
 
+	if settings.PROFILE_MODE and st.session_state.get("profile_messages"):
+		from docs_doctor.core.profiling import profile_request, request_tags
+
+		tags = request_tags(st.session_state.thread_id, agent_client.info.packages, model)
+		with profile_request(tags, settings.PROFILE_MODE) as profile:
+			await answer_user_input(agent_client, user_input, model, use_streaming)
+		st.caption(f"Profile written to `{profile.path}` ({profile.duration:.2f}s)")
+	else:
+		await answer_user_input(agent_client, user_input, model, use_streaming)
+
+async def answer_user_input(agent_client: DirectAgentClient,
+							user_input: str,
+							model: str,
+							use_streaming: bool):
 	if use_streaming:
 		stream = agent_client.astream(
 			message=user_input,
@@ -326,9 +318,42 @@ async def handle_user_input(agent_client: DirectAgentClient,
 		st.session_state.messages.append(response)
 		MessageRenderer.render_message(response)
 
-	st.rerun()
+	# The answer is already on screen, no need to rerun and redraw the whole history
+
+def render_memory_page():
+	"""Debug page with the last memory report, opened with `?debug=memory` when `MEMORY_DEBUG_PAGE` is set."""
+	from docs_doctor.core.memory import memory_stats
+	from docs_doctor.resources import get_resources
+
+	get_resources()  # starts the monitor when MEMORY_SNAPSHOT_INTERVAL is set
+	report = memory_stats()
+	st.title("Memory")
+	if not report["monitoring"]:
+		st.info("Set MEMORY_SNAPSHOT_INTERVAL to take tracemalloc snapshots.")
+	mib = 2 ** 20
+	col1, col2, col3 = st.columns(3)
+	col1.metric("RSS", f"{report['rss'] / mib:,.1f} MiB")
+	if report["monitoring"] and report.get("time"):
+		col2.metric("Traced", f"{report['traced'] / mib:,.1f} MiB")
+		col3.metric("Threads in memory", report["checkpoint_threads"], f"{report['checkpoint_bytes'] / mib:,.1f} MiB")
+		st.line_chart(
+			{"RSS (MiB)": [point["rss"] / mib for point in report["history"]],
+			 "Traced (MiB)": [point["traced"] / mib for point in report["history"]]}
+		)
+		st.subheader("By owner")
+		st.table({owner: f"{size / mib:,.2f} MiB" for owner, size in report["owners"].items()})
+		st.subheader("Largest threads")
+		st.table({thread: f"{size / 1024:,.1f} KiB" for thread, size in report["largest_threads"].items()})
+		st.subheader("Growth since the previous snapshot")
+		st.table(report["growth"])
+	st.subheader("Caches")
+	st.table(report["caches"])
 
 async def main():
+	if settings.MEMORY_DEBUG_PAGE and st.query_params.get("debug") == "memory":
+		render_memory_page()
+		return
+
 	setup_page()
 
 	if "agent_client" not in st.session_state:
@@ -360,9 +385,7 @@ async def main():
 		with st.chat_message("ai"):
 			st.write(WELCOME)
 	else:
-		# print("MESSAGES: ", st.session_state.messages)
-		for msg in st.session_state.messages:
-			MessageRenderer.render_message(msg)
+		MessageRenderer.render_history(st.session_state.messages)
 
 	if user_input := st.chat_input():
 		await handle_user_input(agent_client, user_input, model, use_streaming)
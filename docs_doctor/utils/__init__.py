@@ -1,7 +1,73 @@
+import asyncio
 import os
-from supabase import Client
+import threading
+from typing import TYPE_CHECKING, Any
 
-supabase: Client = Client(
-    supabase_url=os.getenv("SUPABASE_URL"),
-    supabase_key=os.getenv("SUPABASE_SERVICE_KEY")
-)
\ No newline at end of file
+if TYPE_CHECKING:
+    from supabase import Client
+
+_supabase: "Client | None" = None
+_supabase_lock = threading.Lock()
+
+
+def get_supabase() -> "Client":
+    """Get the shared Supabase client, connecting on first use."""
+    global _supabase
+    with _supabase_lock:
+        if _supabase is None:
+            from supabase import Client
+
+            _supabase = Client(
+                supabase_url=os.getenv("SUPABASE_URL"),
+                supabase_key=os.getenv("SUPABASE_SERVICE_KEY")
+            )
+        return _supabase
+
+
+def execute(query: Any) -> Any:
+    """Execute a Supabase query with retries, under the shared `supabase` rate limit.
+
+    Recorded or replayed when a cassette is active.
+
+    Raises:
+        DependencyError: Supabase is down or every retry failed.
+    """
+    from docs_doctor.core.cassette import get_cassette
+    from docs_doctor.core.ratelimit import get_rate_limiter
+    from docs_doctor.core.resilience import call_with_retry_blocking
+
+    def run() -> Any:
+        return call_with_retry_blocking("supabase", query.execute, limiter=get_rate_limiter("supabase"))
+
+    cassette = get_cassette()
+    return cassette.query(query, run) if cassette else run()
+
+
+async def aexecute(query: Any) -> Any:
+    """Execute a Supabase query in a worker thread with retries and timeouts,
+    under the shared `supabase` rate limit.
+
+    Recorded or replayed when a cassette is active.
+
+    Raises:
+        DependencyError: Supabase is down or every retry failed.
+    """
+    from docs_doctor.core.cassette import get_cassette
+    from docs_doctor.core.ratelimit import get_rate_limiter
+    from docs_doctor.core.resilience import call_with_retry
+
+    async def run() -> Any:
+        return await call_with_retry(
+            "supabase", lambda: asyncio.to_thread(query.execute), limiter=get_rate_limiter("supabase")
+        )
+
+    cassette = get_cassette()
+    return await cassette.aquery(query, run) if cassette else await run()
+
+
+def __getattr__(name: str):
+    # `from docs_doctor.utils import supabase` still works, but builds the client
+    # right away; call get_supabase() where it is used instead
+    if name == "supabase":
+        return get_supabase()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,4 +1,4 @@
-from docs_doctor.utils import supabase
+from docs_doctor.utils import execute, get_supabase
 from pathlib import Path
 import tomli  # for pyproject.toml
 import re
@@ -7,9 +7,7 @@ from typing import Dict, List, Optional, Set
 
 def get_available_packages():
 	try:
-		result = supabase.from_('packages') \
-					.select('*') \
-					.execute()
+		result = execute(get_supabase().from_('packages').select('*'))
 		packages = result.data
 		# packages = supabase.fetch_all("SELECT * FROM packages")
 		return packages
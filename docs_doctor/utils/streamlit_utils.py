@@ -8,6 +8,7 @@ from langchain_core.messages import (
     ChatMessage as LangchainChatMessage,
 )
 
+from docs_doctor.core.blobs import BLOB_KEY, get_blob_store
 from docs_doctor.schema import ChatMessage
 
 
@@ -49,6 +50,9 @@ def langchain_to_chat_message(message: BaseMessage) -> ChatMessage:
                 content=convert_message_content_to_string(message.content),
                 tool_call_id=message.tool_call_id,
             )
+            # Large outputs keep their summary, hydrate_chat_message() loads the full text
+            if BLOB_KEY in message.additional_kwargs:
+                tool_message.custom_data = {BLOB_KEY: message.additional_kwargs[BLOB_KEY]}
             return tool_message
         case LangchainChatMessage():
             if message.role == "custom":
@@ -64,6 +68,15 @@ def langchain_to_chat_message(message: BaseMessage) -> ChatMessage:
             raise ValueError(f"Unsupported message type: {message.__class__.__name__}")
 
 
+def hydrate_chat_message(message: ChatMessage) -> ChatMessage:
+    """Load the full content of a tool message stored out of band, for display."""
+    reference = message.custom_data.get(BLOB_KEY)
+    if not reference:
+        return message
+    text = get_blob_store().get(reference["id"])
+    return message if text is None else message.model_copy(update={"content": text})
+
+
 def remove_tool_calls(content: str | list[str | dict]) -> str | list[str | dict]:
     """Remove tool calls from content."""
     if isinstance(content, str):
@@ -0,0 +1,4 @@
+import os
+
+# Settings require the key at import time, unit tests never reach OpenRouter
+os.environ.setdefault("OPEN_ROUTER_API_KEY", "test")
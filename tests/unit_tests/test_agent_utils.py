@@ -0,0 +1,37 @@
+from docs_doctor.agent import utils
+
+
+class FakeModel:
+    def __init__(self):
+        self.bindings = 0
+
+    def bind_tools(self, tools):
+        self.bindings += 1
+        return ("bound", tuple(tools))
+
+
+def first_tool():
+    """First tool."""
+
+
+def second_tool():
+    """Second tool."""
+
+
+def test_bindings_are_reused_per_tool_names_and_bounded(monkeypatch):
+    model = FakeModel()
+    monkeypatch.setattr(utils, "get_model", lambda name: model)
+    monkeypatch.setattr(utils, "BOUND_MODELS_SIZE", 2)
+    utils.clear_bound_models()
+
+    # An equal tool set built again, e.g. after a cache eviction, reuses the binding
+    utils._bind_tools("model", [first_tool, second_tool])
+    utils._bind_tools("model", [second_tool, first_tool])
+    assert model.bindings == 1
+
+    utils._bind_tools("model", [first_tool])
+    utils._bind_tools("model", [second_tool])
+    assert len(utils._bound_models) == 2
+
+    utils.clear_bound_models()
+    assert not utils._bound_models
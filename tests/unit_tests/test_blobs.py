@@ -0,0 +1,45 @@
+from langchain_core.messages import ToolMessage
+from pydantic import SecretStr
+
+from docs_doctor.core import blobs
+from docs_doctor.core.blobs import BlobStore, hydrate_message, offload_message
+from docs_doctor.utils.streamlit_utils import hydrate_chat_message, langchain_to_chat_message
+
+
+def test_offloaded_tool_output_is_hydrated_for_models_and_history(tmp_path, monkeypatch):
+    monkeypatch.setattr(blobs, "_store", BlobStore(tmp_path))
+    text = "documentation " * 1000
+    message = offload_message(ToolMessage(content=text, tool_call_id="call_1"))
+
+    assert len(message.content) < len(text)
+    assert hydrate_message(message).content == text
+    assert hydrate_chat_message(langchain_to_chat_message(message)).content == text
+
+
+def test_small_tool_output_stays_in_the_message(tmp_path, monkeypatch):
+    monkeypatch.setattr(blobs, "_store", BlobStore(tmp_path))
+    message = ToolMessage(content="short", tool_call_id="call_1")
+
+    assert offload_message(message) is message
+    assert hydrate_chat_message(langchain_to_chat_message(message)).content == "short"
+
+
+def test_missing_blob_is_found_once_written(tmp_path):
+    store = BlobStore(tmp_path)
+    blob_id = "ab" * 32
+    path = tmp_path / blob_id[:2] / blob_id[2:]
+
+    assert store.get(blob_id) is None
+    path.parent.mkdir(parents=True)
+    path.write_text("written by another worker", encoding="utf-8")
+    assert store.get(blob_id) == "written by another worker"
+
+
+def test_outputs_stay_in_checkpoints_shared_across_hosts(tmp_path, monkeypatch):
+    monkeypatch.setattr(blobs, "_store", BlobStore(tmp_path))
+    monkeypatch.setattr(blobs.settings, "POSTGRES_CONN_STRING", SecretStr("postgresql://db/threads"))
+    message = ToolMessage(content="documentation " * 1000, tool_call_id="call_1")
+
+    assert offload_message(message) is message
+    monkeypatch.setattr(blobs.settings, "BLOB_STORE_SHARED", True)
+    assert offload_message(message) is not message
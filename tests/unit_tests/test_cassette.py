@@ -0,0 +1,17 @@
+from postgrest import SyncPostgrestClient
+
+from docs_doctor.core.cassette import _query_request
+
+
+def test_queries_are_keyed_by_their_request():
+    client = SyncPostgrestClient("https://fake.supabase.invalid/rest/v1")
+
+    page_route, pages = _query_request(client.from_("site_pages").select("*").eq("url", "https://a"))
+    other_pages = _query_request(client.from_("site_pages").select("*").eq("url", "https://b"))[1]
+    match_route, match = _query_request(client.rpc("match_site_pages", {"match_count": 5}))
+    other_match = _query_request(client.rpc("match_site_pages", {"match_count": 10}))[1]
+
+    assert page_route.startswith("GET ") and page_route.endswith("/site_pages")
+    assert match_route.startswith("POST ") and match_route.endswith("/rpc/match_site_pages")
+    assert len({pages, other_pages, match, other_match}) == 4
+    assert _query_request(client.from_("site_pages").select("*").eq("url", "https://a"))[1] == pages
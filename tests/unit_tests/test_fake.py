@@ -0,0 +1,22 @@
+from postgrest import SyncPostgrestClient
+
+from docs_doctor.core.fake import FAKE_PACKAGE, FakeBackend
+
+
+def _not_sent():
+    raise AssertionError("the fake backend must not send the query")
+
+
+def test_fake_answers_supabase_queries():
+    backend = FakeBackend(latency_scale=0)
+    client = SyncPostgrestClient("https://fake.supabase.invalid/rest/v1")
+
+    packages = backend.query(client.from_("packages").select("*"), _not_sent)
+    matches = backend.query(client.rpc("match_site_pages", {"match_count": 5}), _not_sent)
+    pages = backend.query(client.from_("site_pages").select("*").eq("url", "https://fake-docs.invalid/page-0"), _not_sent)
+    deleted = backend.query(client.from_("site_pages").delete().eq("id", 1), _not_sent)
+
+    assert packages.data == [FAKE_PACKAGE]
+    assert matches.data and all("similarity" in row for row in matches.data)
+    assert pages.data
+    assert deleted.data == []
@@ -0,0 +1,74 @@
+import asyncio
+
+from langchain_core.language_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+from docs_doctor.core.hedging import STREAM_RESET_EVENT, HedgedChatModel
+
+
+async def _slow_primary(_input) -> AIMessage:
+    await asyncio.sleep(0.5)
+    return AIMessage(content="primary answer")
+
+
+def test_hedge_request_emits_no_tokens_to_parent():
+    hedge = GenericFakeChatModel(messages=iter([AIMessage(content="hedged answer")]))
+    model = HedgedChatModel(
+        [("primary", RunnableLambda(_slow_primary)), ("hedge", hedge)],
+        hedge_delay=0.01,
+    )
+
+    async def node(messages):
+        return await model.ainvoke(messages)
+
+    async def run():
+        events = []
+        async for event in RunnableLambda(node).astream_events("question", version="v2"):
+            events.append(event)
+        return events
+
+    events = asyncio.run(run())
+
+    assert events[-1]["data"]["output"].content == "hedged answer"
+    assert not [event for event in events if event["event"].startswith("on_chat_model")]
+
+
+def test_failover_after_primary_error():
+    async def failing(_input) -> AIMessage:
+        raise RuntimeError("upstream down")
+
+    model = HedgedChatModel([("primary", RunnableLambda(failing)), ("fallback", RunnableLambda(_slow_primary))])
+
+    assert asyncio.run(model.ainvoke("question")).content == "primary answer"
+
+
+class _SlowStreamingModel(GenericFakeChatModel):
+    async def _astream(self, *args, **kwargs):
+        async for chunk in super()._astream(*args, **kwargs):
+            await asyncio.sleep(0.05)
+            yield chunk
+
+
+def test_hedge_win_resets_the_primary_partial_output():
+    primary = _SlowStreamingModel(messages=iter([AIMessage(content="a slow primary answer with many words")]))
+    hedge = GenericFakeChatModel(messages=iter([AIMessage(content="hedged answer")]))
+    model = HedgedChatModel([("primary", primary), ("hedge", hedge)], hedge_delay=0.12)
+
+    async def node(messages, config):
+        return await model.ainvoke(messages, config)
+
+    async def run():
+        return [event async for event in RunnableLambda(node).astream_events("question", version="v2")]
+
+    events = asyncio.run(run())
+    kinds = [
+        event["name"] if event["event"] == "on_custom_event" else event["event"]
+        for event in events if event["event"] in ("on_chat_model_stream", "on_custom_event")
+    ]
+
+    assert events[-1]["data"]["output"].content == "hedged answer"
+    # The primary streamed part of its answer, then the hedge's answer replaced it
+    assert kinds[0] == "on_chat_model_stream"
+    assert kinds[-1] == STREAM_RESET_EVENT
+    assert kinds.count(STREAM_RESET_EVENT) == 1
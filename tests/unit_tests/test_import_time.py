@@ -0,0 +1,23 @@
+import importlib.util
+import os
+from pathlib import Path
+
+import pytest
+
+_spec = importlib.util.spec_from_file_location(
+    "import_time", Path(__file__).resolve().parents[2] / "benchmarks" / "import_time.py"
+)
+import_time = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(import_time)
+
+# Slow CI machines can raise the budgets, like the benchmark's --scale
+SCALE = float(os.environ.get("IMPORT_TIME_SCALE", "1.0"))
+
+
+@pytest.mark.parametrize("module", sorted(import_time.BUDGETS))
+def test_import_stays_within_budget(module):
+    median, built, loaded = import_time.measure(module, runs=3)
+
+    assert not built, f"{module} built lazy singletons at import"
+    assert not loaded, f"{module} loaded packages its commands should import"
+    assert median <= import_time.BUDGETS[module] * SCALE
@@ -0,0 +1,28 @@
+from pathlib import Path
+
+from docs_doctor.ingest.documents import chunk_page, file_url
+from docs_doctor.ingest.pipeline import IndexState
+
+
+def test_file_url_uses_base_url(tmp_path: Path):
+    page = tmp_path / "guide" / "index.html"
+    assert file_url(page, tmp_path, "pkg", "https://docs.example.com/") == "https://docs.example.com/guide/"
+
+
+def test_local_file_urls_are_namespaced_by_package(tmp_path: Path):
+    page = tmp_path / "guide.md"
+    assert file_url(page, tmp_path, "first") == "local://first/guide"
+    assert file_url(page, tmp_path, "first") != file_url(page, tmp_path, "second")
+
+
+def test_retitled_chunk_keeps_its_content_hash_but_is_rewritten():
+    page = "<html><head><title>{}</title></head><body><main><p>Same text.</p></main></body></html>"
+    first = chunk_page("local://pkg/guide", page.format("Guide"), "pkg", "html")[0]
+    renamed = chunk_page("local://pkg/guide", page.format("Tutorial"), "pkg", "html")[0]
+    index = IndexState()
+    index.add({"id": 1, "url": first.url, "chunk_number": first.chunk_number,
+               "content_hash": first.content_hash, "title": first.title, "summary": first.summary})
+
+    assert first.content_hash == renamed.content_hash
+    assert not index.is_unchanged(renamed)
+    assert index.is_unchanged(first)
@@ -0,0 +1,84 @@
+import asyncio
+import functools
+
+from docs_doctor.ingest.documents import Chunk, content_hash
+from docs_doctor.ingest.pipeline import IndexState, IngestOptions, IngestStats, _convert_stage, run_pipeline
+
+
+def _chunks(url: str, count: int) -> list[Chunk]:
+    return [
+        Chunk(url=url, chunk_number=number, title="", summary="", content=f"{url} {number}",
+              content_hash=content_hash(f"{url} {number}"))
+        for number in range(count)
+    ]
+
+
+def _source(chunks: list[Chunk]):
+    async def produce(queue: asyncio.Queue, stats) -> None:
+        for chunk in chunks:
+            stats.chunks += 1
+            await queue.put(chunk)
+        stats.pages += len({chunk.url for chunk in chunks})
+
+    return produce
+
+
+def test_failing_embedder_counts_failed_pages():
+    written = []
+
+    async def embed(texts: list[str]) -> list[list[float]]:
+        if any(text.startswith("https://b") for text in texts):
+            raise RuntimeError("embedding service down")
+        return [[0.0] for _ in texts]
+
+    async def write(rows: list[dict]) -> None:
+        written.extend(rows)
+
+    chunks = _chunks("https://a", 2) + _chunks("https://b", 2)
+    options = IngestOptions(embed_batch_size=2)
+    stats = asyncio.run(run_pipeline(None, embed, write, options, page_source=_source(chunks)))
+
+    assert stats.failed_pages == 1
+    assert stats.embedded == 2
+    assert [row["url"] for row in written] == ["https://a", "https://a"]
+
+
+def test_unchanged_chunks_are_skipped():
+    chunks = _chunks("https://a", 3)
+    index = IndexState()
+    for row_id, chunk in enumerate(chunks):
+        index.add({"id": row_id, "url": chunk.url, "chunk_number": chunk.chunk_number,
+                   "content_hash": chunk.content_hash if chunk.chunk_number else "old"})
+    index.add({"id": 99, "url": "https://gone", "chunk_number": 0, "content_hash": "x"})
+    embedded = []
+
+    async def embed(texts: list[str]) -> list[list[float]]:
+        embedded.extend(texts)
+        return [[0.0] for _ in texts]
+
+    async def write(rows: list[dict]) -> None:
+        pass
+
+    stats = asyncio.run(run_pipeline(None, embed, write, IngestOptions(), page_source=_source(chunks), index=index))
+
+    assert stats.unchanged == 2
+    assert embedded == ["https://a 0"]
+    assert index.stale_ids() == [99]
+
+
+def test_full_chunk_queue_stops_conversion():
+    # Each page yields three chunks and nothing reads the queue
+    pages = [functools.partial(_chunks, f"https://{number}", 3) for number in range(10)]
+    chunks = asyncio.Queue(maxsize=1)
+    stats = IngestStats()
+
+    async def run() -> None:
+        try:
+            await asyncio.wait_for(_convert_stage(pages, chunks, IngestOptions(workers=1), stats), 1.0)
+        except asyncio.TimeoutError:
+            pass
+
+    asyncio.run(run())
+
+    # Two slots per worker, each held by a page waiting to queue its chunks
+    assert stats.pages == 2
@@ -0,0 +1,37 @@
+import asyncio
+import socket
+
+import pytest
+
+from docs_doctor.client import DirectAgentClient
+from docs_doctor.core.cassette import use_backend
+from docs_doctor.core.fake import FAKE_MODEL, FakeBackend
+from docs_doctor.loadtest import run_load
+from docs_doctor.resources import AgentResources
+
+
+def test_fake_turn_runs_without_network(monkeypatch):
+    monkeypatch.setenv("SUPABASE_URL", "https://fake.supabase.invalid")
+    monkeypatch.setenv("SUPABASE_SERVICE_KEY", "test")
+
+    def connect(*args, **kwargs):
+        raise AssertionError("the fake backend must not open connections")
+
+    monkeypatch.setattr(socket.socket, "connect", connect)
+    monkeypatch.setattr(socket, "create_connection", connect)
+    monkeypatch.setattr(socket, "getaddrinfo", connect)
+
+    with use_backend(FakeBackend(latency_scale=0)):
+        client = DirectAgentClient(AgentResources(models=[FAKE_MODEL]))
+        client.info.packages = ["fake_docs"]
+        results = asyncio.run(run_load(
+            client, [["How do I run an agent?"]], [1], FAKE_MODEL["id"], stage_seconds=0.5, ramp_seconds=0.0,
+        ))
+
+    assert results[0].errors == 0
+    assert results[0].turns >= 1
+
+
+def test_run_load_needs_a_model():
+    with pytest.raises(ValueError):
+        asyncio.run(run_load(None, [["Hi"]], [1], None))
@@ -0,0 +1,22 @@
+import json
+
+from docs_doctor.core.profiling import profile_request, request_tags
+
+
+def test_concurrent_cprofile_request_falls_back_to_the_sampler(tmp_path):
+    tags = request_tags("thread-1", ["fake_docs"], "fake/model")
+    with profile_request(tags, "cprofile", tmp_path) as outer:
+        with profile_request(tags, "cprofile", tmp_path, interval=0.001) as inner:
+            sum(range(10_000))
+        sum(range(10_000))
+
+    assert outer.profiler == "cprofile" and outer.path.suffix == ".prof"
+    assert inner.profiler == "sample" and inner.path.name.endswith(".speedscope.json")
+    index = [json.loads(line) for line in (tmp_path / "profiles.jsonl").read_text().splitlines()]
+    assert [entry["profiler"] for entry in index] == ["sample", "cprofile"]
+    assert [entry["scope"] for entry in index] == ["request", "process"]
+
+    # The lock is released, the next request gets cProfile again
+    with profile_request(tags, "cprofile", tmp_path) as again:
+        pass
+    assert again.profiler == "cprofile"
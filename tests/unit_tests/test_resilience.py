@@ -0,0 +1,73 @@
+import asyncio
+
+import httpx
+import pytest
+
+from docs_doctor.core.ratelimit import RateLimiter
+from docs_doctor.core.resilience import DependencyError, call_with_retry, get_breaker
+
+
+def test_rate_limit_wait_is_not_part_of_the_timeout():
+    # The first call takes the whole token budget, the second waits ~0.3s for a refill
+    limiter = RateLimiter("test_throttled", tokens_per_minute=600)
+
+    async def call() -> str:
+        return "ok"
+
+    async def run() -> list[str]:
+        return [
+            await call_with_retry("test_throttled", call, attempts=1, timeout=0.1, limiter=limiter, tokens=600),
+            await call_with_retry("test_throttled", call, attempts=1, timeout=0.1, limiter=limiter, tokens=3),
+        ]
+
+    assert asyncio.run(run()) == ["ok", "ok"]
+    assert get_breaker("test_throttled").stats() == {"state": "closed", "failures": 0}
+
+
+def test_slow_call_times_out_and_counts_as_breaker_failure():
+    async def call() -> str:
+        await asyncio.sleep(1)
+        return "late"
+
+    with pytest.raises(DependencyError) as error:
+        asyncio.run(call_with_retry("test_slow", call, attempts=1, timeout=0.05))
+
+    assert error.value.reason == "timeout"
+    assert get_breaker("test_slow").failures == 1
+
+
+def test_client_errors_are_not_retried():
+    from postgrest import APIError
+
+    request = httpx.Request("GET", "https://fake.supabase.invalid/rest/v1/packages")
+    errors = [
+        httpx.HTTPStatusError("Bad request", request=request, response=httpx.Response(400, request=request)),
+        APIError({"message": "column does not exist", "code": "42703"}),
+    ]
+    for error in errors:
+        calls = []
+
+        async def call() -> str:
+            calls.append(1)
+            raise error
+
+        with pytest.raises(type(error)):
+            asyncio.run(call_with_retry("test_client_error", call, attempts=3, timeout=1))
+        assert len(calls) == 1
+    assert get_breaker("test_client_error").stats() == {"state": "closed", "failures": 0}
+
+
+def test_transient_errors_are_retried():
+    request = httpx.Request("POST", "https://api.invalid/v1/embeddings")
+    calls = []
+
+    async def call() -> str:
+        calls.append(1)
+        if len(calls) == 1:
+            raise httpx.HTTPStatusError("Too many requests", request=request, response=httpx.Response(429, request=request))
+        if len(calls) == 2:
+            raise httpx.ConnectError("refused", request=request)
+        return "ok"
+
+    assert asyncio.run(call_with_retry("test_transient", call, attempts=3, timeout=1)) == "ok"
+    assert len(calls) == 3
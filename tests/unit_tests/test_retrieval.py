@@ -0,0 +1,60 @@
+import asyncio
+
+from docs_doctor.agent.package_expert import retrieval
+from docs_doctor.agent.package_expert.retrieval import choose_k, diversify, reciprocal_rank_fusion
+
+
+def test_diversify_passes_over_near_duplicates():
+    rows = [
+        {"id": 1, "embedding": [1.0, 0.0]},
+        {"id": 2, "embedding": "[0.99, 0.01]"},
+        {"id": 3, "embedding": [0.0, 1.0]},
+        {"id": 4},
+        {"id": 5, "embedding": [0.7, 0.7]},
+    ]
+    assert [row["id"] for row in diversify(rows, k=3)] == [1, 3, 4]
+
+
+def test_diversify_trades_relevance_for_novelty():
+    rows = [
+        {"id": 1, "rrf_score": 0.033, "embedding": [1.0, 0.0]},
+        # Cosine similarity 0.9 to the first row, below any duplicate threshold
+        {"id": 2, "rrf_score": 0.032, "embedding": [0.9, 0.436]},
+        {"id": 3, "rrf_score": 0.030, "embedding": [0.0, 1.0]},
+    ]
+    assert [row["id"] for row in diversify(rows, k=2)] == [1, 3]
+    assert [row["id"] for row in diversify(rows, k=2, lambda_mult=1.0)] == [1, 2]
+    assert [row["id"] for row in diversify(rows, k=5)] == [1, 3, 2]
+
+
+def test_reciprocal_rank_fusion_favours_rows_found_by_both_searches():
+    fused = reciprocal_rank_fusion([[{"id": 1}, {"id": 2}], [{"id": 2}, {"id": 3}]])
+    assert [row["id"] for row in fused] == [2, 1, 3]
+
+
+def test_choose_k_stops_at_similarity_gap():
+    assert choose_k([0.9, 0.88, 0.6, 0.59], max_k=4) == (2, "gap")
+    assert choose_k([0.4, 0.3, 0.2], max_k=2) == (2, "widened")
+
+
+def test_retrieve_passages_keeps_fused_order_and_refills_dropped_duplicates(monkeypatch):
+    def row(row_id, similarity, embedding):
+        return {"id": row_id, "url": f"https://docs/{row_id}", "chunk_number": 0, "title": str(row_id),
+                "content": str(row_id), "similarity": similarity, "embedding": embedding}
+
+    fused = [
+        row(1, 0.9, [1.0, 0.0, 0.0]),
+        row(3, 0.88, [1.0, 0.001, 0.0]),
+        # Found by the keyword search only, far from the query embedding
+        row(2, 0.1, [0.0, 1.0, 0.0]),
+        row(4, 0.5, [0.0, 0.0, 1.0]),
+    ]
+
+    async def hybrid_search(*args, **kwargs):
+        return [dict(r) for r in fused]
+
+    monkeypatch.setattr(retrieval, "hybrid_search", hybrid_search)
+    passages = asyncio.run(retrieval.retrieve_passages("q", [1.0, 0.0, 0.0], "pkg", max_results=3))
+
+    # k=2 from the gap after 0.88, the duplicate 3 is replaced by the next candidate
+    assert [passage.title for passage in passages] == ["1", "2"]
@@ -0,0 +1,30 @@
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from docs_doctor.core.fake import FAKE_MODEL
+from docs_doctor.schema import UserInput
+from docs_doctor.service.service import _parse_input
+
+
+def _user_input(agent_config: dict) -> UserInput:
+    # The fake model is not a complete OpenRouter model, skip validation
+    return UserInput.model_construct(message="Hi", model=FAKE_MODEL, thread_id="mine", agent_config=agent_config)
+
+
+def _request():
+    resources = SimpleNamespace(default_packages=["fake_docs"], get_agent=lambda: None)
+    return SimpleNamespace(app=SimpleNamespace(state=SimpleNamespace(resources=resources)))
+
+
+def test_agent_config_cannot_override_the_thread_or_the_model():
+    for key in ("thread_id", "model", "__docs_doctor_budget"):
+        with pytest.raises(HTTPException) as error:
+            _parse_input(_request(), _user_input({key: "other"}))
+        assert error.value.status_code == 422
+
+    configurable = _parse_input(_request(), _user_input({"max_model_calls": 3}))[1]["config"]["configurable"]
+    assert configurable["thread_id"] == "mine"
+    assert configurable["model"] == FAKE_MODEL["id"]
+    assert configurable["max_model_calls"] == 3
@@ -0,0 +1,71 @@
+import asyncio
+import contextlib
+from types import SimpleNamespace
+
+from docs_doctor import streamlit as app
+from docs_doctor.core.hedging import STREAM_RESET_EVENT
+from docs_doctor.schema import ChatMessage
+
+
+def test_rerun_draws_unchanged_messages_from_the_cache(monkeypatch):
+    session_state = {}
+    built, drawn = [], []
+    message_view = app.MessageRenderer.message_view
+
+    def view(msg):
+        built.append(msg.content)
+        return message_view(msg)
+
+    monkeypatch.setattr(app.st, "session_state", session_state)
+    monkeypatch.setattr(app.MessageRenderer, "message_view", staticmethod(view))
+    monkeypatch.setattr(app.MessageRenderer, "draw_view", staticmethod(lambda view: drawn.append(view.markdown)))
+
+    messages = [
+        ChatMessage(type="human", content="How do I run an agent?"),
+        ChatMessage(type="ai", content="", tool_calls=[{"name": "docs", "args": {"q": "run"}, "id": "1"}]),
+        ChatMessage(type="tool", content="Agents run with run_sync.", tool_call_id="1"),
+        ChatMessage(type="ai", content="Use run_sync."),
+    ]
+    app.MessageRenderer.render_history(messages)
+    messages.append(ChatMessage(type="human", content="Thanks"))
+    app.MessageRenderer.render_history(messages)
+
+    assert built == ["How do I run an agent?", "", "Use run_sync.", "Thanks"]
+    assert drawn[3:] == ["How do I run an agent?", "", "Use run_sync.", "Thanks"]
+    assert len(session_state["history_views"]) == 4
+
+
+class _Placeholder:
+    def __init__(self):
+        self.text = None
+
+    def markdown(self, text):
+        self.text = text
+
+    def empty(self):
+        self.text = None
+
+
+def test_stream_reset_replaces_the_partial_answer(monkeypatch):
+    placeholders = []
+
+    def empty():
+        placeholders.append(_Placeholder())
+        return placeholders[-1]
+
+    session_state = SimpleNamespace(messages=[])
+    monkeypatch.setattr(app.st, "session_state", session_state)
+    monkeypatch.setattr(app.st, "chat_message", lambda role: contextlib.nullcontext())
+    monkeypatch.setattr(app.st, "empty", empty)
+    answer = ChatMessage(type="ai", content="Hedged answer.")
+
+    async def stream():
+        yield "Partial primary "
+        yield "answer.\n\nMore"
+        yield ChatMessage(type="custom", content="", custom_data={"event": STREAM_RESET_EVENT, "model": "hedge"})
+        yield answer
+
+    asyncio.run(app.MessageRenderer.render_stream(stream(), frames_per_second=1000))
+
+    assert [placeholder.text for placeholder in placeholders if placeholder.text] == ["Hedged answer."]
+    assert session_state.messages == [answer]
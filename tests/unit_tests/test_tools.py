@@ -0,0 +1,19 @@
+from docs_doctor.agent import tools
+
+
+def test_tool_sets_are_built_from_the_registered_catalog(monkeypatch):
+    calls = []
+
+    def catalog() -> list[dict]:
+        calls.append(1)
+        return [{"id": 1, "package": "Fake Docs", "package_name": "fake_docs", "description": "Fake"}]
+
+    monkeypatch.setattr(tools, "_package_catalog", tools._package_catalog)
+    tools.use_package_catalog(catalog)
+    try:
+        selected = tools.select_tools(["fake_docs"])
+        assert tools.select_tools(["fake_docs"]) is selected
+        assert selected[0].name == "fake_docs_expert_tool"
+        assert len(calls) == 1
+    finally:
+        tools.clear_tool_cache()